@@ -29,6 +29,14 @@ class Settings(BaseSettings):
     UPLOAD_DIR: Path = BASE_DIR / "uploads"
     ORIGINAL_DIR: Path = UPLOAD_DIR / "original"
     PROCESSED_DIR: Path = UPLOAD_DIR / "processed"
+    TILES_DIR: Path = UPLOAD_DIR / "tiles"
+    VARIANTS_DIR: Path = UPLOAD_DIR / "variants"
+    # 导出的压缩包不放在 uploads 下（/uploads 是公开的静态目录）
+    EXPORTS_DIR: Path = BASE_DIR / "exports"
+    # 等待后台导入的 ZIP 压缩包及导入任务状态；恢复备份时的解压目录（须与 UPLOAD_DIR 在同一文件系统）
+    IMPORTS_DIR: Path = BASE_DIR / "imports"
+    # worker 之间共享的运行时状态（缓存失效日志等），同样不能放在 uploads 下
+    RUN_DIR: Path = BASE_DIR / "run"
     
     # Image Processing Defaults
     DEFAULT_BLOCK_SIZE: int = 11
@@ -37,6 +45,60 @@ class Settings(BaseSettings):
     DEFAULT_BRIGHTNESS: int = 0
     DEFAULT_DENOISE_STRENGTH: int = 10
     
+    # Live Preview (WebSocket)
+    PREVIEW_MAX_SIDE: int = 1600      # 预览图最长边像素，0 表示使用原图分辨率
+    PREVIEW_JPEG_QUALITY: int = 80
+    
+    # Deep Zoom Tiles
+    TILE_SIZE: int = 256
+    TILE_OVERLAP: int = 1
+    TILE_JPEG_QUALITY: int = 85
+    
+    # Image Delivery (按 Accept 头协商 AVIF/WebP/JPEG)
+    IMAGE_NEGOTIATION: bool = True
+    DELIVERY_QUALITY: int = 80        # 照片/带标记图片的 WebP/JPEG 质量
+    DELIVERY_AVIF_QUALITY: int = 60
+    
+    # 图片接口的笔记路径缓存（每个 worker 的条目数）
+    IMAGE_CACHE_SIZE: int = 4096
+    
+    # 文件夹树缓存（每个 worker 缓存的用户数）
+    FOLDER_TREE_CACHE_SIZE: int = 1024
+    
+    # Folder Export Jobs
+    EXPORT_TTL_HOURS: int = 24            # 压缩包最后一次访问后保留的时间
+    EXPORT_GC_INTERVAL_MINUTES: int = 30
+    
+    # Folder PDF Export
+    PDF_JPEG_QUALITY: int = 75            # 批注页（彩色）的 JPEG 质量
+    PDF_WORKERS: int = 0                  # 页面编码线程数，0 = min(4, CPU 核数)
+    
+    # Library Backup
+    BACKUP_RESTORE_BATCH: int = 500       # 恢复时每个事务写入的笔记数
+    
+    # Upload File Reclamation (孤儿文件清理)
+    FILE_SWEEP_INTERVAL_MINUTES: int = 360
+    FILE_SWEEP_GRACE_MINUTES: int = 60    # 上传时文件先于数据库记录写入，新文件不清理
+    FILE_SWEEP_BATCH: int = 500           # 每次查询数据库核对的文件数
+    
+    # Annotated Image Rendering (按需渲染)
+    ANNOTATION_RENDER_WORKERS: int = 0    # 导出前批量渲染的并发数，0 = CPU 核数
+    ANNOTATION_PRERENDER_DEBOUNCE_MS: int = 800    # 修改后预渲染前等待的时间，连续的修改只渲染一次；0 = 只按需渲染
+    ANNOTATION_PRERENDER_MAX_DELAY_MS: int = 5000  # 持续修改时预渲染最多推迟的时间
+    ANNOTATION_RENDER_CACHE_SIZE: int = 4        # 每个 worker 缓存上次渲染结果的笔记数（增量重绘）
+    ANNOTATION_FULL_REDRAW_RATIO: float = 0.5    # 需要重绘的面积超过该比例时整张重绘
+    ANNOTATION_FONT_PATH: str = ""               # 标记文字字体（需支持中文），为空时自动查找
+    FONT_CACHE_SIZE: int = 64                    # 已加载字体（路径, 字号）的缓存数
+    
+    # ZIP Bulk Import
+    IMPORT_BATCH: int = 100               # 每个事务写入的笔记数
+    IMPORT_WORKERS: int = 0               # 图片处理线程数，0 = CPU 核数
+    IMPORT_TTL_HOURS: int = 24            # 已结束的导入任务状态保留的时间
+    
+    # Nginx X-Accel-Redirect (图片字节交给 nginx 发送，见 deploy/nginx.conf)
+    IMAGE_ACCEL_REDIRECT: bool = False
+    ACCEL_REDIRECT_PREFIX: str = "/_protected_uploads/"
+    
     # DeepSeek API
     DEEPSEEK_API_KEY: str = _DEEPSEEK_API_KEY
     DEEPSEEK_API_URL: str = "https://api.deepseek.com/v1/chat/completions"
@@ -50,3 +112,8 @@ settings = Settings()
 # Ensure upload directories exist
 settings.ORIGINAL_DIR.mkdir(parents=True, exist_ok=True)
 settings.PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+settings.TILES_DIR.mkdir(parents=True, exist_ok=True)
+settings.VARIANTS_DIR.mkdir(parents=True, exist_ok=True)
+settings.EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
+settings.IMPORTS_DIR.mkdir(parents=True, exist_ok=True)
+settings.RUN_DIR.mkdir(parents=True, exist_ok=True)
@@ -1,14 +1,21 @@
 """
 Processing My Note - FastAPI Application Entry Point
 """
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.config import settings
-from app.database import init_db
-from app.routers import auth_router, folders_router, tags_router, notes_router, ai_router, annotations_router, export_router
+from app.database import engine, init_db
+from app.services.search import init_search_index
+from app.services.folder_tree import init_folder_closure
+from app.services.export_jobs import gc_loop as export_gc_loop
+from app.services.file_sweeper import deletion_loop, sweep_loop
+from app.services import fonts
+from app.services.annotation_render import prerender_scheduler
+from app.routers import auth_router, folders_router, tags_router, notes_router, ai_router, annotations_router, export_router, backup_router
 
 
 @asynccontextmanager
@@ -16,9 +23,25 @@ async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     await init_db()
+    async with engine.begin() as conn:
+        await init_search_index(conn)
+        await init_folder_closure(conn)
+    export_gc = asyncio.create_task(export_gc_loop())
+    file_deletion = asyncio.create_task(deletion_loop())
+    upload_sweep = asyncio.create_task(sweep_loop())
+    font_path = await asyncio.to_thread(fonts.font_path)
+    if font_path:
+        print(f"🔤 Annotation font: {font_path}")
+    else:
+        print("⚠️ No CJK font found, Chinese annotation text will not render (set ANNOTATION_FONT_PATH)")
     print(f"🚀 {settings.APP_NAME} started!")
     yield
     # Shutdown
+    export_gc.cancel()
+    file_deletion.cancel()
+    upload_sweep.cancel()
+    # 等待进行中的标记预渲染完成
+    await prerender_scheduler.shutdown()
     print(f"👋 {settings.APP_NAME} shutting down...")
 
 
@@ -54,6 +77,7 @@ app.include_router(notes_router, prefix="/api")
 app.include_router(ai_router, prefix="/api")
 app.include_router(annotations_router, prefix="/api")
 app.include_router(export_router, prefix="/api")
+app.include_router(backup_router, prefix="/api")
 
 
 @app.get("/")
@@ -2,9 +2,9 @@
 Database Models
 """
 from app.models.user import User
-from app.models.folder import Folder
+from app.models.folder import Folder, FolderClosure
 from app.models.tag import Tag
 from app.models.note import Note, NoteTag
 from app.models.annotation import Annotation
 
-__all__ = ["User", "Folder", "Tag", "Note", "NoteTag", "Annotation"]
+__all__ = ["User", "Folder", "FolderClosure", "Tag", "Note", "NoteTag", "Annotation"]
@@ -2,11 +2,23 @@
 Folder Model - Supports infinite nesting
 """
 from datetime import datetime
-from sqlalchemy import String, DateTime, ForeignKey, Integer
+from sqlalchemy import String, DateTime, ForeignKey, Integer, Table, Column, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
 
+# Closure table: one row per (ancestor, descendant) pair, including (folder, folder, 0)
+# Subtree queries become a single indexed lookup instead of walking parent_id
+FolderClosure = Table(
+    "folder_closure",
+    Base.metadata,
+    Column("ancestor_id", Integer, ForeignKey("folders.id", ondelete="CASCADE"), primary_key=True),
+    Column("descendant_id", Integer, ForeignKey("folders.id", ondelete="CASCADE"), primary_key=True),
+    Column("depth", Integer, nullable=False),
+    Index("ix_folder_closure_descendant", "descendant_id", "ancestor_id", "depth"),
+)
+
+
 class Folder(Base):
     __tablename__ = "folders"
     
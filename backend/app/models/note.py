@@ -2,7 +2,7 @@
 Note Model
 """
 from datetime import datetime
-from sqlalchemy import String, DateTime, ForeignKey, Integer, Text, JSON, Table, Column
+from sqlalchemy import String, DateTime, ForeignKey, Integer, Text, JSON, Table, Column, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
@@ -13,11 +13,21 @@ NoteTag = Table(
     Base.metadata,
     Column("note_id", Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
     Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    # Tag filters look up notes by tag; the primary key (note_id, tag_id) only serves the reverse
+    Index("ix_note_tags_tag_note", "tag_id", "note_id"),
 )
 
 
 class Note(Base):
     __tablename__ = "notes"
+    __table_args__ = (
+        # Keyset pagination: every page is a range scan on (user_id, sort key, id)
+        Index("ix_notes_user_updated", "user_id", "updated_at", "id"),
+        Index("ix_notes_user_created", "user_id", "created_at", "id"),
+        Index("ix_notes_user_title", "user_id", "title", "id"),
+        # Folder view: filter by folder, newest first
+        Index("ix_notes_user_folder_updated", "user_id", "folder_id", "updated_at"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     title: Mapped[str] = mapped_column(String(200))
@@ -26,6 +36,11 @@ class Note(Base):
     folder_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("folders.id"), nullable=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
     processing_params: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    # Revision counters for versioned image URLs / ETags
+    image_version: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
+    annotation_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # Variant version the stored annotated render was made from (behind while a render is pending)
+    annotated_version: Mapped[str | None] = mapped_column(String(32), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -34,3 +49,11 @@ class Note(Base):
     folder = relationship("Folder", back_populates="notes")
     tags = relationship("Tag", secondary=NoteTag, back_populates="notes")
     annotations = relationship("Annotation", back_populates="note", cascade="all, delete-orphan")
+
+    def bump_image_version(self):
+        """Mark every image variant as changed (reprocess, rotate, crop)"""
+        self.image_version = Note.image_version + 1
+    
+    def bump_annotation_version(self):
+        """Mark the annotated variant as changed"""
+        self.annotation_version = Note.annotation_version + 1
@@ -2,7 +2,7 @@
 User Model
 """
 from datetime import datetime
-from sqlalchemy import String, DateTime
+from sqlalchemy import String, DateTime, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
@@ -15,6 +15,8 @@ class User(Base):
     password_hash: Mapped[str] = mapped_column(String(255))
     avatar: Mapped[str | None] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Bumped on every folder create/update/delete; keys the cached folder tree
+    folder_tree_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     
     # Relationships
     folders = relationship("Folder", back_populates="user", cascade="all, delete-orphan")
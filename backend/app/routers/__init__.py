@@ -8,5 +8,6 @@ from app.routers.notes import router as notes_router
 from app.routers.ai import router as ai_router
 from app.routers.annotations import router as annotations_router
 from app.routers.export import router as export_router
+from app.routers.backup import router as backup_router
 
-__all__ = ["auth_router", "folders_router", "tags_router", "notes_router", "ai_router", "annotations_router", "export_router"]
+__all__ = ["auth_router", "folders_router", "tags_router", "notes_router", "ai_router", "annotations_router", "export_router", "backup_router"]
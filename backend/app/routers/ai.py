@@ -93,6 +93,7 @@ async def ai_adjust(
         
         # Update database
         note.processing_params = new_params
+        note.bump_image_version()
         await db.flush()
         
         return AdjustResponse(
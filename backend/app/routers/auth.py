@@ -39,33 +39,38 @@ def create_access_token(data: dict) -> str:
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def get_user_from_token(token: str, db: AsyncSession) -> User | None:
+    """Resolve a JWT access token to its user, or None if the token is invalid"""
     try:
         # 解码 JWT token
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
+            return None
         # 确保 user_id 是整数
         if isinstance(user_id, str):
             try:
                 user_id = int(user_id)
             except ValueError:
-                raise credentials_exception
+                return None
     except JWTError:
-        raise credentials_exception
+        return None
     
     # 查询用户
     result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    return result.scalar_one_or_none()
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = await get_user_from_token(token, db)
     if user is None:
         raise credentials_exception
     return user
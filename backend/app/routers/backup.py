@@ -0,0 +1,67 @@
+"""
+Backup Router - Back up and restore a user's whole library
+"""
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.models.user import User
+from app.models.note import Note
+from app.routers.auth import get_current_user
+from app.routers.export import attachment_headers
+from app.schemas.backup import RestoreResponse
+from app.services import backup, annotation_render
+from app.services.zip_stream import stream_zip
+
+router = APIRouter(prefix="/backup", tags=["Backup"])
+
+
+@router.post("/")
+async def create_backup(
+    base: Optional[UploadFile] = File(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Back up the whole library as a ZIP (manifest.json + image files by content hash)
+    - Without `base`: a full backup
+    - With `base` (manifest.json of an earlier backup, or the backup itself):
+      only images added or changed since that backup are included
+    """
+    base_manifest = None
+    if base is not None:
+        try:
+            base_manifest = await asyncio.to_thread(backup.read_base_manifest, base.file)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # 备份中的带标记图片必须是最新的渲染结果
+    await annotation_render.render_stale(db, Note.user_id == current_user.id)
+    manifest = await backup.load_library(db, current_user.id, base_manifest)
+    members = await asyncio.to_thread(backup.collect_blobs, manifest, base_manifest)
+    
+    return StreamingResponse(
+        stream_zip(members),
+        media_type="application/zip",
+        headers=attachment_headers(backup.archive_name(manifest)),
+    )
+
+
+@router.post("/restore/", response_model=RestoreResponse)
+async def restore_backup(
+    files: list[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Restore a backup into the current library (folders, tags, notes, annotations)
+    - Upload the full backup together with every incremental backup made after it
+    - Tags are matched by name; folders and notes are always created anew
+    """
+    try:
+        return await backup.restore_library(db, current_user.id, [f.file for f in files])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
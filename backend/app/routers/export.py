@@ -1,12 +1,10 @@
 """
 Export Router - Export notes and folders
 """
-import zipfile
-import shutil
 from pathlib import Path
 from urllib.parse import quote
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
@@ -18,47 +16,38 @@ from app.models.user import User
 from app.models.note import Note
 from app.models.folder import Folder
 from app.routers.auth import get_current_user
+from app.schemas.export import ExportJobResponse
+from app.services import export_jobs, annotation_render
+from app.services.export_plan import plan_folder_export, content_version, rendered_entries
+from app.services.pdf_export import stream_pdf
+from app.services.zip_stream import stream_zip
+from app.utils.paths import annotated_is_stale
 
 router = APIRouter(prefix="/export", tags=["Export"])
 
 
-async def get_all_subfolders(db: AsyncSession, folder_id: int, user_id: int) -> list[Folder]:
-    """Recursively get all subfolders"""
+def attachment_headers(filename: str) -> dict:
+    # Use RFC 5987 encoding for filename to support UTF-8
+    return {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+
+
+def job_response(state: dict) -> ExportJobResponse:
+    download_url = f"/api/export/jobs/{state['job_id']}/download" if state["status"] == "done" else None
+    return ExportJobResponse(**{key: state[key] for key in ExportJobResponse.model_fields if key in state},
+                             download_url=download_url)
+
+
+async def get_user_folder(db: AsyncSession, folder_id: int, user_id: int) -> Folder:
     result = await db.execute(
         select(Folder).where(
-            Folder.parent_id == folder_id,
+            Folder.id == folder_id,
             Folder.user_id == user_id
         )
     )
-    subfolders = list(result.scalars().all())
-    all_folders = subfolders.copy()
-    
-    for subfolder in subfolders:
-        children = await get_all_subfolders(db, subfolder.id, user_id)
-        all_folders.extend(children)
-    
-    return all_folders
-
-
-async def get_folder_path(db: AsyncSession, folder_id: int, user_id: int) -> str:
-    """Get folder path from root"""
-    path_parts = []
-    current_id = folder_id
-    
-    while current_id:
-        result = await db.execute(
-            select(Folder).where(
-                Folder.id == current_id,
-                Folder.user_id == user_id
-            )
-        )
-        folder = result.scalar_one_or_none()
-        if not folder:
-            break
-        path_parts.insert(0, folder.name)
-        current_id = folder.parent_id
-    
-    return "/".join(path_parts) if path_parts else ""
+    folder = result.scalar_one_or_none()
+    if not folder:
+        raise HTTPException(status_code=404, detail="Folder not found")
+    return folder
 
 
 @router.get("/note/{note_id}")
@@ -78,7 +67,12 @@ async def export_note(
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
     
-    # Try to get annotated image first, fall back to processed
+    # Try to get annotated image first (rendered now if stale), fall back to processed
+    if annotated_is_stale(note):
+        try:
+            await annotation_render.ensure_rendered(note.id)
+        except Exception as e:
+            print(f"⚠️ Annotation render failed for note {note.id}: {e}")
     processed_path = settings.BASE_DIR / note.processed_path
     processed_path_obj = Path(note.processed_path)
     annotated_path = settings.BASE_DIR / processed_path_obj.parent / f"{processed_path_obj.stem}_annotated{processed_path_obj.suffix}"
@@ -106,101 +100,105 @@ async def export_folder(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Export a folder with all its notes and subfolders (processed images only)"""
-    # Get the folder
-    result = await db.execute(
-        select(Folder).where(
-            Folder.id == folder_id,
-            Folder.user_id == current_user.id
-        )
+    """
+    Export a folder with all its notes and subfolders as a ZIP (annotated images if available)
+    An archive already built by an export job for the current content is served
+    from disk (resumable); otherwise the archive is streamed while it is built
+    """
+    folder = await get_user_folder(db, folder_id, current_user.id)
+    
+    entries = await plan_folder_export(db, folder_id, current_user.id)
+    if not entries:
+        raise HTTPException(status_code=404, detail="No notes found in folder")
+    
+    headers = attachment_headers(f"{folder.name}.zip")
+    job_id = export_jobs.make_job_id(folder_id, content_version(entries))
+    state = export_jobs.read_job(current_user.id, job_id)
+    if state is not None and state["status"] == "done":
+        return FileResponse(export_jobs.archive_path(current_user.id, job_id), media_type="application/zip", headers=headers)
+    
+    # The archive is produced while it is sent, straight from the image files
+    # (stale annotated pages are rendered as the stream reaches them)
+    return StreamingResponse(
+        stream_zip((entry.arcname, entry.path) for entry in rendered_entries(entries)),
+        media_type="application/zip",
+        headers=headers,
     )
-    folder = result.scalar_one_or_none()
-    if not folder:
-        raise HTTPException(status_code=404, detail="Folder not found")
+
+
+@router.get("/folder/{folder_id}/pdf")
+async def export_folder_pdf(
+    folder_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Export a folder with all its notes and subfolders as one PDF, one page per note
+    - Binarized pages are stored as 1-bit CCITT G4, annotated pages as JPEG
+    - The PDF is streamed while pages are encoded
+    """
+    folder = await get_user_folder(db, folder_id, current_user.id)
     
-    # Create a temporary directory for the export
-    temp_dir = settings.BASE_DIR / "temp_exports"
-    temp_dir.mkdir(exist_ok=True)
-    export_dir = temp_dir / f"export_{folder_id}_{current_user.id}"
+    entries = await plan_folder_export(db, folder_id, current_user.id)
+    if not entries:
+        raise HTTPException(status_code=404, detail="No notes found in folder")
     
-    # Clean up if exists
-    if export_dir.exists():
-        shutil.rmtree(export_dir)
-    export_dir.mkdir()
+    return StreamingResponse(
+        stream_pdf(rendered_entries(entries), folder.name),
+        media_type="application/pdf",
+        headers=attachment_headers(f"{folder.name}.pdf"),
+    )
+
+
+@router.post("/folder/{folder_id}/jobs", response_model=ExportJobResponse)
+async def start_folder_export(
+    folder_id: int,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Start building a folder archive in the background
+    - Returns the job right away; poll GET /export/jobs/{job_id} for progress
+    - An unchanged folder reuses the finished archive (or the running job)
+    """
+    folder = await get_user_folder(db, folder_id, current_user.id)
     
-    try:
-        # Get all subfolders
-        all_folders = [folder] + await get_all_subfolders(db, folder_id, current_user.id)
-        folder_ids = [f.id for f in all_folders]
-        
-        # Create folder structure
-        folder_paths = {}
-        for f in all_folders:
-            relative_path = await get_folder_path(db, f.id, current_user.id)
-            folder_dir = export_dir / relative_path
-            folder_dir.mkdir(parents=True, exist_ok=True)
-            folder_paths[f.id] = relative_path
-        
-        # Get all notes in these folders
-        result = await db.execute(
-            select(Note).where(
-                Note.folder_id.in_(folder_ids),
-                Note.user_id == current_user.id
-            )
-        )
-        notes = result.scalars().all()
-        
-        if not notes:
-            raise HTTPException(status_code=404, detail="No notes found in folder")
-        
-        # Copy annotated images (or processed if annotated doesn't exist)
-        for note in notes:
-            processed_path = settings.BASE_DIR / note.processed_path
-            processed_path_obj = Path(note.processed_path)
-            annotated_path = settings.BASE_DIR / processed_path_obj.parent / f"{processed_path_obj.stem}_annotated{processed_path_obj.suffix}"
-            
-            # Use annotated image if available, otherwise use processed
-            export_path = annotated_path if annotated_path.exists() else processed_path
-            
-            if export_path.exists():
-                folder_path = folder_paths.get(note.folder_id, "")
-                dest_dir = export_dir / folder_path
-                dest_file = dest_dir / f"{note.title}{export_path.suffix}"
-                
-                # Handle duplicate filenames
-                counter = 1
-                while dest_file.exists():
-                    dest_file = dest_dir / f"{note.title}_{counter}{export_path.suffix}"
-                    counter += 1
-                
-                shutil.copy2(export_path, dest_file)
-        
-        # Create zip file
-        zip_path = temp_dir / f"{folder.name}.zip"
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in export_dir.rglob('*'):
-                if file_path.is_file():
-                    arcname = file_path.relative_to(export_dir)
-                    zipf.write(file_path, arcname)
-        
-        # Clean up export directory
-        shutil.rmtree(export_dir)
-        
-        # Use RFC 5987 encoding for filename to support UTF-8
-        encoded_filename = quote(f"{folder.name}.zip")
-        
-        # Return zip file
-        return FileResponse(
-            zip_path,
-            media_type="application/zip",
-            headers={
-                "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
-            },
-            background=lambda: zip_path.unlink() if zip_path.exists() else None
-        )
-        
-    except Exception as e:
-        # Clean up on error
-        if export_dir.exists():
-            shutil.rmtree(export_dir)
-        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+    entries = await plan_folder_export(db, folder_id, current_user.id)
+    if not entries:
+        raise HTTPException(status_code=404, detail="No notes found in folder")
+    
+    state, needs_run = export_jobs.prepare_job(
+        current_user.id, folder_id, content_version(entries), f"{folder.name}.zip", len(entries)
+    )
+    if needs_run:
+        background_tasks.add_task(export_jobs.run_job, current_user.id, state, entries)
+    return job_response(state)
+
+
+@router.get("/jobs/{job_id}", response_model=ExportJobResponse)
+async def get_export_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Progress of an export job"""
+    state = export_jobs.read_job(current_user.id, job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job_response(state)
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_export(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Download a finished archive (supports Range requests for resuming)"""
+    state = export_jobs.read_job(current_user.id, job_id)
+    if state is None or state["status"] != "done":
+        raise HTTPException(status_code=404, detail="Export not ready")
+    return FileResponse(
+        export_jobs.archive_path(current_user.id, job_id),
+        media_type="application/zip",
+        headers=attachment_headers(state["filename"]),
+    )
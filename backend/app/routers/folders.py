@@ -4,32 +4,17 @@ Folders Router
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 
 from app.database import get_db
 from app.models.user import User
 from app.models.folder import Folder
 from app.schemas.folder import FolderCreate, FolderUpdate, FolderResponse, FolderTree
 from app.routers.auth import get_current_user
+from app.services import folder_tree
 
 router = APIRouter(prefix="/folders", tags=["Folders"])
 
 
-def build_folder_tree(folders: list[Folder], parent_id: int | None = None) -> list[FolderTree]:
-    """Recursively build folder tree structure"""
-    tree = []
-    for folder in folders:
-        if folder.parent_id == parent_id:
-            children = build_folder_tree(folders, folder.id)
-            tree.append(FolderTree(
-                id=folder.id,
-                name=folder.name,
-                parent_id=folder.parent_id,
-                children=children
-            ))
-    return tree
-
-
 @router.get("/", response_model=list[FolderResponse])
 async def get_folders(
     db: AsyncSession = Depends(get_db),
@@ -47,12 +32,8 @@ async def get_folder_tree(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get folder tree structure"""
-    result = await db.execute(
-        select(Folder).where(Folder.user_id == current_user.id)
-    )
-    folders = result.scalars().all()
-    return build_folder_tree(folders)
+    """Get folder tree structure with per-folder note counts"""
+    return await folder_tree.get_folder_tree(db, current_user)
 
 
 @router.post("/", response_model=FolderResponse)
@@ -80,6 +61,8 @@ async def create_folder(
     )
     db.add(folder)
     await db.flush()
+    await folder_tree.add_folder(db, folder.id, folder.parent_id)
+    await folder_tree.touch_folder_tree(db, current_user.id)
     await db.refresh(folder)
     return folder
 
@@ -104,12 +87,24 @@ async def update_folder(
     
     if folder_data.name is not None:
         folder.name = folder_data.name
-    if folder_data.parent_id is not None:
+    if folder_data.parent_id is not None and folder_data.parent_id != folder.parent_id:
         # Prevent circular reference
         if folder_data.parent_id == folder_id:
             raise HTTPException(status_code=400, detail="Folder cannot be its own parent")
+        parent_result = await db.execute(
+            select(Folder.id).where(
+                Folder.id == folder_data.parent_id,
+                Folder.user_id == current_user.id
+            )
+        )
+        if parent_result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Parent folder not found")
+        if await folder_tree.is_in_subtree(db, folder_data.parent_id, folder_id):
+            raise HTTPException(status_code=400, detail="Folder cannot be moved into its own subfolder")
         folder.parent_id = folder_data.parent_id
+        await folder_tree.move_folder(db, folder_id, folder_data.parent_id)
     
+    await folder_tree.touch_folder_tree(db, current_user.id)
     await db.flush()
     await db.refresh(folder)
     return folder
@@ -121,16 +116,20 @@ async def delete_folder(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Delete a folder and all its contents"""
+    """
+    Delete a folder and all its contents (subfolders, notes, annotations)
+    Returns how many folders, notes and annotations were deleted; image files
+    are removed in the background
+    """
     result = await db.execute(
-        select(Folder).where(
+        select(Folder.id).where(
             Folder.id == folder_id,
             Folder.user_id == current_user.id
         )
     )
-    folder = result.scalar_one_or_none()
-    if not folder:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Folder not found")
     
-    await db.delete(folder)
-    return {"message": "Folder deleted successfully"}
+    counts = await folder_tree.delete_subtree(db, folder_id)
+    await folder_tree.touch_folder_tree(db, current_user.id)
+    return {"message": "Folder deleted successfully", **counts}
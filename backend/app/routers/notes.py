@@ -2,54 +2,60 @@
 Notes Router - Full CRUD for notes with image upload and processing
 """
 import re
+import json
 import uuid
 import shutil
 import asyncio
+from datetime import datetime
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import FileResponse, JSONResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, and_
+from sqlalchemy import select, func, tuple_, or_, and_, false, distinct, update, delete, insert, exists
 from sqlalchemy.orm import selectinload
-from typing import Optional
+from pydantic import ValidationError
+from PIL import Image
+from typing import Literal, Optional
 
-from app.database import get_db
+from app.database import get_db, async_session
 from app.config import settings
 from app.models.user import User
 from app.models.note import Note, NoteTag
 from app.models.tag import Tag
-from app.models.folder import Folder
-from app.schemas.note import NoteCreate, NoteUpdate, NoteResponse, NoteListResponse, ProcessingParams
-from app.routers.auth import get_current_user
+from app.models.annotation import Annotation
+from app.models.folder import Folder, FolderClosure
+from app.schemas.note import NoteCreate, NoteUpdate, NoteResponse, NoteListResponse, NotePageResponse, NoteSearchResult, NoteImportJobResponse, NoteBulkRequest, NoteBulkResponse, ProcessingParams
+from app.routers.auth import get_current_user, get_user_from_token
 from app.services.image_processor import ImageProcessor, process_note_image
+from app.services.preview import PreviewSession, load_preview_source
+from app.services import tiles, image_delivery, search, import_jobs, file_sweeper, annotation_render
+from app.services.file_sweeper import NoteFiles
+from app.services.image_cache import NoteImageInfo, note_image_cache, mark_images_changed
+from app.utils.paths import (
+    ALLOWED_EXTENSIONS, IMAGE_TYPES, get_annotated_path, resolve_note_image, variant_version,
+    annotated_is_stale, stored_version,
+)
+from app.utils.pagination import encode_cursor, decode_cursor
 
 router = APIRouter(prefix="/notes", tags=["Notes"])
 
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"}
-
-
 def validate_image(filename: str) -> bool:
     """Check if file extension is allowed"""
     return Path(filename).suffix.lower() in ALLOWED_EXTENSIONS
 
 
-@router.get("/", response_model=list[NoteListResponse])
-async def get_notes(
-    folder_id: Optional[int] = Query(None, description="Filter by folder"),
-    folder_ids: Optional[str] = Query(None, description="Filter by multiple folders (comma-separated)"),
-    tag_ids: Optional[str] = Query(None, description="Filter by tag IDs (comma-separated)"),
-    keyword: Optional[str] = Query(None, description="Search keyword"),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+def apply_note_filters(
+    query,
+    user_id: int,
+    folder_id: Optional[int] = None,
+    folder_ids: Optional[str] = None,
+    tag_ids: Optional[str] = None,
+    keyword: Optional[str] = None,
+    tag_mode: str = "and",
+    include_subfolders: bool = False,
 ):
-    """
-    Get all notes with optional filters
-    - folder_id: Filter by single folder
-    - folder_ids: Filter by multiple folders (comma-separated IDs)
-    - tag_ids: Filter by tags (comma-separated IDs)
-    - keyword: Search in title
-    """
-    query = select(Note).where(Note.user_id == current_user.id).options(selectinload(Note.tags))
+    """Apply the note list filters shared by the full list and the paginated list"""
+    query = query.where(Note.user_id == user_id)
     
     # Filter by folder(s)
     if folder_ids is not None:
@@ -61,26 +67,207 @@ async def get_notes(
         # Single folder
         if folder_id == 0:
             query = query.where(Note.folder_id.is_(None))
+        elif include_subfolders:
+            # Folder and all its descendants through the closure table
+            query = query.join(FolderClosure, FolderClosure.c.descendant_id == Note.folder_id).where(
+                FolderClosure.c.ancestor_id == folder_id
+            )
         else:
             query = query.where(Note.folder_id == folder_id)
     
-    # Filter by tags (AND logic: note must have ALL specified tags)
+    # Filter by tags with one subquery on note_tags (index tag_id, note_id), whatever the tag count
+    # - and: note has ALL tags / or: note has ANY tag / not: note has NONE of the tags
     if tag_ids:
-        tag_id_list = [int(tid.strip()) for tid in tag_ids.split(",") if tid.strip()]
+        tag_id_list = sorted({int(tid.strip()) for tid in tag_ids.split(",") if tid.strip()})
         if tag_id_list:
-            # For each tag, join and filter to ensure note has that tag
-            for tag_id in tag_id_list:
-                note_tag_alias = NoteTag.alias()
-                query = query.join(note_tag_alias, Note.id == note_tag_alias.c.note_id).where(note_tag_alias.c.tag_id == tag_id)
+            tagged = select(NoteTag.c.note_id).where(NoteTag.c.tag_id.in_(tag_id_list))
+            if tag_mode == "not":
+                query = query.where(Note.id.not_in(tagged))
+            elif tag_mode == "or":
+                query = query.where(Note.id.in_(tagged))
+            else:
+                tagged = tagged.group_by(NoteTag.c.note_id).having(
+                    func.count(distinct(NoteTag.c.tag_id)) == len(tag_id_list)
+                )
+                query = query.where(Note.id.in_(tagged))
     
-    # Search keyword
+    # Search keyword (full-text index over title and text annotations)
     if keyword:
-        keyword_pattern = f"%{keyword}%"
-        query = query.where(Note.title.ilike(keyword_pattern))
+        match_query = search.build_match_query(keyword)
+        if match_query is None:
+            query = query.where(false())
+        else:
+            matched = select(search.note_search.c.rowid).where(search.match_clause(match_query))
+            query = query.where(Note.id.in_(matched))
     
+    return query
+
+
+# Tags of each note aggregated into a JSON array inside the list query itself (SQLite json1)
+NOTE_TAGS_JSON = (
+    select(func.json_group_array(func.json_object("id", Tag.id, "name", Tag.name, "color", Tag.color)))
+    .select_from(NoteTag.join(Tag, Tag.id == NoteTag.c.tag_id))
+    .where(NoteTag.c.note_id == Note.id)
+    .correlate(Note)
+    .scalar_subquery()
+    .label("tags")
+)
+
+# Only what NoteListResponse (and the pagination cursor) needs
+NOTE_LIST_COLUMNS = (
+    Note.id, Note.title, Note.processed_path, Note.folder_id,
+    Note.image_version, Note.annotation_version,
+    Note.created_at, Note.updated_at, NOTE_TAGS_JSON,
+)
+
+
+def note_list_items(rows) -> list[dict]:
+    """Map projected list rows straight to NoteListResponse dicts (no ORM entities)"""
+    items = []
+    for row in rows:
+        item = row._asdict()
+        item["tags"] = json.loads(item["tags"])
+        items.append(item)
+    return items
+
+
+@router.get("/", response_model=list[NoteListResponse])
+async def get_notes(
+    folder_id: Optional[int] = Query(None, description="Filter by folder"),
+    include_subfolders: bool = Query(False, description="With folder_id, also include notes of all subfolders"),
+    folder_ids: Optional[str] = Query(None, description="Filter by multiple folders (comma-separated)"),
+    tag_ids: Optional[str] = Query(None, description="Filter by tag IDs (comma-separated)"),
+    tag_mode: Literal["and", "or", "not"] = Query("and", description="Match all (and), any (or) or none (not) of tag_ids"),
+    keyword: Optional[str] = Query(None, description="Search keyword"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get all notes with optional filters
+    - folder_id: Filter by single folder (include_subfolders=true for the whole subtree)
+    - folder_ids: Filter by multiple folders (comma-separated IDs)
+    - tag_ids: Filter by tags (comma-separated IDs)
+    - tag_mode: and = all tags, or = any tag, not = none of the tags
+    - keyword: Search in title and text annotations
+    """
+    query = apply_note_filters(
+        select(*NOTE_LIST_COLUMNS),
+        current_user.id, folder_id, folder_ids, tag_ids, keyword, tag_mode, include_subfolders
+    )
     query = query.order_by(Note.updated_at.desc())
     result = await db.execute(query)
-    return result.scalars().unique().all()
+    return note_list_items(result)
+
+
+# sort key -> (column, python type of the cursor value)
+NOTE_SORT_KEYS = {
+    "updated_at": (Note.updated_at, datetime),
+    "created_at": (Note.created_at, datetime),
+    "title": (Note.title, str),
+}
+
+
+@router.get("/page/", response_model=NotePageResponse)
+async def get_notes_page(
+    folder_id: Optional[int] = Query(None, description="Filter by folder"),
+    include_subfolders: bool = Query(False, description="With folder_id, also include notes of all subfolders"),
+    folder_ids: Optional[str] = Query(None, description="Filter by multiple folders (comma-separated)"),
+    tag_ids: Optional[str] = Query(None, description="Filter by tag IDs (comma-separated)"),
+    tag_mode: Literal["and", "or", "not"] = Query("and", description="Match all (and), any (or) or none (not) of tag_ids"),
+    keyword: Optional[str] = Query(None, description="Search keyword"),
+    sort: Literal["updated_at", "created_at", "title"] = Query("updated_at", description="Sort key"),
+    order: Literal["asc", "desc"] = Query("desc", description="Sort direction"),
+    limit: int = Query(50, ge=1, le=200, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    include_total: bool = Query(False, description="Also count all matching notes"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get notes one page at a time (keyset pagination on (sort key, id))
+    - Same filters as GET /notes/
+    - Pass next_cursor back as cursor to get the following page; null means last page
+    - Cursors stay valid while notes are added or edited
+    """
+    sort_column, value_type = NOTE_SORT_KEYS[sort]
+    filtered = apply_note_filters(
+        select(Note.id), current_user.id, folder_id, folder_ids, tag_ids, keyword, tag_mode, include_subfolders
+    )
+    
+    query = filtered.with_only_columns(*NOTE_LIST_COLUMNS)
+    if cursor:
+        try:
+            last_value, last_id = decode_cursor(cursor, f"{sort}:{order}", value_type)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        position = tuple_(sort_column, Note.id)
+        after = tuple_(last_value, last_id)
+        query = query.where(position < after if order == "desc" else position > after)
+    
+    if order == "desc":
+        query = query.order_by(sort_column.desc(), Note.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Note.id.asc())
+    
+    # 多取一条用于判断是否还有下一页
+    result = await db.execute(query.limit(limit + 1))
+    notes = note_list_items(result)
+    next_cursor = None
+    if len(notes) > limit:
+        notes = notes[:limit]
+        last = notes[-1]
+        next_cursor = encode_cursor(f"{sort}:{order}", last[sort], last["id"])
+    
+    total = None
+    if include_total:
+        count_query = select(func.count()).select_from(filtered.subquery())
+        total = (await db.execute(count_query)).scalar_one()
+    
+    return NotePageResponse(items=notes, next_cursor=next_cursor, total=total)
+
+
+@router.get("/search/", response_model=list[NoteSearchResult])
+async def search_notes(
+    q: str = Query(..., min_length=1, description="Search text"),
+    folder_id: Optional[int] = Query(None, description="Filter by folder"),
+    include_subfolders: bool = Query(False, description="With folder_id, also include notes of all subfolders"),
+    folder_ids: Optional[str] = Query(None, description="Filter by multiple folders (comma-separated)"),
+    tag_ids: Optional[str] = Query(None, description="Filter by tag IDs (comma-separated)"),
+    tag_mode: Literal["and", "or", "not"] = Query("and", description="Match all (and), any (or) or none (not) of tag_ids"),
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of results"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Full-text search over note titles and text annotations
+    - Every term must match; Chinese terms match anywhere in the text
+    - Best matches first (title hits rank above annotation hits)
+    - title_highlight / snippet wrap hits in <mark> (the rest is HTML-escaped)
+    """
+    match_query = search.build_match_query(q)
+    if match_query is None:
+        return []
+    
+    query = apply_note_filters(
+        select(
+            *NOTE_LIST_COLUMNS,
+            search.highlight_expression(0, snippet=False).label("title_highlight"),
+            search.highlight_expression(1, snippet=True).label("snippet"),
+        ).join(search.note_search, search.note_search.c.rowid == Note.id),
+        current_user.id, folder_id, folder_ids, tag_ids,
+        tag_mode=tag_mode, include_subfolders=include_subfolders
+    )
+    query = (
+        query.where(search.match_clause(match_query))
+        .order_by(search.rank_expression(), Note.updated_at.desc())
+        .limit(limit)
+    )
+    result = await db.execute(query)
+    items = note_list_items(result)
+    for item in items:
+        item["title_highlight"] = search.render_highlight(item["title_highlight"])
+        item["snippet"] = search.render_highlight(item["snippet"])
+    return items
 
 
 @router.get("/{note_id}/", response_model=NoteResponse)
@@ -218,6 +405,132 @@ async def upload_note(
         raise HTTPException(status_code=500, detail=f"Failed to process image: {str(e)}")
 
 
+@router.post("/import/", response_model=NoteImportJobResponse)
+async def import_notes(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    folder_id: Optional[int] = Form(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Import a ZIP of note photos in the background
+    - Every image becomes a note titled after its file name, processed like an upload
+    - Directories in the archive become folders under folder_id (0 or empty = top level)
+    - Images that cannot be read are skipped and listed in `failed`
+    - Returns the job right away; poll GET /notes/import/{job_id}/ for progress and the result
+    """
+    if folder_id == 0:
+        folder_id = None
+    elif folder_id:
+        folder_result = await db.execute(
+            select(Folder).where(Folder.id == folder_id, Folder.user_id == current_user.id)
+        )
+        if not folder_result.scalar_one_or_none():
+            raise HTTPException(status_code=404, detail="Folder not found")
+    
+    try:
+        state = await asyncio.to_thread(import_jobs.create_job, current_user.id, file.file, folder_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    background_tasks.add_task(import_jobs.run_job, current_user.id, state)
+    return state
+
+
+@router.get("/import/{job_id}/", response_model=NoteImportJobResponse)
+async def get_import_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Progress of a ZIP import job; `notes`, `folders` and `failed` are final once status is done"""
+    state = import_jobs.read_job(current_user.id, job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return state
+
+
+@router.post("/bulk/", response_model=NoteBulkResponse)
+async def bulk_update_notes(
+    data: NoteBulkRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Apply one action to many notes in a single transaction
+    - move: set folder_id (None or 0 = uncategorized)
+    - tag / untag: add or remove tag_ids
+    - delete: remove the notes; their files are deleted in the background
+    Each id gets its own result; ids that are not the user's notes fail with "Note not found"
+    """
+    note_ids = list(dict.fromkeys(data.note_ids))
+    result = await db.execute(
+        select(Note.id, Note.original_path, Note.processed_path)
+        .where(Note.id.in_(note_ids), Note.user_id == current_user.id)
+    )
+    notes = {row.id: row for row in result}
+    owned = list(notes)
+    
+    if data.action == "move":
+        folder_id = data.folder_id or None
+        if folder_id is not None:
+            folder_result = await db.execute(
+                select(Folder.id).where(Folder.id == folder_id, Folder.user_id == current_user.id)
+            )
+            if folder_result.scalar_one_or_none() is None:
+                raise HTTPException(status_code=404, detail="Folder not found")
+        if owned:
+            await db.execute(
+                update(Note).where(Note.id.in_(owned))
+                .values(folder_id=folder_id)
+                .execution_options(synchronize_session=False)
+            )
+    
+    elif data.action in ("tag", "untag"):
+        if not data.tag_ids:
+            raise HTTPException(status_code=400, detail="tag_ids is required")
+        tag_ids = set(data.tag_ids)
+        tag_result = await db.execute(
+            select(Tag.id).where(Tag.id.in_(tag_ids), Tag.user_id == current_user.id)
+        )
+        if set(tag_result.scalars().all()) != tag_ids:
+            raise HTTPException(status_code=404, detail="Tag not found")
+        if owned and data.action == "tag":
+            # Only pairs that do not exist yet
+            await db.execute(insert(NoteTag).from_select(
+                ["note_id", "tag_id"],
+                select(Note.id, Tag.id)
+                .select_from(Note)
+                .join(Tag, Tag.id.in_(tag_ids))
+                .where(Note.id.in_(owned))
+                .where(~exists().where(NoteTag.c.note_id == Note.id, NoteTag.c.tag_id == Tag.id)),
+            ))
+        elif owned:
+            await db.execute(delete(NoteTag).where(NoteTag.c.note_id.in_(owned), NoteTag.c.tag_id.in_(tag_ids)))
+    
+    elif owned:
+        await db.execute(delete(Annotation).where(Annotation.note_id.in_(owned)))
+        await db.execute(delete(NoteTag).where(NoteTag.c.note_id.in_(owned)))
+        await db.execute(
+            delete(Note).where(Note.id.in_(owned)).execution_options(synchronize_session=False)
+        )
+        search.mark_search_changed(db.sync_session, *owned)
+        mark_images_changed(db.sync_session, *owned)
+        file_sweeper.queue_note_files(db.sync_session, *(
+            NoteFiles(note_id, notes[note_id].original_path, notes[note_id].processed_path) for note_id in owned
+        ))
+    
+    await db.commit()
+    
+    return NoteBulkResponse(
+        action=data.action,
+        succeeded=len(owned),
+        results=[
+            {"id": note_id, "ok": True} if note_id in notes else {"id": note_id, "ok": False, "detail": "Note not found"}
+            for note_id in note_ids
+        ],
+    )
+
+
 @router.put("/{note_id}/", response_model=NoteResponse)
 async def update_note(
     note_id: int,
@@ -241,16 +554,12 @@ async def update_note(
     if note_data.folder_id is not None:
         note.folder_id = note_data.folder_id
     
-    # Update tags
+    # Update tags (unknown ids are ignored)
     if note_data.tag_ids is not None:
-        note.tags.clear()
-        for tid in note_data.tag_ids:
-            tag_result = await db.execute(
-                select(Tag).where(Tag.id == tid, Tag.user_id == current_user.id)
-            )
-            tag = tag_result.scalar_one_or_none()
-            if tag:
-                note.tags.append(tag)
+        tag_result = await db.execute(
+            select(Tag).where(Tag.id.in_(note_data.tag_ids), Tag.user_id == current_user.id)
+        )
+        note.tags = list(tag_result.scalars().all())
     
     await db.flush()
     await db.refresh(note)
@@ -292,11 +601,76 @@ async def reprocess_note(
     
     # Update params in database
     note.processing_params = params.model_dump()
+    note.bump_image_version()
     await db.flush()
     await db.refresh(note)
     return note
 
 
+@router.websocket("/{note_id}/preview/")
+async def preview_note(
+    websocket: WebSocket,
+    note_id: int,
+    token: str = Query(..., description="JWT access token")
+):
+    """
+    Live preview channel for parameter adjustment
+    - Client sends ProcessingParams as JSON, as often as it likes
+    - Server renders only the newest params (stale ones are skipped) and pushes
+      a {"type": "frame", "seq", "params"} message followed by the JPEG bytes
+    - Nothing is persisted; call /reprocess/ to apply the final params
+    """
+    async with async_session() as db:
+        user = await get_user_from_token(token, db)
+        note = None
+        if user:
+            result = await db.execute(
+                select(Note).where(Note.id == note_id, Note.user_id == user.id)
+            )
+            note = result.scalar_one_or_none()
+    if not note:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    original_path = settings.BASE_DIR / note.original_path
+    try:
+        source, scale = await asyncio.to_thread(load_preview_source, str(original_path))
+    except ValueError:
+        await websocket.send_json({"type": "error", "detail": "Original image not found"})
+        await websocket.close()
+        return
+    
+    session = PreviewSession(source, scale)
+    
+    async def receive_params():
+        while True:
+            try:
+                params = ProcessingParams.model_validate_json(await websocket.receive_text())
+            except ValidationError as e:
+                await websocket.send_json({
+                    "type": "error",
+                    "detail": e.errors(include_url=False, include_context=False),
+                })
+                continue
+            session.submit(params.model_dump())
+    
+    async def send_frames():
+        async for seq, params, frame in session.frames():
+            await websocket.send_json({"type": "frame", "seq": seq, "params": params})
+            await websocket.send_bytes(frame)
+    
+    # 任一方向结束（通常是客户端断开）即关闭整个会话
+    tasks = [asyncio.create_task(receive_params()), asyncio.create_task(send_frames())]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    for task in done:
+        exc = task.exception()
+        if exc and not isinstance(exc, WebSocketDisconnect):
+            raise exc
+
+
 @router.post("/{note_id}/rotate/", response_model=NoteResponse)
 async def rotate_note(
     note_id: int,
@@ -336,6 +710,8 @@ async def rotate_note(
             rotated = img.rotate(-angle, expand=True)
             rotated.save(processed_path)
     
+    note.bump_image_version()
+    await db.flush()
     await db.refresh(note)
     return note
 
@@ -380,6 +756,8 @@ async def crop_note(
     params = note.processing_params or {}
     processor.process_with_params(str(original_path), str(processed_path), params)
     
+    note.bump_image_version()
+    await db.flush()
     await db.refresh(note)
     return note
 
@@ -398,36 +776,45 @@ async def delete_note(
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
     
-    # Delete image files
-    try:
-        original_path = settings.BASE_DIR / note.original_path
-        processed_path = settings.BASE_DIR / note.processed_path
-        if original_path.exists():
-            original_path.unlink()
-        if processed_path and processed_path.exists():
-            processed_path.unlink()
-    except Exception:
-        pass  # Continue even if file deletion fails
-    
+    # Image files are removed in the background once the deletion is committed
     await db.delete(note)
     return {"message": "Note deleted successfully"}
 
 
+async def _get_image_info(note_id: int, db: AsyncSession) -> NoteImageInfo | None:
+    """Image info of a note from the per-worker cache, loaded on a miss (None if not found)"""
+    info = note_image_cache.get(note_id)
+    if info is None:
+        snapshot = note_image_cache.snapshot()
+        result = await db.execute(
+            select(
+                Note.original_path, Note.processed_path,
+                Note.image_version, Note.annotation_version, Note.annotated_version,
+            ).where(Note.id == note_id)
+        )
+        row = result.one_or_none()
+        if row:
+            info = await asyncio.to_thread(NoteImageInfo.load, note_id, *row)
+            note_image_cache.put(info, snapshot)
+    return info
+
+
 @router.get("/{note_id}/image/{image_type}")
 async def get_note_image(
     note_id: int,
     image_type: str,
+    request: Request,
+    v: Optional[str] = Query(None, description="Variant version (image_version / annotation_version)"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get note image file (public access)
     - image_type: 'original', 'processed', or 'annotated'
+    - Encoded as AVIF/WebP when the Accept header allows, otherwise PNG/progressive JPEG
+    - URLs with the current ?v= are immutable; If-None-Match is answered with 304
     """
-    result = await db.execute(
-        select(Note).where(Note.id == note_id)
-    )
-    note = result.scalar_one_or_none()
-    if not note:
+    info = await _get_image_info(note_id, db)
+    if not info:
         # 如果笔记不存在，返回默认示例图片
         default_image = settings.BASE_DIR / "backend" / "app" / "static" / "example_note.jpg"
         if default_image.exists():
@@ -435,22 +822,34 @@ async def get_note_image(
         else:
             raise HTTPException(status_code=404, detail="Note not found")
     
-    if image_type == "original":
-        image_path = settings.BASE_DIR / note.original_path
-    elif image_type == "processed":
-        image_path = settings.BASE_DIR / note.processed_path
-    elif image_type == "annotated":
-        # 尝试获取带标记的图片，如果不存在则返回处理后的图片
-        processed_path = Path(note.processed_path)
-        annotated_path = settings.BASE_DIR / processed_path.parent / f"{processed_path.stem}_annotated{processed_path.suffix}"
-        if annotated_path.exists():
-            return FileResponse(annotated_path)
-        else:
-            image_path = settings.BASE_DIR / note.processed_path
-    else:
+    if image_type not in IMAGE_TYPES:
         raise HTTPException(status_code=400, detail="Invalid image type. Use 'original', 'processed', or 'annotated'")
     
-    if not image_path.exists():
+    if image_type == "annotated" and annotated_is_stale(info):
+        # 带标记的图片按需渲染，并发请求共用同一次渲染
+        try:
+            await annotation_render.ensure_rendered(note_id)
+        except Exception as e:
+            print(f"⚠️ Annotation render failed for note {note_id}: {e}")
+        info = await _get_image_info(note_id, db) or info
+    
+    # 版本号和 ETag 只依赖数据库字段，命中缓存时无需访问文件
+    version = variant_version(info, image_type)
+    versioned = v == version
+    if image_type == "annotated" and annotated_is_stale(info):
+        # 渲染失败时返回上一次的渲染结果：ETag 对应实际内容，且不允许长期缓存
+        version = info.annotated_version or "0"
+        versioned = False
+    fmt = image_delivery.negotiate_format(request.headers.get("accept"), image_type == "processed")
+    etag = image_delivery.make_etag(note_id, image_type, version, fmt)
+    headers = image_delivery.cache_headers(etag, versioned=versioned)
+    if image_delivery.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    # annotated 不存在时回退到处理后的图片
+    variant_type, image_path, exists = info.resolve(image_type)
+    
+    if not exists:
         # 如果图片文件不存在，返回默认示例图片
         default_image = settings.BASE_DIR / "backend" / "app" / "static" / "example_note.jpg"
         if default_image.exists():
@@ -458,4 +857,83 @@ async def get_note_image(
         else:
             raise HTTPException(status_code=404, detail="Image file not found")
     
-    return FileResponse(image_path)
+    served_path = await image_delivery.get_delivery_variant(
+        note_id, variant_type, stored_version(info, variant_type), image_path, fmt
+    )
+    return image_delivery.file_response(served_path, fmt.media_type, headers)
+
+
+TILE_NAME_PATTERN = re.compile(r"^(\d+)_(\d+)(?:\.jpg)?$")
+
+
+async def _get_tile_source(note_id: int, image_type: str, db: AsyncSession) -> tuple[Note, str, Path]:
+    """Resolve (note, effective_type, path) of the source image a tile pyramid is cut from"""
+    result = await db.execute(
+        select(Note).where(Note.id == note_id)
+    )
+    note = result.scalar_one_or_none()
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    if image_type == "annotated" and annotated_is_stale(note):
+        try:
+            await annotation_render.ensure_rendered(note_id)
+        except Exception as e:
+            print(f"⚠️ Annotation render failed for note {note_id}: {e}")
+        await db.refresh(note)
+    
+    resolved = resolve_note_image(note, image_type)
+    if resolved is None:
+        raise HTTPException(status_code=400, detail="Invalid image type. Use 'original', 'processed', or 'annotated'")
+    source_type, source_path = resolved
+    if not source_path.exists():
+        raise HTTPException(status_code=404, detail="Image file not found")
+    return note, source_type, source_path
+
+
+@router.get("/{note_id}/tiles/")
+async def get_note_tiles_info(
+    note_id: int,
+    image_type: str = Query("processed", description="'original', 'processed', or 'annotated'"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Deep zoom descriptor for the full-screen viewer (public access)
+    Tile URLs carry the variant version, so tiles can be cached forever
+    """
+    note, source_type, source_path = await _get_tile_source(note_id, image_type, db)
+    await tiles.get_pyramid(note_id, source_type, stored_version(note, source_type), source_path)
+    with Image.open(source_path) as img:
+        width, height = img.size
+    
+    version = stored_version(note, image_type)
+    info = tiles.describe(width, height)
+    info["version"] = version
+    info["tile_url"] = f"/api/notes/{note_id}/tiles/{{level}}/{{x}}_{{y}}?image_type={image_type}&v={version}"
+    return JSONResponse(info, headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/{note_id}/tiles/{level}/{tile}")
+async def get_note_tile(
+    note_id: int,
+    level: int,
+    tile: str,
+    image_type: str = Query("processed", description="'original', 'processed', or 'annotated'"),
+    v: Optional[str] = Query(None, description="Variant version from the tiles descriptor"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a single deep zoom tile, e.g. /tiles/12/3_5 (public access)"""
+    match = TILE_NAME_PATTERN.match(tile)
+    if not match:
+        raise HTTPException(status_code=400, detail="Invalid tile name. Use '{x}_{y}'")
+    col, row = int(match.group(1)), int(match.group(2))
+    
+    note, source_type, source_path = await _get_tile_source(note_id, image_type, db)
+    pyramid = await tiles.get_pyramid(note_id, source_type, stored_version(note, source_type), source_path)
+    path = tiles.tile_path(pyramid, level, col, row)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Tile not found")
+    
+    # 只有版本匹配的 URL 才能被长期缓存
+    versioned = v == variant_version(note, image_type) and not annotated_is_stale(note)
+    cache_control = image_delivery.IMMUTABLE_CACHE_CONTROL if versioned else "no-cache"
+    return image_delivery.file_response(path, "image/jpeg", {"Cache-Control": cache_control})
@@ -0,0 +1,69 @@
+"""
+Backup Schemas
+"""
+from datetime import datetime
+from typing import Literal
+from pydantic import BaseModel, Field
+
+
+class RestoreResponse(BaseModel):
+    """What a restore created"""
+    folders: int
+    tags: int            # 新建的标签（同名标签会复用）
+    notes: int
+    annotations: int
+    files: int
+
+
+# ---------- manifest.json (validated before a restore touches the database) ----------
+
+class BackupFile(BaseModel):
+    path: str
+    size: int = Field(..., ge=0)
+    mtime_ns: int
+    sha256: str = Field(..., pattern=r"^[0-9a-f]{64}$")
+    suffix: str = Field(..., pattern=r"^\.[a-z0-9]{1,5}$")
+
+
+class BackupAnnotation(BaseModel):
+    content: str
+    x: float
+    y: float
+    font_size: float | None = None
+    color: str | None = Field(None, max_length=20)
+    created_at: datetime | None = None
+
+
+class BackupNote(BaseModel):
+    id: int
+    title: str = Field(..., max_length=200)
+    folder_id: int | None = None
+    processing_params: dict | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    tag_ids: list[int] = []
+    annotations: list[BackupAnnotation] = []
+    files: dict[Literal["original", "processed", "annotated"], BackupFile]
+
+
+class BackupFolder(BaseModel):
+    id: int
+    name: str = Field(..., max_length=100)
+    parent_id: int | None = None
+    created_at: datetime | None = None
+
+
+class BackupTag(BaseModel):
+    id: int
+    name: str = Field(..., max_length=50)
+    color: str = Field(..., max_length=20)
+
+
+class BackupManifest(BaseModel):
+    format: int
+    id: str
+    base_id: str | None = None
+    created_at: datetime
+    folders: list[BackupFolder]
+    tags: list[BackupTag]
+    notes: list[BackupNote]
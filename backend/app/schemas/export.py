@@ -0,0 +1,17 @@
+"""
+Export Schemas
+"""
+from pydantic import BaseModel
+
+
+class ExportJobResponse(BaseModel):
+    """State of a background folder export"""
+    job_id: str
+    folder_id: int
+    filename: str
+    status: str          # running / done / failed
+    done: int
+    total: int
+    bytes: int
+    error: str | None = None
+    download_url: str | None = None
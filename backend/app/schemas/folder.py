@@ -30,6 +30,8 @@ class FolderTree(BaseModel):
     id: int
     name: str
     parent_id: int | None
+    note_count: int = 0
+    total_note_count: int = 0
     children: list["FolderTree"] = []
 
     class Config:
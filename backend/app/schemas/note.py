@@ -2,6 +2,7 @@
 Note Schemas
 """
 from datetime import datetime
+from typing import Literal
 from pydantic import BaseModel, Field
 from app.schemas.tag import TagResponse
 
@@ -35,6 +36,8 @@ class NoteResponse(BaseModel):
     folder_id: int | None
     user_id: int
     processing_params: dict | None
+    image_version: int = 1
+    annotation_version: int = 0
     tags: list[TagResponse] = []
     created_at: datetime
     updated_at: datetime
@@ -48,8 +51,56 @@ class NoteListResponse(BaseModel):
     title: str
     processed_path: str | None
     folder_id: int | None
+    image_version: int = 1
+    annotation_version: int = 0
     tags: list[TagResponse] = []
     created_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class NoteSearchResult(NoteListResponse):
+    """Search hit with highlighted title and annotation snippet (HTML with <mark>)"""
+    title_highlight: str | None = None
+    snippet: str | None = None
+
+
+class NotePageResponse(BaseModel):
+    """One keyset page of the note list"""
+    items: list[NoteListResponse]
+    next_cursor: str | None = None
+    total: int | None = None
+
+
+class NoteImportJobResponse(BaseModel):
+    """State of a background ZIP bulk import"""
+    job_id: str
+    folder_id: int | None = None
+    status: str                  # running / done / failed
+    done: int                    # 已处理的图片数
+    total: int                   # 压缩包中的图片数（开始处理后才知道）
+    notes: int                   # 已导入的笔记数
+    folders: int                 # 新建的文件夹（同名文件夹会复用）
+    failed: list[str] = []       # 无法读取的图片在压缩包中的路径
+    error: str | None = None
+
+
+class NoteBulkRequest(BaseModel):
+    """One action applied to many notes at once"""
+    note_ids: list[int] = Field(..., min_length=1, max_length=1000)
+    action: Literal["move", "tag", "untag", "delete"]
+    folder_id: int | None = None      # move: target folder (None or 0 = uncategorized)
+    tag_ids: list[int] = []           # tag / untag
+
+
+class NoteBulkResult(BaseModel):
+    id: int
+    ok: bool
+    detail: str | None = None
+
+
+class NoteBulkResponse(BaseModel):
+    action: str
+    succeeded: int
+    results: list[NoteBulkResult]
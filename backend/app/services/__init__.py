@@ -3,6 +3,7 @@ Business Logic Services
 """
 from app.services.image_processor import ImageProcessor, ProcessingParams, process_note_image
 from app.services.ai_agent import AIAgent, ai_agent, interpret_adjustment
+from app.services.preview import PreviewSession, load_preview_source
 
 __all__ = [
     "ImageProcessor",
@@ -11,4 +12,6 @@ __all__ = [
     "AIAgent",
     "ai_agent",
     "interpret_adjustment",
+    "PreviewSession",
+    "load_preview_source",
 ]
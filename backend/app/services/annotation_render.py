@@ -0,0 +1,585 @@
+"""
+Annotation Rendering - Draw a note's annotations onto its processed image
+
+Annotation writes just bump notes.annotation_version (the note's annotation
+revision); notes.annotated_version records the variant version the stored
+render was made from, and while it lags behind the note (reprocess / rotate /
+crop make it lag too) the render is stale. Stale renders are made:
+- on demand, when their output is consumed: the annotated image endpoint, the
+  tiles and the exports call ensure_rendered() / render_stale() first
+- ahead of time, once a write commits: a burst of edits is debounced into one
+  background render (PrerenderScheduler), so the next view is usually ready
+
+- Concurrent requests for the same note wait on a single in-flight render
+- Rendering runs on a worker thread and the result is swapped in atomically,
+  only if the note did not change meanwhile (otherwise it is rendered again)
+- If a render fails, the previous render is served without long-term caching
+
+Each worker keeps the decoded processed image and the last render of the
+ANNOTATION_RENDER_CACHE_SIZE most recently rendered notes. Annotations are laid
+out as primitives with a pixel bounding box, and a render re-composites only
+the rectangles of annotations added, changed or removed since the last one.
+"""
+import asyncio
+import math
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from PIL import Image, ImageDraw, ImageFont
+from sqlalchemy import select, update, and_, or_, cast, String, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import async_session
+from app.models.note import Note
+from app.models.annotation import Annotation
+from app.services import fonts
+from app.services.image_cache import mark_images_changed
+from app.utils.annotations import parse_annotation_content
+from app.utils.paths import get_annotated_path, variant_version, annotated_is_stale
+
+# 笔记在渲染期间被修改时重新渲染的次数上限
+MAX_ATTEMPTS = 3
+
+
+def hex_to_rgb(hex_color: str) -> tuple:
+    """Convert hex color to RGB tuple"""
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+@dataclass(frozen=True)
+class Shape:
+    """One drawing primitive of an annotation, in image pixel coordinates"""
+    kind: str                 # 'line', 'polygon' or 'text'
+    points: tuple             # line/polygon vertices, or the text position
+    fill: tuple
+    width: int = 0
+    text: str = ""
+    font: ImageFont.ImageFont | ImageFont.FreeTypeFont | None = None
+
+
+@dataclass(frozen=True)
+class AnnotationShapes:
+    """An annotation laid out for one image size: its primitives and their bounding box"""
+    key: tuple
+    shapes: tuple[Shape, ...]
+    bbox: tuple[int, int, int, int]
+
+
+def _annotation_key(annotation) -> tuple:
+    """Everything the rendering of an annotation depends on"""
+    return (annotation.id, annotation.content, annotation.x, annotation.y, annotation.font_size, annotation.color)
+
+
+def annotation_shapes(annotation, width: int, height: int) -> list[Shape]:
+    """将一个标记转换为绘制图元（像素坐标），与前端 SVG 渲染保持一致"""
+    parsed = parse_annotation_content(annotation.content)
+    ann_type = parsed['type']
+    ann_data = parsed['data']
+
+    # 获取标注颜色
+    color_hex = annotation.color or '#1890ff'
+    fill = hex_to_rgb(color_hex) + (255,)
+
+    # 获取字体大小/线条粗细
+    # 前端: strokeWidth = font_size * 0.15 (在SVG viewBox 0-100坐标系中)
+    # 转换到像素: stroke_width_px = font_size * 0.15 * (image_size / 100)
+    font_size = annotation.font_size or 1.0
+    # 使用图片对角线长度的比例来计算线条粗细，与前端SVG渲染保持一致
+    scale_factor = min(width, height) / 100
+    stroke_width = max(1, int(font_size * 0.15 * scale_factor))
+
+    # 计算位置（百分比转像素）
+    x = int(annotation.x * width / 100)
+    y = int(annotation.y * height / 100)
+
+    if ann_type == 'text':
+        # 文字标注 - 直接绘制文字（不绘制圆点）
+        text_content = str(ann_data)
+        text_font_size = max(14, int(font_size * min(width, height) / 50))
+
+        font = fonts.get_font(text_font_size)
+
+        # 计算文字位置（直接在标注点位置）
+        text_x = x
+        text_y = y - text_font_size // 2
+
+        # 获取文字边界框
+        bbox = font.getbbox(text_content)
+        text_width = bbox[2] - bbox[0]
+        text_height = bbox[3] - bbox[1]
+
+        # 确保不超出图片边界
+        if text_x + text_width + 10 > width:
+            text_x = width - text_width - 10
+        if text_x < 5:
+            text_x = 5
+        if text_y < 5:
+            text_y = 5
+        if text_y + text_height > height - 5:
+            text_y = height - text_height - 5
+
+        # 直接绘制文字（使用标注颜色，不绘制背景框）
+        return [Shape('text', ((text_x, text_y),), fill, text=text_content, font=font)]
+
+    if ann_type == 'line':
+        # 直线
+        x2 = int(ann_data['x2'] * width / 100)
+        y2 = int(ann_data['y2'] * height / 100)
+        return [Shape('line', ((x, y), (x2, y2)), fill, stroke_width)]
+
+    if ann_type == 'arrow':
+        # 箭头
+        x2 = int(ann_data['x2'] * width / 100)
+        y2 = int(ann_data['y2'] * height / 100)
+
+        # 绘制箭头头部 - 与前端一致: arrowSize = strokeWidth * 4
+        angle = math.atan2(y2 - y, x2 - x)
+        arrow_size = stroke_width * 3  # 稍微小一点，避免太大
+
+        # 箭头的两个点
+        arrow_angle = math.pi / 6  # 30度
+        p1_x = x2 - arrow_size * math.cos(angle - arrow_angle)
+        p1_y = y2 - arrow_size * math.sin(angle - arrow_angle)
+        p2_x = x2 - arrow_size * math.cos(angle + arrow_angle)
+        p2_y = y2 - arrow_size * math.sin(angle + arrow_angle)
+
+        return [
+            Shape('line', ((x, y), (x2, y2)), fill, stroke_width),
+            Shape('polygon', ((x2, y2), (p1_x, p1_y), (p2_x, p2_y)), fill),
+        ]
+
+    if ann_type == 'wave':
+        # 波浪线 - 使用与前端相同的贝塞尔曲线算法
+        # 前端使用百分比坐标，这里转换为像素
+        x1_pct = annotation.x
+        y1_pct = annotation.y
+        x2_pct = ann_data['x2']
+        y2_pct = ann_data['y2']
+
+        dx_pct = x2_pct - x1_pct
+        dy_pct = y2_pct - y1_pct
+        length_pct = math.sqrt(dx_pct * dx_pct + dy_pct * dy_pct)
+        wave_count = max(3, int(length_pct / 3))  # 与前端一致
+        amplitude_pct = font_size * 0.15 * 3  # strokeWidth * 3
+
+        # 生成波浪线的点（模拟贝塞尔曲线）
+        points = []
+        num_points = wave_count * 20  # 足够多的点来平滑曲线
+
+        for i in range(num_points + 1):
+            t = i / num_points
+            # 基础位置
+            base_x = x1_pct + dx_pct * t
+            base_y = y1_pct + dy_pct * t
+
+            # 计算当前在哪个波段
+            wave_progress = t * wave_count
+            wave_index = int(wave_progress)
+            wave_t = wave_progress - wave_index
+
+            # 使用正弦函数模拟贝塞尔曲线的波浪效果
+            # 前端的Q命令在每个波段的中点达到最大振幅
+            wave_offset = amplitude_pct * math.sin(wave_t * math.pi) * (1 if wave_index % 2 == 0 else -1)
+
+            # 垂直于线条方向的偏移
+            if length_pct > 0:
+                perp_x = -dy_pct / length_pct
+                perp_y = dx_pct / length_pct
+            else:
+                perp_x, perp_y = 0, 0
+
+            final_x = (base_x + perp_x * wave_offset) * width / 100
+            final_y = (base_y + perp_y * wave_offset) * height / 100
+            points.append((final_x, final_y))
+
+        return [Shape('line', tuple(points), fill, stroke_width)]
+
+    if ann_type == 'draw':
+        # 自由绘制 - 与前端一致: strokeWidth * 0.7
+        if isinstance(ann_data, list) and len(ann_data) >= 2:
+            points = tuple((int(p['x'] * width / 100), int(p['y'] * height / 100)) for p in ann_data)
+            draw_stroke = max(1, int(stroke_width * 0.7))
+            return [Shape('line', points, fill, draw_stroke)]
+    return []
+
+
+def _shapes_bbox(shapes: list[Shape]) -> tuple[int, int, int, int]:
+    """Pixel bounding box of a list of primitives (with a margin for line caps and anti-aliasing)"""
+    boxes = []
+    for shape in shapes:
+        if shape.kind == 'text':
+            x, y = shape.points[0]
+            left, top, right, bottom = shape.font.getbbox(shape.text)
+            boxes.append((x + left, y + top, x + right, y + bottom))
+        else:
+            xs = [point[0] for point in shape.points]
+            ys = [point[1] for point in shape.points]
+            boxes.append((min(xs), min(ys), max(xs), max(ys)))
+    if not boxes:
+        return 0, 0, 0, 0
+    margin = max((shape.width for shape in shapes), default=0) + 2
+    return (
+        math.floor(min(box[0] for box in boxes)) - margin,
+        math.floor(min(box[1] for box in boxes)) - margin,
+        math.ceil(max(box[2] for box in boxes)) + margin,
+        math.ceil(max(box[3] for box in boxes)) + margin,
+    )
+
+
+def layout_annotation(annotation, width: int, height: int) -> AnnotationShapes:
+    shapes = annotation_shapes(annotation, width, height)
+    return AnnotationShapes(_annotation_key(annotation), tuple(shapes), _shapes_bbox(shapes))
+
+
+def _draw_shapes(draw: ImageDraw.ImageDraw, shapes, dx: int, dy: int):
+    """Draw primitives onto a region whose top-left corner is at (dx, dy) in the image"""
+    for shape in shapes:
+        points = [(px - dx, py - dy) for px, py in shape.points]
+        if shape.kind == 'text':
+            draw.text(points[0], shape.text, fill=shape.fill, font=shape.font)
+        elif shape.kind == 'polygon':
+            draw.polygon(points, fill=shape.fill)
+        else:
+            draw.line(points, fill=shape.fill, width=shape.width)
+
+
+def _intersects(a: tuple, b: tuple) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _merge_rects(rects: list[tuple], width: int, height: int) -> list[tuple]:
+    """Clip rectangles to the image and merge overlapping ones"""
+    merged = []
+    for rect in rects:
+        rect = (max(0, rect[0]), max(0, rect[1]), min(width, rect[2]), min(height, rect[3]))
+        if rect[0] >= rect[2] or rect[1] >= rect[3]:
+            continue
+        while True:
+            overlapping = [other for other in merged if _intersects(rect, other)]
+            if not overlapping:
+                break
+            for other in overlapping:
+                merged.remove(other)
+                rect = (min(rect[0], other[0]), min(rect[1], other[1]), max(rect[2], other[2]), max(rect[3], other[3]))
+        merged.append(rect)
+    return merged
+
+
+@dataclass
+class RenderState:
+    """What the last render of a note was made from, kept to re-composite only what changed"""
+    image_version: int
+    base: Image.Image                       # 处理后的图片（原始模式，二值化后通常为 L）
+    image: Image.Image | None               # 带标记的图片 (RGB)
+    layouts: dict[int, AnnotationShapes]    # annotation id -> 上次绘制的图元
+
+
+class RenderStateCache:
+    """Thread-safe LRU of note id -> RenderState (one per worker)"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[int, RenderState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pop(self, note_id: int) -> RenderState | None:
+        # 取出后由渲染线程独占，完成后再放回
+        with self._lock:
+            return self._entries.pop(note_id, None)
+
+    def put(self, note_id: int, state: RenderState):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[note_id] = state
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+render_states = RenderStateCache(settings.ANNOTATION_RENDER_CACHE_SIZE)
+
+
+def _composite(state: RenderState, rect: tuple, layouts: list[AnnotationShapes]):
+    """Re-composite one rectangle of the render from the base image and the annotations over it"""
+    full = rect == (0, 0, *state.base.size)
+    region = state.base.convert('RGBA') if full else state.base.crop(rect).convert('RGBA')
+    # 创建一个透明的overlay用于绘制标注
+    overlay = Image.new('RGBA', region.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    for layout in layouts:
+        if _intersects(layout.bbox, rect):
+            _draw_shapes(draw, layout.shapes, rect[0], rect[1])
+    # 合并overlay到原图
+    composed = Image.alpha_composite(region, overlay).convert('RGB')
+    if full:
+        state.image = composed
+    else:
+        state.image.paste(composed, rect[:2])
+
+
+def render_annotations(note_id: int, image_version: int, processed_path: Path, annotations: list) -> Image.Image:
+    """
+    将标记渲染到处理后的图片上，返回带标记的 RGB 图片（阻塞）
+    With the previous render of the note cached, only the rectangles covered by
+    added, changed or removed annotations are re-composited; the whole image is
+    redrawn when the processed image changed or most of it is dirty anyway
+    (wide lines crossing a rectangle edge may differ from a full redraw by single edge pixels)
+    """
+    state = render_states.pop(note_id)
+    if state is None or state.image_version != image_version:
+        # 使用PIL读取图片以支持中文文字
+        with Image.open(str(processed_path)) as img:
+            img.load()
+            base = img if img.mode in ('L', 'RGB', 'RGBA') else img.convert('RGBA')
+        state = RenderState(image_version, base, None, {})
+        dirty = [(0, 0, *base.size)]
+    else:
+        dirty = None
+    width, height = state.base.size
+
+    layouts = []
+    for annotation in sorted(annotations, key=lambda annotation: annotation.id):
+        previous = state.layouts.get(annotation.id)
+        if previous is not None and previous.key == _annotation_key(annotation):
+            layouts.append(previous)
+        else:
+            layouts.append(layout_annotation(annotation, width, height))
+
+    if dirty is None:
+        current = {layout.key for layout in layouts}
+        previous = {layout.key for layout in state.layouts.values()}
+        rects = [layout.bbox for layout in layouts if layout.key not in previous]
+        rects += [layout.bbox for layout in state.layouts.values() if layout.key not in current]
+        dirty = _merge_rects(rects, width, height)
+        if sum((r[2] - r[0]) * (r[3] - r[1]) for r in dirty) > settings.ANNOTATION_FULL_REDRAW_RATIO * width * height:
+            dirty = [(0, 0, width, height)]
+
+    for rect in dirty:
+        _composite(state, rect, layouts)
+    state.layouts = {layout.key[0]: layout for layout in layouts}
+    render_states.put(note_id, state)
+    return state.image
+
+
+def write_render(note_id: int, image_version: int, processed_path: str, annotations: list) -> Path | None:
+    """
+    Render into a temporary file next to the annotated image (blocking)
+    Returns None when there is nothing to draw
+    """
+    if not annotations:
+        render_states.pop(note_id)
+        return None
+    annotated_path = get_annotated_path(processed_path)
+    # 以 . 开头的临时文件不会被清理任务当作孤儿文件
+    temp_path = annotated_path.with_name(f".{uuid.uuid4().hex}{annotated_path.suffix}")
+    image = render_annotations(note_id, image_version, settings.BASE_DIR / processed_path, annotations)
+    image.save(str(temp_path), quality=95)
+    return temp_path
+
+
+def _install_render(processed_path: str, temp_path: Path | None):
+    """Replace the annotated image with a finished render, or remove it (no annotations left)"""
+    annotated_path = get_annotated_path(processed_path)
+    if temp_path is None:
+        annotated_path.unlink(missing_ok=True)
+    else:
+        # 原子替换，读取方不会看到写了一半的文件
+        os.replace(temp_path, annotated_path)
+
+
+def stale_condition():
+    """SQL form of annotated_is_stale(), for finding the notes to render in bulk"""
+    current = cast(Note.image_version, String).concat(".").concat(cast(Note.annotation_version, String))
+    return and_(
+        Note.annotation_version > 0,
+        or_(Note.annotated_version.is_(None), Note.annotated_version != current),
+    )
+
+
+async def _render_once(note_id: int) -> bool | None:
+    """
+    One render attempt; returns False if the render was already current,
+    None if the note changed while rendering (the result is discarded)
+    """
+    async with async_session() as db:
+        note = await db.get(Note, note_id)
+        if note is None or not note.processed_path or not annotated_is_stale(note):
+            return False
+        image_version, annotation_version = note.image_version, note.annotation_version
+        version = variant_version(note, "annotated")
+        result = await db.execute(
+            select(Annotation).where(Annotation.note_id == note_id).order_by(Annotation.id)
+        )
+        annotations = result.scalars().all()
+
+    temp_path = await asyncio.to_thread(write_render, note_id, image_version, note.processed_path, annotations)
+    try:
+        async with async_session() as db:
+            # 条件更新：渲染期间笔记被修改则放弃本次结果；不更新 updated_at
+            result = await db.execute(
+                update(Note)
+                .where(
+                    Note.id == note_id,
+                    Note.image_version == image_version,
+                    Note.annotation_version == annotation_version,
+                )
+                .values(annotated_version=version, updated_at=Note.updated_at)
+            )
+            if result.rowcount == 0:
+                return None
+            # 持有写锁期间替换文件，其他写入方不会穿插进来
+            await asyncio.to_thread(_install_render, note.processed_path, temp_path)
+            temp_path = None
+            mark_images_changed(db.sync_session, note_id)
+            await db.commit()
+    finally:
+        if temp_path is not None:
+            temp_path.unlink(missing_ok=True)
+    return True
+
+
+async def render_note(note_id: int) -> bool:
+    """Bring a note's annotated render up to date; returns False if it already was"""
+    for _ in range(MAX_ATTEMPTS):
+        rendered = await _render_once(note_id)
+        if rendered is not None:
+            return rendered
+    return False
+
+
+_in_flight: dict[int, asyncio.Task] = {}
+
+
+async def ensure_rendered(note_id: int) -> bool:
+    """
+    Render a note's annotated image if it is stale; returns True if a render was made
+    Concurrent callers in this worker share one render, which also survives
+    a caller going away (e.g. the client disconnecting)
+    """
+    task = _in_flight.get(note_id)
+    if task is None:
+        task = asyncio.ensure_future(render_note(note_id))
+        _in_flight[note_id] = task
+        task.add_done_callback(lambda _: _in_flight.pop(note_id, None))
+    return await asyncio.shield(task)
+
+
+async def render_stale(db: AsyncSession, *criteria) -> int:
+    """
+    Render every stale note matching the criteria before their files are read (exports)
+    At most ANNOTATION_RENDER_WORKERS renders run at a time; returns the number rendered
+    """
+    result = await db.execute(select(Note.id).where(stale_condition(), *criteria))
+    note_ids = result.scalars().all()
+    if not note_ids:
+        return 0
+    limit = asyncio.Semaphore(settings.ANNOTATION_RENDER_WORKERS or os.cpu_count() or 1)
+
+    async def render(note_id: int) -> bool:
+        async with limit:
+            try:
+                return await ensure_rendered(note_id)
+            except Exception as e:
+                # 渲染失败时导出上一次的渲染结果
+                print(f"⚠️ Annotation render failed for note {note_id}: {e}")
+                return False
+
+    return sum(await asyncio.gather(*(render(note_id) for note_id in note_ids)))
+
+
+# ---------- Pre-render after writes ----------
+PENDING_KEY = "annotation_prerender_pending"
+
+
+class PrerenderScheduler:
+    """
+    Debounced pre-render of notes whose annotated image was just made stale
+    (event loop thread only)
+
+    A burst of edits to one note becomes a single render, started
+    ANNOTATION_PRERENDER_DEBOUNCE_MS after the last edit and at most
+    ANNOTATION_PRERENDER_MAX_DELAY_MS after the first. The render goes through
+    ensure_rendered(), so a viewer fetching the image meanwhile waits on the
+    same render instead of starting its own.
+    """
+
+    def __init__(self):
+        self._timers: dict[int, asyncio.TimerHandle] = {}
+        self._first_request: dict[int, float] = {}
+        self._running: set[asyncio.Task] = set()
+
+    def request(self, note_id: int):
+        if settings.ANNOTATION_PRERENDER_DEBOUNCE_MS <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        deadline = self._first_request.setdefault(note_id, now) + settings.ANNOTATION_PRERENDER_MAX_DELAY_MS / 1000
+        delay = min(settings.ANNOTATION_PRERENDER_DEBOUNCE_MS / 1000, max(0.0, deadline - now))
+        timer = self._timers.pop(note_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[note_id] = loop.call_later(delay, self._start, note_id)
+
+    def _start(self, note_id: int):
+        self._timers.pop(note_id, None)
+        self._first_request.pop(note_id, None)
+        task = asyncio.ensure_future(self._run(note_id))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, note_id: int):
+        try:
+            await ensure_rendered(note_id)
+        except Exception as e:
+            # 预渲染失败时，下次请求带标记图片会再渲染
+            print(f"⚠️ Annotation render failed for note {note_id}: {e}")
+
+    async def shutdown(self):
+        """Drop debounced renders (they are made on demand later) and wait for running ones"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._first_request.clear()
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+
+prerender_scheduler = PrerenderScheduler()
+
+
+def _changed(obj, attribute: str) -> bool:
+    return inspect(obj).attrs[attribute].history.has_changes()
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_stale_notes(session, flush_context, instances):
+    # 在 flush 之前收集：bump_*_version() 赋值的 SQL 表达式在 flush 后不留历史
+    note_ids = {
+        obj.id for obj in session.dirty
+        if isinstance(obj, Note) and (_changed(obj, "annotation_version") or _changed(obj, "image_version"))
+    }
+    if note_ids:
+        session.info.setdefault(PENDING_KEY, set()).update(note_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule_committed(session):
+    note_ids = session.info.pop(PENDING_KEY, None)
+    if not note_ids:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # 没有事件循环（脚本中使用），按需渲染
+        return
+    for note_id in note_ids:
+        prerender_scheduler.request(note_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
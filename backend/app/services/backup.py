@@ -0,0 +1,443 @@
+"""
+Library Backup - Incremental backups of a user's whole library, and restore
+
+A backup is a ZIP holding manifest.json followed by blobs/{sha256}{suffix}.
+The manifest describes every folder, tag and note (processing params, tags,
+annotations) and the content hash of each image file; a blob is stored once
+per content, however many files share it.
+
+Given the manifest of an earlier backup, only blobs that manifest does not
+reference yet are written, and files whose path, size and mtime are unchanged
+reuse the hash recorded there instead of being read again - a nightly backup
+costs time in proportion to what changed, not to the library size.
+
+Restoring takes the full backup plus every incremental backup made after it,
+in any order: the newest manifest decides what is rebuilt, the blobs are
+collected from all archives.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import shutil
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO
+from pydantic import ValidationError
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.annotation import Annotation
+from app.models.folder import Folder, FolderClosure
+from app.models.note import Note, NoteTag
+from app.models.tag import Tag
+from app.schemas.backup import BackupManifest
+from app.services.folder_tree import touch_folder_tree
+from app.services.search import mark_search_changed
+from app.services.zip_stream import CHUNK_SIZE
+from app.utils.paths import get_annotated_path
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+BLOB_PATTERN = re.compile(r"^blobs/([0-9a-f]{64})\.[a-z0-9]{1,5}$")
+
+
+def blob_arcname(digest: str, suffix: str) -> str:
+    return f"blobs/{digest}{suffix}"
+
+
+def file_digest(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _timestamp(value: datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+def _parse_timestamp(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value else None
+
+
+def read_manifest(data: bytes) -> dict:
+    """
+    Manifest from the contents of manifest.json
+    Every field is validated up front, so a malformed manifest is rejected with
+    a ValueError before anything is restored
+    """
+    try:
+        manifest = json.loads(data)
+    except ValueError:
+        raise ValueError("Not a backup manifest")
+    if not isinstance(manifest, dict) or manifest.get("format") != FORMAT_VERSION:
+        raise ValueError("Unsupported backup format")
+    try:
+        return BackupManifest.model_validate(manifest).model_dump(mode="json")
+    except ValidationError as e:
+        error = e.errors(include_url=False)[0]
+        location = ".".join(str(part) for part in error["loc"])
+        raise ValueError(f"Invalid backup manifest: {location}: {error['msg']}")
+
+
+def read_base_manifest(source: BinaryIO) -> dict:
+    """
+    Manifest from an uploaded manifest.json or whole backup archive (blocking)
+    An archive is opened through its central directory and only the manifest member is read,
+    so a large earlier backup is never loaded into memory
+    """
+    is_archive = source.read(2) == b"PK"
+    source.seek(0)
+    if not is_archive:
+        return read_manifest(source.read())
+    try:
+        with zipfile.ZipFile(source) as archive:
+            data = archive.read(MANIFEST_NAME)
+    except (zipfile.BadZipFile, KeyError):
+        raise ValueError("Not a backup manifest")
+    return read_manifest(data)
+
+
+# ---------- Backup ----------
+
+async def load_library(db: AsyncSession, user_id: int, base: dict | None = None) -> dict:
+    """
+    Manifest of a user's library, without file hashes yet (see collect_blobs)
+    Five queries, whatever the number of notes
+    """
+    folders = await db.execute(
+        select(Folder.id, Folder.name, Folder.parent_id, Folder.created_at)
+        .where(Folder.user_id == user_id).order_by(Folder.id)
+    )
+    tags = await db.execute(
+        select(Tag.id, Tag.name, Tag.color).where(Tag.user_id == user_id).order_by(Tag.id)
+    )
+    notes = await db.execute(
+        select(Note.id, Note.title, Note.folder_id, Note.original_path, Note.processed_path,
+               Note.processing_params, Note.created_at, Note.updated_at)
+        .where(Note.user_id == user_id).order_by(Note.id)
+    )
+    note_tags = await db.execute(
+        select(NoteTag.c.note_id, NoteTag.c.tag_id)
+        .join(Note, Note.id == NoteTag.c.note_id)
+        .where(Note.user_id == user_id)
+    )
+    annotations = await db.execute(
+        select(Annotation.note_id, Annotation.content, Annotation.x, Annotation.y,
+               Annotation.font_size, Annotation.color, Annotation.created_at)
+        .join(Note, Note.id == Annotation.note_id)
+        .where(Note.user_id == user_id)
+        .order_by(Annotation.id)
+    )
+
+    tag_ids: dict[int, list[int]] = {}
+    for note_id, tag_id in note_tags:
+        tag_ids.setdefault(note_id, []).append(tag_id)
+    note_annotations: dict[int, list[dict]] = {}
+    for row in annotations:
+        note_annotations.setdefault(row.note_id, []).append({
+            "content": row.content,
+            "x": row.x,
+            "y": row.y,
+            "font_size": row.font_size,
+            "color": row.color,
+            "created_at": _timestamp(row.created_at),
+        })
+
+    return {
+        "format": FORMAT_VERSION,
+        "id": uuid.uuid4().hex,
+        "base_id": base["id"] if base else None,
+        "created_at": datetime.utcnow().isoformat(),
+        "folders": [
+            {"id": row.id, "name": row.name, "parent_id": row.parent_id, "created_at": _timestamp(row.created_at)}
+            for row in folders
+        ],
+        "tags": [{"id": row.id, "name": row.name, "color": row.color} for row in tags],
+        "notes": [
+            {
+                "id": row.id,
+                "title": row.title,
+                "folder_id": row.folder_id,
+                "processing_params": row.processing_params,
+                "created_at": _timestamp(row.created_at),
+                "updated_at": _timestamp(row.updated_at),
+                "tag_ids": sorted(tag_ids.get(row.id, [])),
+                "annotations": note_annotations.get(row.id, []),
+                "files": _note_files(row.original_path, row.processed_path),
+            }
+            for row in notes
+        ],
+    }
+
+
+def _note_files(original_path: str, processed_path: str | None) -> dict:
+    """Image files of a note, relative to BASE_DIR (hashes are added later)"""
+    files = {"original": {"path": original_path}}
+    if processed_path:
+        files["processed"] = {"path": processed_path}
+        files["annotated"] = {"path": str(get_annotated_path(processed_path).relative_to(settings.BASE_DIR))}
+    return files
+
+
+def collect_blobs(manifest: dict, base: dict | None = None) -> list[tuple[str, Path | bytes]]:
+    """
+    Hash the image files of a manifest and list the archive members (blocking)
+    Returns manifest.json followed by the blobs the base manifest does not reference
+    Files missing on disk are left out of the manifest
+    """
+    known = {}
+    if base:
+        for note in base["notes"]:
+            for described in note["files"].values():
+                known[described["path"]] = described
+    base_hashes = {described["sha256"] for described in known.values()}
+
+    members = []
+    written = set(base_hashes)
+    for note in manifest["notes"]:
+        files = {}
+        for kind, described in note["files"].items():
+            path = settings.BASE_DIR / described["path"]
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            previous = known.get(described["path"])
+            if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+                digest = previous["sha256"]
+            else:
+                digest = file_digest(path)
+            suffix = path.suffix.lower()
+            files[kind] = {
+                "path": described["path"],
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": digest,
+                "suffix": suffix,
+            }
+            if digest not in written:
+                written.add(digest)
+                members.append((blob_arcname(digest, suffix), path))
+        note["files"] = files
+
+    manifest_bytes = json.dumps(manifest, ensure_ascii=False).encode()
+    return [(MANIFEST_NAME, manifest_bytes)] + members
+
+
+def archive_name(manifest: dict) -> str:
+    created = datetime.fromisoformat(manifest["created_at"]).strftime("%Y%m%d-%H%M%S")
+    kind = "incremental" if manifest["base_id"] else "full"
+    return f"backup-{created}-{kind}.zip"
+
+
+# ---------- Restore ----------
+
+def unpack_archives(sources: list[BinaryIO], staging: Path) -> tuple[dict, dict[str, Path]]:
+    """
+    Read the newest manifest and extract the blobs it needs into staging (blocking)
+    Every blob is verified against its hash; returns (manifest, sha256 -> file)
+    """
+    archives = []
+    for source in sources:
+        try:
+            archives.append(zipfile.ZipFile(source))
+        except zipfile.BadZipFile:
+            raise ValueError("Not a backup archive")
+    manifests = []
+    for archive in archives:
+        try:
+            manifests.append(read_manifest(archive.read(MANIFEST_NAME)))
+        except KeyError:
+            raise ValueError("Not a backup archive")
+    manifest = max(manifests, key=lambda m: m["created_at"])
+
+    needed = set()
+    for note in manifest["notes"]:
+        for described in note["files"].values():
+            needed.add(described["sha256"])
+
+    staging.mkdir(parents=True, exist_ok=True)
+    blobs = {}
+    for archive in archives:
+        for name in archive.namelist():
+            match = BLOB_PATTERN.match(name)
+            if not match or match[1] not in needed or match[1] in blobs:
+                continue
+            target = staging / match[1]
+            digest = hashlib.sha256()
+            with archive.open(name) as src, open(target, "wb") as dest:
+                while chunk := src.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    dest.write(chunk)
+            if digest.hexdigest() != match[1]:
+                raise ValueError(f"Corrupted file in backup: {name}")
+            blobs[match[1]] = target
+
+    missing = needed - blobs.keys()
+    if missing:
+        raise ValueError(
+            f"{len(missing)} image files are missing; "
+            "upload the full backup together with every incremental backup made after it"
+        )
+    return manifest, blobs
+
+
+def _place_files(notes: list[dict], blobs: dict[str, Path], placed: dict[str, Path]) -> tuple[list[dict], list[Path]]:
+    """
+    Give each note of a batch new image files under uploads/ (blocking)
+    A blob is moved into place the first time and copied for later notes,
+    since deleting a note deletes its files
+    Returns (path columns per note, files created)
+    """
+    paths, created = [], []
+    for note in notes:
+        files = note["files"]
+        suffix = (files.get("original") or files.get("processed") or {"suffix": ".jpg"})["suffix"]
+        stem = uuid.uuid4().hex
+        original = settings.ORIGINAL_DIR / f"{stem}{suffix}"
+        processed = settings.PROCESSED_DIR / f"{stem}_processed{files.get('processed', {'suffix': suffix})['suffix']}"
+        columns = {
+            "original_path": str(original.relative_to(settings.BASE_DIR)),
+            "processed_path": str(processed.relative_to(settings.BASE_DIR)),
+        }
+        targets = {
+            "original": original,
+            "processed": processed,
+            "annotated": get_annotated_path(columns["processed_path"]),
+        }
+        for kind, described in files.items():
+            digest, target = described["sha256"], targets[kind]
+            if digest in placed:
+                shutil.copyfile(placed[digest], target)
+            else:
+                blobs[digest].replace(target)
+                placed[digest] = target
+            created.append(target)
+        paths.append(columns)
+    return paths, created
+
+
+def _remove_files(paths: list[Path]):
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+async def _restore_folders(db: AsyncSession, user_id: int, folders: list[dict]) -> dict[int, int]:
+    """Insert the folder tree level by level, with its closure rows; returns backup id -> new id"""
+    folder_map: dict[int, int] = {}
+    ancestors: dict[int, list[tuple[int, int]]] = {}
+    closure_rows = []
+    level = [folder for folder in folders if folder["parent_id"] is None]
+    while level:
+        new_ids = await db.scalars(
+            insert(Folder).returning(Folder.id, sort_by_parameter_order=True),
+            [
+                {
+                    "name": folder["name"],
+                    "parent_id": folder_map.get(folder["parent_id"]),
+                    "user_id": user_id,
+                    "created_at": _parse_timestamp(folder["created_at"]),
+                }
+                for folder in level
+            ],
+        )
+        for folder, new_id in zip(level, new_ids):
+            folder_map[folder["id"]] = new_id
+            chain = [(new_id, 0)]
+            if folder["parent_id"] is not None:
+                chain += [(ancestor, depth + 1) for ancestor, depth in ancestors[folder_map[folder["parent_id"]]]]
+            ancestors[new_id] = chain
+            closure_rows += [
+                {"ancestor_id": ancestor, "descendant_id": new_id, "depth": depth} for ancestor, depth in chain
+            ]
+        # 父文件夹不在备份中的文件夹被丢弃（与文件夹树的处理一致）
+        level = [folder for folder in folders if folder["parent_id"] in folder_map and folder["id"] not in folder_map]
+    if closure_rows:
+        await db.execute(insert(FolderClosure), closure_rows)
+        await touch_folder_tree(db, user_id)
+    return folder_map
+
+
+async def _restore_tags(db: AsyncSession, user_id: int, tags: list[dict]) -> tuple[dict[int, int], int]:
+    """Map backup tags onto the user's tags by name, creating missing ones"""
+    existing = await db.execute(select(Tag.name, Tag.id).where(Tag.user_id == user_id))
+    by_name = dict(existing.all())
+    missing = [tag for tag in tags if tag["name"] not in by_name]
+    # 同名标签只创建一次
+    missing = list({tag["name"]: tag for tag in missing}.values())
+    if missing:
+        new_ids = await db.scalars(
+            insert(Tag).returning(Tag.id, sort_by_parameter_order=True),
+            [{"name": tag["name"], "color": tag["color"], "user_id": user_id} for tag in missing],
+        )
+        by_name.update(zip((tag["name"] for tag in missing), new_ids))
+    return {tag["id"]: by_name[tag["name"]] for tag in tags}, len(missing)
+
+
+async def restore_library(db: AsyncSession, user_id: int, sources: list[BinaryIO]) -> dict:
+    """
+    Rebuild a backed-up library into a user's account
+    Folders and tags are created in one transaction, then notes (with their
+    tags and annotations) in bulk batches of BACKUP_RESTORE_BATCH per commit
+    Returns counts of what was restored
+    """
+    # 解压到非公开目录（/uploads 是公开的静态目录），放入 uploads 时仍是同一文件系统内的重命名
+    staging = settings.IMPORTS_DIR / f".restore-{uuid.uuid4().hex}"
+    try:
+        manifest, blobs = await asyncio.to_thread(unpack_archives, sources, staging)
+
+        folder_map = await _restore_folders(db, user_id, manifest["folders"])
+        tag_map, tags_created = await _restore_tags(db, user_id, manifest["tags"])
+        await db.commit()
+
+        counts = {"folders": len(folder_map), "tags": tags_created, "notes": 0, "annotations": 0, "files": 0}
+        placed: dict[str, Path] = {}
+        notes = manifest["notes"]
+        for start in range(0, len(notes), settings.BACKUP_RESTORE_BATCH):
+            batch = notes[start:start + settings.BACKUP_RESTORE_BATCH]
+            paths, created = await asyncio.to_thread(_place_files, batch, blobs, placed)
+            try:
+                new_ids = list(await db.scalars(
+                    insert(Note).returning(Note.id, sort_by_parameter_order=True),
+                    [
+                        {
+                            "title": note["title"],
+                            **columns,
+                            "folder_id": folder_map.get(note["folder_id"]),
+                            "user_id": user_id,
+                            "processing_params": note["processing_params"],
+                            "created_at": _parse_timestamp(note["created_at"]),
+                            "updated_at": _parse_timestamp(note["updated_at"]),
+                        }
+                        for note, columns in zip(batch, paths)
+                    ],
+                ))
+                note_tags = [
+                    {"note_id": new_id, "tag_id": tag_map[tag_id]}
+                    for note, new_id in zip(batch, new_ids)
+                    for tag_id in note["tag_ids"] if tag_id in tag_map
+                ]
+                annotations = [
+                    {**annotation, "note_id": new_id, "created_at": _parse_timestamp(annotation["created_at"])}
+                    for note, new_id in zip(batch, new_ids)
+                    for annotation in note["annotations"]
+                ]
+                if note_tags:
+                    await db.execute(insert(NoteTag), note_tags)
+                if annotations:
+                    await db.execute(insert(Annotation), annotations)
+                mark_search_changed(db.sync_session, *new_ids)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                # 本批已放入 uploads 的文件不再属于任何笔记
+                await asyncio.to_thread(_remove_files, created)
+                raise
+            counts["notes"] += len(new_ids)
+            counts["annotations"] += len(annotations)
+            counts["files"] += len(created)
+        return counts
+    finally:
+        await asyncio.to_thread(shutil.rmtree, staging, True)
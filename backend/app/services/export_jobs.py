@@ -0,0 +1,199 @@
+"""
+Export Jobs - Build folder archives in the background and keep them for reuse
+
+A job is identified by "{folder_id}-{content_version}", so asking twice for an
+unchanged folder finds the same job (or its finished archive), and any change
+inside the subtree yields a new job. Job state lives in a small JSON file next
+to the archive under EXPORTS_DIR/{user_id}/, which every uvicorn worker can read.
+
+Archives are removed by gc_exports() once nobody has asked for them for
+EXPORT_TTL_HOURS; reading a job's status or downloading it counts as access.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from app.config import settings
+from app.services.export_plan import ExportEntry, render_entries
+from app.services.zip_stream import stream_zip
+
+JOB_ID_PATTERN = re.compile(r"^\d+-[0-9a-f]{20}$")
+
+# 运行中的任务超过该时间没有更新进度，视为所在 worker 已退出，可以重新开始
+STALE_SECONDS = 120
+PROGRESS_INTERVAL = 0.5
+
+
+def make_job_id(folder_id: int, version: str) -> str:
+    return f"{folder_id}-{version}"
+
+
+def job_dir(user_id: int) -> Path:
+    return settings.EXPORTS_DIR / str(user_id)
+
+
+def archive_path(user_id: int, job_id: str) -> Path:
+    return job_dir(user_id) / f"{job_id}.zip"
+
+
+def state_path(user_id: int, job_id: str) -> Path:
+    return job_dir(user_id) / f"{job_id}.json"
+
+
+def write_state(path: Path, state: dict):
+    """Replace the state file atomically so readers never see half a JSON document"""
+    temp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    temp.write_text(json.dumps(state, ensure_ascii=False))
+    temp.replace(path)
+
+
+def read_job(user_id: int, job_id: str) -> dict | None:
+    """Current state of a job, or None if unknown (or already collected)"""
+    if not JOB_ID_PATTERN.match(job_id):
+        return None
+    path = state_path(user_id, job_id)
+    try:
+        state = json.loads(path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if state["status"] == "done" and not archive_path(user_id, job_id).exists():
+        return None
+    if state["status"] == "running" and time.time() - state["updated_at"] > STALE_SECONDS:
+        state["status"] = "failed"
+        state["error"] = "Export was interrupted"
+    # 记录访问时间，供 GC 判断
+    os.utime(path)
+    return state
+
+
+def prepare_job(user_id: int, folder_id: int, version: str, filename: str, total: int) -> tuple[dict, bool]:
+    """
+    Find or register the job for this folder content
+    Returns (state, needs_run); needs_run is False when the archive already
+    exists or another request is building it
+    """
+    job_id = make_job_id(folder_id, version)
+    state = read_job(user_id, job_id)
+    if state is not None and state["status"] in ("done", "running"):
+        return state, False
+
+    job_dir(user_id).mkdir(parents=True, exist_ok=True)
+    state = {
+        "job_id": job_id,
+        "folder_id": folder_id,
+        "filename": filename,
+        "status": "running",
+        "done": 0,
+        "total": total,
+        "bytes": 0,
+        "error": None,
+        "updated_at": time.time(),
+    }
+    write_state(state_path(user_id, job_id), state)
+    return state, True
+
+
+def build_archive(user_id: int, state: dict, entries: list[ExportEntry]):
+    """Write the archive of a job, reporting progress in its state file (blocking)"""
+    job_id = state["job_id"]
+    target = archive_path(user_id, job_id)
+    building = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+    state_file = state_path(user_id, job_id)
+    last_report = 0.0
+
+    def report(**changes):
+        state.update(changes, updated_at=time.time())
+        write_state(state_file, state)
+
+    try:
+        with open(building, "wb") as out:
+            for chunk in stream_zip(_counted(entries, state)):
+                out.write(chunk)
+                state["bytes"] += len(chunk)
+                if time.monotonic() - last_report > PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    report()
+        building.replace(target)
+        report(status="done", done=len(entries))
+    except Exception as e:
+        report(status="failed", error=str(e))
+    finally:
+        building.unlink(missing_ok=True)
+
+    if state["status"] == "done":
+        _remove_superseded(user_id, state["folder_id"], job_id)
+
+
+def _counted(entries: list[ExportEntry], state: dict):
+    """(arcname, path) pairs for stream_zip, counting finished entries into state"""
+    for index, entry in enumerate(entries):
+        state["done"] = index
+        yield entry.arcname, entry.path
+
+
+def _remove_superseded(user_id: int, folder_id: int, keep_job_id: str):
+    """Older archives of the same folder can never be requested again"""
+    for path in job_dir(user_id).glob(f"{folder_id}-*"):
+        if path.stem != keep_job_id and JOB_ID_PATTERN.match(path.stem):
+            path.unlink(missing_ok=True)
+
+
+async def run_job(user_id: int, state: dict, entries: list[ExportEntry]):
+    """Background task body: make stale annotated renders, then build the archive off the event loop"""
+    entries = await render_entries(entries)
+    await asyncio.to_thread(build_archive, user_id, state, entries)
+
+
+def gc_exports(now: float = None) -> tuple[int, int]:
+    """
+    Remove archives not accessed for EXPORT_TTL_HOURS and leftover temp files
+    Returns (files removed, bytes reclaimed)
+    """
+    now = time.time() if now is None else now
+    expire_before = now - settings.EXPORT_TTL_HOURS * 3600
+    removed = reclaimed = 0
+    for user_dir in settings.EXPORTS_DIR.iterdir():
+        if not user_dir.is_dir():
+            continue
+        for path in list(user_dir.iterdir()):
+            try:
+                if path.name.startswith("."):
+                    # 中断的构建留下的临时文件
+                    expired = path.stat().st_mtime < expire_before
+                elif path.suffix == ".json":
+                    expired = path.stat().st_mtime < expire_before
+                    archive = path.with_suffix(".zip")
+                    if expired and archive.exists():
+                        reclaimed += archive.stat().st_size
+                        archive.unlink()
+                        removed += 1
+                elif path.suffix == ".zip":
+                    # 状态文件丢失的压缩包无法再被下载
+                    expired = not path.with_suffix(".json").exists()
+                else:
+                    expired = False
+                if expired:
+                    reclaimed += path.stat().st_size
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                # 其他 worker 同时在清理
+                continue
+        try:
+            user_dir.rmdir()
+        except OSError:
+            # 目录非空
+            pass
+    return removed, reclaimed
+
+
+async def gc_loop():
+    """Periodic export GC, started with the application"""
+    while True:
+        await asyncio.sleep(settings.EXPORT_GC_INTERVAL_MINUTES * 60)
+        removed, reclaimed = await asyncio.to_thread(gc_exports)
+        if removed:
+            print(f"🧹 Export GC removed {removed} files ({reclaimed / 1024 / 1024:.1f} MB)")
@@ -0,0 +1,169 @@
+"""
+Export Planning - Resolve a folder subtree and its archive paths in one query,
+then the file and archive name of every note in it
+"""
+import hashlib
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Iterator
+import anyio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import async_session
+from app.models.folder import Folder, FolderClosure
+from app.models.note import Note
+from app.services.folder_tree import subtree_ids
+from app.services.annotation_render import ensure_rendered, render_stale
+from app.utils.paths import annotated_is_stale, get_annotated_path, variant_version
+
+
+def safe_name(name: str) -> str:
+    """
+    Folder or file name as one archive path component
+    "/" and "\\" would create extra levels, and a name of only dots ("." or "..")
+    would point at the same or parent directory when the archive is extracted
+    """
+    name = name.replace("/", "_").replace("\\", "_").strip()
+    return "_" if name.strip(".") == "" else name
+
+
+async def get_subtree_paths(db: AsyncSession, folder_id: int, user_id: int) -> dict[int, str]:
+    """
+    folder_id -> archive path for a folder and its whole subtree (empty if not found)
+    Paths start at the user's root folder ("课程/数学/第一章"), as in the export archive.
+    One closure table query: the ancestors of every folder in the subtree, root first
+    """
+    subtree = FolderClosure.alias("subtree")
+    ancestry = FolderClosure.alias("ancestry")
+    result = await db.execute(
+        select(subtree.c.descendant_id, Folder.name)
+        .join(ancestry, ancestry.c.descendant_id == subtree.c.descendant_id)
+        .join(Folder, Folder.id == ancestry.c.ancestor_id)
+        .where(subtree.c.ancestor_id == folder_id, Folder.user_id == user_id)
+        .order_by(subtree.c.descendant_id, ancestry.c.depth.desc())
+    )
+    parts: dict[int, list[str]] = {}
+    for descendant_id, name in result:
+        parts.setdefault(descendant_id, []).append(safe_name(name))
+    return {descendant_id: "/".join(names) for descendant_id, names in parts.items()}
+
+
+@dataclass(frozen=True)
+class ExportEntry:
+    """
+    One exported note: where its image is and where it goes in the archive
+    A stale entry points at an annotated render that still has to be made;
+    fallback is the processed image, used if that render does not exist
+    """
+    note_id: int
+    arcname: str
+    path: Path
+    image_type: str
+    version: str
+    stale: bool = False
+    fallback: Path | None = None
+
+
+async def plan_folder_export(db: AsyncSession, folder_id: int, user_id: int) -> list[ExportEntry]:
+    """
+    Every note image of a folder subtree, with unique archive names
+    Annotated images are preferred over processed ones; notes without an image file are skipped
+    Nothing is rendered here: stale annotated renders are only marked, and are made
+    by render_entries() (background jobs) or rendered_entries() (streamed responses)
+    Versions are those of the archive content once every render is done
+    Blocking file probes are cheap stats, done while planning so nothing fails mid-stream
+    """
+    folder_paths = await get_subtree_paths(db, folder_id, user_id)
+    if not folder_paths:
+        return []
+
+    result = await db.execute(
+        select(
+            Note.id, Note.title, Note.folder_id, Note.processed_path,
+            Note.image_version, Note.annotation_version, Note.annotated_version,
+        )
+        .where(Note.folder_id.in_(subtree_ids(folder_id)), Note.user_id == user_id)
+        .order_by(Note.folder_id, Note.created_at, Note.id)
+    )
+
+    entries = []
+    used_names = set()
+    for row in result:
+        note_id, title, note_folder_id, processed_path = row.id, row.title, row.folder_id, row.processed_path
+        if not processed_path:
+            continue
+        annotated = get_annotated_path(processed_path)
+        processed = settings.BASE_DIR / processed_path
+        stale = annotated_is_stale(row)
+        if stale or annotated.exists():
+            path, image_type = annotated, "annotated"
+        elif processed.exists():
+            path, image_type = processed, "processed"
+        else:
+            continue
+
+        folder_path = folder_paths[note_folder_id]
+        stem = safe_name(title)
+        arcname = f"{folder_path}/{stem}{path.suffix}"
+        # Handle duplicate filenames
+        counter = 1
+        while arcname in used_names:
+            arcname = f"{folder_path}/{stem}_{counter}{path.suffix}"
+            counter += 1
+        used_names.add(arcname)
+        entries.append(ExportEntry(
+            note_id, arcname, path, image_type, variant_version(row, image_type),
+            stale=stale, fallback=processed if image_type == "annotated" else None,
+        ))
+    return entries
+
+
+def _ready(entry: ExportEntry) -> ExportEntry | None:
+    """The entry as it can be read now: the processed image if the annotated render is missing"""
+    if entry.path.exists():
+        return entry
+    if entry.fallback is not None and entry.fallback.exists():
+        return replace(entry, path=entry.fallback, image_type="processed", stale=False, fallback=None)
+    return None
+
+
+async def render_entries(entries: list[ExportEntry]) -> list[ExportEntry]:
+    """
+    Make the stale annotated renders of planned entries (export jobs, in the background)
+    Returns the entries ready to be read; a failed render exports the previous render
+    or the processed image
+    """
+    stale_ids = [entry.note_id for entry in entries if entry.stale]
+    if stale_ids:
+        async with async_session() as db:
+            await render_stale(db, Note.id.in_(stale_ids))
+    return [ready for entry in entries if (ready := _ready(entry)) is not None]
+
+
+def rendered_entries(entries: list[ExportEntry]) -> Iterator[ExportEntry]:
+    """
+    Entries for a streamed response, each stale render made just before the entry is read,
+    so the first bytes go out at once instead of after every render
+    Blocking: must be iterated in an anyio worker thread, as StreamingResponse does for
+    synchronous bodies
+    """
+    for entry in entries:
+        if entry.stale:
+            try:
+                anyio.from_thread.run(ensure_rendered, entry.note_id)
+            except Exception as e:
+                print(f"⚠️ Annotation render failed for note {entry.note_id}: {e}")
+        if (ready := _ready(entry)) is not None:
+            yield ready
+
+
+def content_version(entries: list[ExportEntry]) -> str:
+    """
+    Fingerprint of everything that ends up in the archive
+    Changes when a note is added, removed, renamed, moved, reprocessed or annotated
+    """
+    digest = hashlib.sha256()
+    for entry in entries:
+        digest.update(f"{entry.note_id}:{entry.arcname}:{entry.image_type}:{entry.version}\n".encode())
+    return digest.hexdigest()[:20]
@@ -0,0 +1,234 @@
+"""
+File Reclamation - Delete the files of deleted notes, and sweep up orphans
+
+Deleting a note only removes its row inside the request; its files (original,
+processed, annotated render, tile pyramids, encoded variants) are queued once
+the transaction commits and removed by deletion_loop() in the background.
+Notes deleted through the ORM are queued automatically; bulk DELETE
+statements (bulk note delete, folder delete) must call queue_note_files().
+
+sweep_uploads() walks uploads/original and uploads/processed (and the tiles
+and variants directories) in batches, checks each batch against the notes
+table and removes files no note refers to - whatever an interrupted request,
+a crash before the queue was drained or an older version left behind.
+Files younger than FILE_SWEEP_GRACE_MINUTES are skipped, since uploads write
+their files before the note row is committed.
+"""
+import asyncio
+import itertools
+import os
+import shutil
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import async_session
+from app.models.note import Note
+from app.services import tiles, image_delivery
+from app.utils.paths import get_annotated_path
+
+PENDING_KEY = "file_deletion_pending"
+ANNOTATED_SUFFIX = "_annotated"
+
+
+@dataclass(frozen=True)
+class NoteFiles:
+    """What is needed to find every file of a deleted note"""
+    note_id: int
+    original_path: str | None
+    processed_path: str | None
+
+
+def remove_note_files(items: list[NoteFiles]) -> tuple[int, int]:
+    """Delete the files of deleted notes (blocking); returns (files removed, bytes reclaimed)"""
+    removed = reclaimed = 0
+    for item in items:
+        paths = []
+        if item.original_path:
+            paths.append(settings.BASE_DIR / item.original_path)
+        if item.processed_path:
+            paths += [settings.BASE_DIR / item.processed_path, get_annotated_path(item.processed_path)]
+        for path in paths:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            except OSError:
+                # 留给清理任务
+                continue
+            removed += 1
+            reclaimed += size
+        tiles.remove_pyramids(item.note_id)
+        image_delivery.remove_variants(item.note_id)
+    return removed, reclaimed
+
+
+# ---------- Deletion queue ----------
+
+_queue: deque[NoteFiles] = deque()
+_wakeup = asyncio.Event()
+
+
+def queue_note_files(session: Session, *items: NoteFiles):
+    """Delete these files once the session commits (for bulk DELETE statements)"""
+    session.info.setdefault(PENDING_KEY, []).extend(items)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_deleted_notes(session, flush_context):
+    items = []
+    for obj in session.deleted:
+        if isinstance(obj, Note):
+            # 只读取已加载的属性，避免在 flush 事件中触发加载
+            loaded = inspect(obj).dict
+            items.append(NoteFiles(obj.id, loaded.get("original_path"), loaded.get("processed_path")))
+    if items:
+        queue_note_files(session, *items)
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_committed(session):
+    items = session.info.pop(PENDING_KEY, None)
+    if items:
+        _queue.extend(items)
+        _wakeup.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def drain_queue() -> tuple[int, int]:
+    """Process everything queued so far (blocking); returns (files removed, bytes reclaimed)"""
+    items = []
+    while _queue:
+        items.append(_queue.popleft())
+    return remove_note_files(items)
+
+
+async def deletion_loop():
+    """Background worker for the deletion queue, started with the application"""
+    try:
+        while True:
+            await _wakeup.wait()
+            _wakeup.clear()
+            await asyncio.to_thread(drain_queue)
+    finally:
+        # 关闭时处理剩余的队列，没处理完的留给清理任务
+        drain_queue()
+
+
+# ---------- Orphan sweeper ----------
+
+def _scan(directory: Path, expire_before: float):
+    """Entries of a directory older than the grace period, one at a time"""
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.stat().st_mtime < expire_before:
+                        yield entry
+                except FileNotFoundError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+async def _scan_batches(directory: Path, expire_before: float):
+    """_scan() in batches of FILE_SWEEP_BATCH, each read off the event loop"""
+    entries = _scan(directory, expire_before)
+    while batch := await asyncio.to_thread(list, itertools.islice(entries, settings.FILE_SWEEP_BATCH)):
+        yield batch
+
+
+def _entry_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+    return path.stat().st_size
+
+
+def _remove_entries(paths: list[Path]) -> tuple[int, int]:
+    removed = reclaimed = 0
+    for path in paths:
+        try:
+            size = _entry_size(path)
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+        except FileNotFoundError:
+            # 其他 worker 同时在清理
+            continue
+        removed += 1
+        reclaimed += size
+    return removed, reclaimed
+
+
+def _relative(path: Path) -> str | None:
+    try:
+        return str(path.relative_to(settings.BASE_DIR))
+    except ValueError:
+        return None
+
+
+async def _orphan_files(directory: Path, column, expire_before: float):
+    """Files of an upload directory that no note refers to, checked one batch per query"""
+    async for batch in _scan_batches(directory, expire_before):
+        referenced_by = {}
+        for entry in batch:
+            path = Path(entry.path)
+            # 批注图与处理后的图片同名加 _annotated 后缀，随处理后的图片一起保留
+            if column is Note.processed_path and path.stem.endswith(ANNOTATED_SUFFIX):
+                path = path.with_name(path.stem[:-len(ANNOTATED_SUFFIX)] + path.suffix)
+            relative = _relative(path)
+            if relative is not None:
+                referenced_by[Path(entry.path)] = relative
+        async with async_session() as db:
+            result = await db.execute(select(column).where(column.in_(set(referenced_by.values()))))
+            referenced = set(result.scalars().all())
+        yield [path for path, relative in referenced_by.items() if relative not in referenced]
+
+
+async def _orphan_note_dirs(directory: Path, expire_before: float):
+    """Per-note directories (tiles, variants) whose note no longer exists"""
+    async for batch in _scan_batches(directory, expire_before):
+        batch = [entry for entry in batch if entry.name.isdigit()]
+        async with async_session() as db:
+            result = await db.execute(select(Note.id).where(Note.id.in_([int(entry.name) for entry in batch])))
+            existing = set(result.scalars().all())
+        yield [Path(entry.path) for entry in batch if int(entry.name) not in existing]
+
+
+async def sweep_uploads(now: float = None) -> tuple[int, int]:
+    """Remove files and directories no note refers to; returns (removed, bytes reclaimed)"""
+    now = time.time() if now is None else now
+    expire_before = now - settings.FILE_SWEEP_GRACE_MINUTES * 60
+    removed = reclaimed = 0
+    sources = [
+        _orphan_files(settings.ORIGINAL_DIR, Note.original_path, expire_before),
+        _orphan_files(settings.PROCESSED_DIR, Note.processed_path, expire_before),
+        _orphan_note_dirs(settings.TILES_DIR, expire_before),
+        _orphan_note_dirs(settings.VARIANTS_DIR, expire_before),
+    ]
+    for source in sources:
+        async for orphans in source:
+            batch_removed, batch_reclaimed = await asyncio.to_thread(_remove_entries, orphans)
+            removed += batch_removed
+            reclaimed += batch_reclaimed
+    return removed, reclaimed
+
+
+async def sweep_loop():
+    """Periodic orphan sweep, started with the application"""
+    while True:
+        await asyncio.sleep(settings.FILE_SWEEP_INTERVAL_MINUTES * 60)
+        removed, reclaimed = await sweep_uploads()
+        if removed:
+            print(f"🧹 Upload sweep removed {removed} orphaned files ({reclaimed / 1024 / 1024:.1f} MB)")
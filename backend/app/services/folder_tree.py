@@ -0,0 +1,230 @@
+"""
+Folder Tree Service - Closure table maintenance and the cached folder tree
+
+Every folder has a (folder, folder, 0) row in folder_closure plus one row per
+ancestor, so "all folders under X" is one lookup on the (ancestor_id,
+descendant_id) key. The folders router calls add/move/delete_subtree on create,
+move and delete, and touch_folder_tree() to invalidate the cached tree.
+
+The tree of each user is cached per worker, keyed by users.folder_tree_version,
+so a change made through another worker is seen on the next request.
+Note counts change far more often than folders and are never cached.
+"""
+import threading
+from collections import OrderedDict
+from sqlalchemy import select, insert, update, delete, exists, func, text
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from app.config import settings
+from app.models.annotation import Annotation
+from app.models.folder import Folder, FolderClosure
+from app.models.note import Note, NoteTag
+from app.models.user import User
+from app.services.file_sweeper import NoteFiles, queue_note_files
+from app.services.image_cache import mark_images_changed
+from app.services.search import mark_search_changed
+
+
+def subtree_ids(folder_id: int):
+    """Select of the ids of a folder and all its descendants"""
+    return select(FolderClosure.c.descendant_id).where(FolderClosure.c.ancestor_id == folder_id)
+
+
+async def is_in_subtree(db: AsyncSession, folder_id: int, root_id: int) -> bool:
+    """Whether folder_id is root_id or one of its descendants"""
+    return bool(await db.scalar(select(exists().where(
+        FolderClosure.c.ancestor_id == root_id,
+        FolderClosure.c.descendant_id == folder_id,
+    ))))
+
+
+async def add_folder(db: AsyncSession, folder_id: int, parent_id: int | None):
+    """Link a new folder to itself and to every ancestor of its parent"""
+    await db.execute(insert(FolderClosure).values(ancestor_id=folder_id, descendant_id=folder_id, depth=0))
+    if parent_id is not None:
+        await db.execute(insert(FolderClosure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(FolderClosure.c.ancestor_id, folder_id, FolderClosure.c.depth + 1)
+            .where(FolderClosure.c.descendant_id == parent_id),
+        ))
+
+
+async def move_folder(db: AsyncSession, folder_id: int, new_parent_id: int | None):
+    """
+    Re-attach a subtree under a new parent
+    Callers must reject moves into the subtree itself (see is_in_subtree)
+    """
+    subtree = subtree_ids(folder_id)
+    # 断开子树与原祖先之间的关系，子树内部的关系保持不变
+    await db.execute(delete(FolderClosure).where(
+        FolderClosure.c.descendant_id.in_(subtree),
+        FolderClosure.c.ancestor_id.not_in(subtree),
+    ))
+    if new_parent_id is not None:
+        above = FolderClosure.alias("above")
+        below = FolderClosure.alias("below")
+        await db.execute(insert(FolderClosure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+            .select_from(above)
+            .join(below, below.c.ancestor_id == folder_id)
+            .where(above.c.descendant_id == new_parent_id),
+        ))
+
+
+async def remove_folder(db: AsyncSession, folder_id: int):
+    """Drop the closure rows of a folder and its whole subtree"""
+    await db.execute(delete(FolderClosure).where(FolderClosure.c.descendant_id.in_(subtree_ids(folder_id))))
+
+
+async def delete_subtree(db: AsyncSession, folder_id: int) -> dict:
+    """
+    Delete a folder, its subfolders and all their notes with bulk DELETE statements
+    Nothing is loaded into the session except the (id, paths) of the notes, which
+    are handed to the file deletion queue; returns counts of deleted rows
+    """
+    subtree = subtree_ids(folder_id)
+    notes_in_subtree = select(Note.id).where(Note.folder_id.in_(subtree))
+    notes = (await db.execute(
+        select(Note.id, Note.original_path, Note.processed_path).where(Note.folder_id.in_(subtree))
+    )).all()
+
+    annotations = await db.execute(delete(Annotation).where(Annotation.note_id.in_(notes_in_subtree)))
+    await db.execute(delete(NoteTag).where(NoteTag.c.note_id.in_(notes_in_subtree)))
+    deleted_notes = await db.execute(
+        delete(Note).where(Note.folder_id.in_(subtree)).execution_options(synchronize_session=False)
+    )
+    # 文件夹要在闭包关系删除之前删除（子树由闭包表确定）
+    folders = await db.execute(
+        delete(Folder).where(Folder.id.in_(subtree)).execution_options(synchronize_session=False)
+    )
+    await remove_folder(db, folder_id)
+
+    note_ids = [row.id for row in notes]
+    mark_search_changed(db.sync_session, *note_ids)
+    mark_images_changed(db.sync_session, *note_ids)
+    queue_note_files(db.sync_session, *(NoteFiles(row.id, row.original_path, row.processed_path) for row in notes))
+    return {
+        "folders": folders.rowcount,
+        "notes": deleted_notes.rowcount,
+        "annotations": annotations.rowcount,
+    }
+
+
+REBUILD_SQL = text("""
+    INSERT INTO folder_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE closure(ancestor_id, descendant_id, depth) AS (
+        SELECT id, id, 0 FROM folders
+        UNION ALL
+        SELECT closure.ancestor_id, folders.id, closure.depth + 1
+        FROM closure JOIN folders ON folders.parent_id = closure.descendant_id
+    )
+    SELECT ancestor_id, descendant_id, depth FROM closure
+""")
+
+
+async def init_folder_closure(conn: AsyncConnection):
+    """Fill the closure table on startup for databases created before it existed"""
+    closure_rows = await conn.scalar(select(func.count()).select_from(FolderClosure))
+    if closure_rows == 0 and await conn.scalar(select(func.count()).select_from(Folder)):
+        await conn.execute(REBUILD_SQL)
+
+
+def build_folder_tree(rows) -> list[dict]:
+    """
+    Build the nested tree from (id, name, parent_id) rows in one pass
+    Sibling order follows row order; folders whose parent is missing are dropped
+    """
+    rows = list(rows)
+    nodes = {
+        folder_id: {"id": folder_id, "name": name, "parent_id": parent_id, "children": []}
+        for folder_id, name, parent_id in rows
+    }
+    roots = []
+    for folder_id, _, parent_id in rows:
+        if parent_id is None:
+            roots.append(nodes[folder_id])
+        elif parent_id in nodes:
+            nodes[parent_id]["children"].append(nodes[folder_id])
+    return roots
+
+
+def with_note_counts(tree: list[dict], counts: dict[int, int]) -> list[dict]:
+    """
+    Copy a cached tree, adding note_count (notes directly in the folder)
+    and total_note_count (including all subfolders)
+    """
+    result = []
+    for node in tree:
+        children = with_note_counts(node["children"], counts)
+        note_count = counts.get(node["id"], 0)
+        result.append({
+            "id": node["id"],
+            "name": node["name"],
+            "parent_id": node["parent_id"],
+            "note_count": note_count,
+            "total_note_count": note_count + sum(child["total_note_count"] for child in children),
+            "children": children,
+        })
+    return result
+
+
+class FolderTreeCache:
+    """Per-worker LRU of user_id -> (folder_tree_version, tree)"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[int, tuple[int, list[dict]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version: int) -> list[dict] | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id: int, version: int, tree: list[dict]):
+        with self._lock:
+            self._entries[user_id] = (version, tree)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+folder_tree_cache = FolderTreeCache(settings.FOLDER_TREE_CACHE_SIZE)
+
+
+async def touch_folder_tree(db: AsyncSession, user_id: int):
+    """Invalidate the cached tree of a user in every worker"""
+    await db.execute(
+        update(User).where(User.id == user_id)
+        .values(folder_tree_version=User.folder_tree_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    folder_tree_cache.discard(user_id)
+
+
+async def get_folder_tree(db: AsyncSession, user: User) -> list[dict]:
+    """Folder tree of a user with note counts (one aggregate query when cached)"""
+    version = user.folder_tree_version
+    tree = folder_tree_cache.get(user.id, version)
+    if tree is None:
+        rows = await db.execute(
+            select(Folder.id, Folder.name, Folder.parent_id)
+            .where(Folder.user_id == user.id)
+            .order_by(Folder.id)
+        )
+        tree = build_folder_tree(rows)
+        folder_tree_cache.put(user.id, version, tree)
+
+    counts = await db.execute(
+        select(Note.folder_id, func.count())
+        .where(Note.user_id == user.id, Note.folder_id.is_not(None))
+        .group_by(Note.folder_id)
+    )
+    return with_note_counts(tree, dict(counts.all()))
@@ -0,0 +1,84 @@
+"""
+Font Service - The font annotation text is rendered with
+
+The font file is discovered once per worker: ANNOTATION_FONT_PATH if set,
+then the usual CJK fonts of macOS, Linux (Noto CJK, WenQuanYi) and Windows.
+Loaded fonts are kept in an LRU keyed by (path, size), so a text annotation
+does not re-parse a multi-megabyte TTC on every render.
+FreeTypeFont objects are shared between render threads; Pillow holds the GIL
+while it uses them.
+"""
+import functools
+from pathlib import Path
+from PIL import ImageFont
+from app.config import settings
+
+FONT_CANDIDATES = (
+    # macOS
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/STHeiti Light.ttc",
+    "/System/Library/Fonts/Hiragino Sans GB.ttc",
+    "/Library/Fonts/Arial Unicode.ttf",
+    # Linux: Noto CJK (Debian/Ubuntu fonts-noto-cjk, Arch, Fedora)
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/google-noto-sans-cjk-fonts/NotoSansCJK-Regular.ttc",
+    # Linux: WenQuanYi
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "/usr/share/fonts/wqy-microhei/wqy-microhei.ttc",
+    "/usr/share/fonts/wqy-zenhei/wqy-zenhei.ttc",
+    # Windows
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+)
+
+# 固定路径都不存在时，在字体目录中按文件名查找
+FONT_DIRS = ("/usr/share/fonts", "/usr/local/share/fonts", "~/.local/share/fonts", "~/.fonts")
+FONT_PATTERNS = ("NotoSansCJK*.tt[cf]", "NotoSansSC*.[ot]tf", "wqy-*.tt[cf]")
+
+
+def _loadable(path: Path) -> bool:
+    try:
+        ImageFont.truetype(str(path), 12)
+    except OSError:
+        return False
+    return True
+
+
+def _candidates():
+    if settings.ANNOTATION_FONT_PATH:
+        yield Path(settings.ANNOTATION_FONT_PATH).expanduser()
+    for candidate in FONT_CANDIDATES:
+        yield Path(candidate)
+    for directory in FONT_DIRS:
+        directory = Path(directory).expanduser()
+        if not directory.is_dir():
+            continue
+        for pattern in FONT_PATTERNS:
+            yield from sorted(directory.rglob(pattern))
+
+
+@functools.cache
+def font_path() -> str | None:
+    """
+    Path of the annotation font, discovered on first use (blocking)
+    None if no font was found: Pillow's built-in font is used, which has no CJK glyphs
+    """
+    for candidate in _candidates():
+        if candidate.is_file() and _loadable(candidate):
+            return str(candidate)
+    return None
+
+
+@functools.lru_cache(maxsize=settings.FONT_CACHE_SIZE)
+def load_font(path: str | None, size: int) -> ImageFont.FreeTypeFont:
+    if path is None:
+        return ImageFont.load_default(size)
+    return ImageFont.truetype(path, size)
+
+
+def get_font(size: int) -> ImageFont.FreeTypeFont:
+    """The annotation font at a pixel size, loaded once per (path, size)"""
+    return load_font(font_path(), size)
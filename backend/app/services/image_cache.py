@@ -0,0 +1,193 @@
+"""
+Note Image Cache - In-process LRU of note id -> resolved image paths
+Lets the image endpoint skip the Note query and the Path.exists() probes.
+
+Invalidation is shared between uvicorn workers through an append-only log
+(RUN_DIR/image_cache_log, outside the public /uploads mount): writers append
+the note id, readers stat the log on every lookup and evict the ids appended
+since their last read.
+Notes changed or deleted through the ORM are invalidated automatically once
+the transaction commits; bulk SQL statements must call mark_images_changed().
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.note import Note
+from app.utils.paths import get_annotated_path
+
+# 日志超过该大小时轮换（换新文件，其他 worker 通过 inode 变化感知并清空缓存）
+LOG_ROTATE_BYTES = 256 * 1024
+
+
+@dataclass(frozen=True)
+class NoteImageInfo:
+    """Everything the image endpoint needs to know about a note"""
+    note_id: int
+    image_version: int
+    annotation_version: int
+    annotated_version: str | None
+    original_path: Path
+    processed_path: Path
+    annotated_path: Path
+    original_exists: bool
+    processed_exists: bool
+    annotated_exists: bool
+
+    @classmethod
+    def load(cls, note_id: int, original_path: str, processed_path: str,
+             image_version: int, annotation_version: int, annotated_version: str | None) -> "NoteImageInfo":
+        """Build from note columns, probing the files once (blocking)"""
+        original = settings.BASE_DIR / original_path
+        processed = settings.BASE_DIR / processed_path
+        annotated = get_annotated_path(processed_path)
+        return cls(
+            note_id=note_id,
+            image_version=image_version,
+            annotation_version=annotation_version,
+            annotated_version=annotated_version,
+            original_path=original,
+            processed_path=processed,
+            annotated_path=annotated,
+            original_exists=original.exists(),
+            processed_exists=processed.exists(),
+            annotated_exists=annotated.exists(),
+        )
+
+    def resolve(self, image_type: str) -> tuple[str, Path, bool] | None:
+        """
+        (effective_type, path, exists) of a variant, same rules as resolve_note_image
+        Returns None for an unknown image type
+        """
+        if image_type == "original":
+            return "original", self.original_path, self.original_exists
+        if image_type == "annotated" and self.annotated_exists:
+            return "annotated", self.annotated_path, True
+        if image_type in ("processed", "annotated"):
+            return "processed", self.processed_path, self.processed_exists
+        return None
+
+
+class NoteImageCache:
+    """Thread-safe LRU with cross-process invalidation"""
+
+    def __init__(self, maxsize: int, log_path: Path):
+        self.maxsize = maxsize
+        self.log_path = log_path
+        self._entries: OrderedDict[int, NoteImageInfo] = OrderedDict()
+        self._lock = threading.Lock()
+        self._log_inode = None
+        self._log_offset = 0
+
+    def _sync(self):
+        """Evict entries invalidated by any worker since the last lookup"""
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._log_inode or stat.st_size < self._log_offset:
+            # 日志被轮换，无法知道期间失效了哪些笔记，全部清空
+            self._entries.clear()
+            self._log_inode = stat.st_ino
+            self._log_offset = stat.st_size
+            return
+        if stat.st_size == self._log_offset:
+            return
+        with open(self.log_path, "rb") as log:
+            log.seek(self._log_offset)
+            chunk = log.read(stat.st_size - self._log_offset)
+        # 只处理完整的行，写了一半的行留到下次
+        complete = chunk.rfind(b"\n") + 1
+        self._log_offset += complete
+        for line in chunk[:complete].split():
+            self._entries.pop(int(line), None)
+
+    def snapshot(self) -> tuple:
+        """Log position to pass to put(), taken before reading the note from the DB"""
+        with self._lock:
+            return self._log_inode, self._log_offset
+
+    def get(self, note_id: int) -> NoteImageInfo | None:
+        with self._lock:
+            self._sync()
+            info = self._entries.get(note_id)
+            if info is not None:
+                self._entries.move_to_end(note_id)
+            return info
+
+    def put(self, info: NoteImageInfo, snapshot: tuple):
+        """
+        Cache a freshly loaded entry
+        Skipped if any invalidation arrived since snapshot, as the entry may predate it
+        """
+        with self._lock:
+            self._sync()
+            if (self._log_inode, self._log_offset) != snapshot:
+                return
+            self._entries[info.note_id] = info
+            self._entries.move_to_end(info.note_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *note_ids: int):
+        """Drop notes from this worker's cache and tell the other workers"""
+        if not note_ids:
+            return
+        with self._lock:
+            for note_id in note_ids:
+                self._entries.pop(note_id, None)
+            try:
+                if self.log_path.stat().st_size > LOG_ROTATE_BYTES:
+                    rotated = self.log_path.with_suffix(f".{os.getpid()}")
+                    rotated.write_bytes(b"")
+                    os.replace(rotated, self.log_path)
+            except FileNotFoundError:
+                pass
+            # O_APPEND 保证多进程并发追加时每行完整
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, "".join(f"{note_id}\n" for note_id in note_ids).encode())
+            finally:
+                os.close(fd)
+            self._sync()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+note_image_cache = NoteImageCache(
+    maxsize=settings.IMAGE_CACHE_SIZE,
+    log_path=settings.RUN_DIR / "image_cache_log",
+)
+
+
+PENDING_KEY = "image_cache_pending"
+
+
+def mark_images_changed(session: Session, *note_ids: int):
+    """Invalidate notes once the session commits (for bulk UPDATE/DELETE statements)"""
+    session.info.setdefault(PENDING_KEY, set()).update(note_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_notes(session, flush_context):
+    changed = [obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, Note)]
+    if changed:
+        mark_images_changed(session, *changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    note_ids = session.info.pop(PENDING_KEY, None)
+    if note_ids:
+        note_image_cache.invalidate(*note_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
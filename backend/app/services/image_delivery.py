@@ -0,0 +1,197 @@
+"""
+Image Delivery Service - Serve each image variant in the best format the client accepts
+Encoded files are persisted under VARIANTS_DIR and keyed by the variant revision,
+so every (variant, format) pair is encoded only once per change
+"""
+import asyncio
+import shutil
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import quote
+from PIL import Image, features
+from fastapi.responses import FileResponse, Response
+from app.config import settings
+
+
+@dataclass(frozen=True)
+class DeliveryFormat:
+    name: str
+    media_type: str
+    suffix: str
+
+
+AVIF = DeliveryFormat("avif", "image/avif", ".avif")
+WEBP = DeliveryFormat("webp", "image/webp", ".webp")
+JPEG = DeliveryFormat("jpeg", "image/jpeg", ".jpg")
+PNG = DeliveryFormat("png", "image/png", ".png")
+# 关闭格式协商时直接返回源文件
+SOURCE = DeliveryFormat("source", None, "")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _avif_supported() -> bool:
+    try:
+        return features.check_module("avif")
+    except ValueError:
+        # Pillow < 11.3 没有内置 AVIF 编码器
+        return False
+
+
+AVIF_SUPPORTED = _avif_supported()
+WEBP_SUPPORTED = features.check_module("webp")
+
+
+def parse_accept(accept: str | None) -> dict[str, float]:
+    """Parse an Accept header into {media_type: q}"""
+    accepted = {}
+    for part in (accept or "").split(","):
+        media_type, *options = [item.strip() for item in part.split(";")]
+        if not media_type:
+            continue
+        q = 1.0
+        for option in options:
+            if option.startswith("q="):
+                try:
+                    q = float(option[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[media_type.lower()] = q
+    return accepted
+
+
+def negotiate_format(accept: str | None, binarized: bool) -> DeliveryFormat:
+    """
+    Pick the smallest format the client accepts
+    Binarized pages fall back to 1-bit PNG, everything else to progressive JPEG
+    """
+    if not settings.IMAGE_NEGOTIATION:
+        return SOURCE
+    accepted = parse_accept(accept)
+    if AVIF_SUPPORTED and accepted.get(AVIF.media_type, 0) > 0:
+        return AVIF
+    if WEBP_SUPPORTED and accepted.get(WEBP.media_type, 0) > 0:
+        return WEBP
+    return PNG if binarized else JPEG
+
+
+def make_etag(note_id: int, image_type: str, version: str, fmt: DeliveryFormat) -> str:
+    """Strong ETag of one representation of an image variant"""
+    return f'"{note_id}-{image_type}-{version}-{fmt.name}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def cache_headers(etag: str, versioned: bool) -> dict:
+    """
+    Response headers for an image variant
+    A URL carrying the current version never changes content, so it is immutable;
+    unversioned URLs must revalidate with the ETag
+    """
+    return {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if versioned else "no-cache",
+        "Vary": "Accept",
+    }
+
+
+def variant_path(note_id: int, image_type: str, version: str, fmt: DeliveryFormat) -> Path:
+    return settings.VARIANTS_DIR / str(note_id) / f"{image_type}_{version}{fmt.suffix}"
+
+
+def encode_variant(source_path: Path, target: Path, fmt: DeliveryFormat, binarized: bool):
+    """
+    Encode one delivery variant (blocking)
+    - Binarized pages are re-thresholded to pure black/white and stored grayscale,
+      which lets WebP go lossless and PNG go 1-bit
+    - Photos and annotated pages use lossy encoding at DELIVERY_QUALITY
+    """
+    quality = settings.DELIVERY_QUALITY
+    with Image.open(source_path) as src:
+        if binarized:
+            # 处理后的图片本身是二值图，去掉 JPEG 压缩带来的灰色噪点
+            img = src.convert("L").point(lambda p: 255 if p >= 128 else 0)
+        else:
+            img = src.convert("RGB")
+
+    building = target.parent / f".{target.name}.{uuid.uuid4().hex}"
+    try:
+        if fmt is AVIF:
+            img.save(building, "AVIF", quality=settings.DELIVERY_AVIF_QUALITY, speed=6)
+        elif fmt is WEBP:
+            if binarized:
+                img.save(building, "WEBP", lossless=True, method=4)
+            else:
+                img.save(building, "WEBP", quality=quality, method=4)
+        elif fmt is PNG:
+            img.convert("1").save(building, "PNG", optimize=True)
+        else:
+            img.save(building, "JPEG", quality=quality, progressive=True, optimize=True)
+        building.replace(target)
+    finally:
+        if building.exists():
+            building.unlink()
+
+    # 清理同一图片类型、同一格式的旧版本
+    prefix = target.name.rsplit("_", 1)[0] + "_"
+    for sibling in target.parent.iterdir():
+        if sibling != target and sibling.name.startswith(prefix) and sibling.suffix == target.suffix:
+            sibling.unlink(missing_ok=True)
+
+
+_encode_locks: dict[Path, asyncio.Lock] = {}
+
+
+async def get_delivery_variant(
+    note_id: int,
+    image_type: str,
+    version: str,
+    source_path: Path,
+    fmt: DeliveryFormat,
+) -> Path:
+    """Return the path of the encoded file for this variant, encoding it on first use"""
+    if fmt is SOURCE:
+        return source_path
+
+    # processed 是二值化结果，可以用更激进的编码
+    binarized = image_type == "processed"
+    target = variant_path(note_id, image_type, version, fmt)
+    if not target.exists():
+        lock = _encode_locks.setdefault(target, asyncio.Lock())
+        async with lock:
+            if not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                await asyncio.to_thread(encode_variant, source_path, target, fmt, binarized)
+        _encode_locks.pop(target, None)
+    return target
+
+
+def file_response(path: Path, media_type: str | None, headers: dict) -> Response:
+    """
+    Send an image file
+    With IMAGE_ACCEL_REDIRECT the body is left to nginx (sendfile, Range, caching)
+    and the worker only returns headers; otherwise the file is streamed by uvicorn
+    """
+    if settings.IMAGE_ACCEL_REDIRECT:
+        try:
+            relative = path.resolve().relative_to(settings.UPLOAD_DIR.resolve())
+        except ValueError:
+            relative = None
+        if relative is not None:
+            accel_headers = {**headers, "X-Accel-Redirect": settings.ACCEL_REDIRECT_PREFIX + quote(relative.as_posix())}
+            return Response(media_type=media_type, headers=accel_headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def remove_variants(note_id: int):
+    """Drop every encoded variant of a note"""
+    shutil.rmtree(settings.VARIANTS_DIR / str(note_id), ignore_errors=True)
@@ -49,8 +49,26 @@ class ImageProcessor:
     Transforms photos into clean, high-contrast scanned documents
     """
     
-    def __init__(self, params: ProcessingParams = None):
+    # Non-local means denoising windows at full resolution (must be odd)
+    DENOISE_TEMPLATE_WINDOW = 7
+    DENOISE_SEARCH_WINDOW = 21
+    
+    def __init__(self, params: ProcessingParams = None, scale: float = 1.0):
+        """
+        Args:
+            params: Processing parameters, given for the full resolution image
+            scale: Size of the processed image relative to the full resolution one;
+                   window sizes are scaled by it so a downscaled preview matches the final result
+        """
         self.params = params or ProcessingParams()
+        self.scale = scale
+    
+    def _window(self, size: int) -> int:
+        """Window size in pixels at the processing scale (odd, at least 3)"""
+        size = round(size * self.scale)
+        if size % 2 == 0:
+            size += 1
+        return max(3, size)
     
     def process(self, image_path: str, output_path: str = None) -> str:
         """
@@ -69,7 +87,7 @@ class ImageProcessor:
             raise ValueError(f"Cannot read image: {image_path}")
         
         # Processing pipeline
-        processed = self._pipeline(img)
+        processed = self.process_array(img)
         
         # Generate output path if not provided
         if output_path is None:
@@ -80,6 +98,13 @@ class ImageProcessor:
         cv2.imwrite(output_path, processed)
         return output_path
     
+    def process_array(self, img: np.ndarray) -> np.ndarray:
+        """
+        Run the processing pipeline on an already decoded BGR image
+        Used by callers that keep the source image in memory (e.g. live preview)
+        """
+        return self._pipeline(img)
+    
     def _pipeline(self, img: np.ndarray) -> np.ndarray:
         """
         Full processing pipeline:
@@ -102,15 +127,13 @@ class ImageProcessor:
                 gray, 
                 None, 
                 h=self.params.denoise_strength,
-                templateWindowSize=7,
-                searchWindowSize=21
+                templateWindowSize=self._window(self.DENOISE_TEMPLATE_WINDOW),
+                searchWindowSize=self._window(self.DENOISE_SEARCH_WINDOW)
             )
         
         # Step 4: Adaptive threshold for binarization
         # This creates the "white paper, black text" effect
-        block_size = self.params.block_size
-        if block_size % 2 == 0:
-            block_size += 1  # Must be odd
+        block_size = self._window(self.params.block_size)
         
         binary = cv2.adaptiveThreshold(
             gray,
@@ -0,0 +1,121 @@
+"""
+Import Jobs - Run ZIP imports in the background and report their progress
+
+Processing a large archive takes longer than a reverse proxy waits for a
+response (nginx proxy_read_timeout), so the request only saves the upload
+under IMPORTS_DIR/{user_id}/ and starts the import as a background task; the
+client polls the job state. As for export jobs, the state is a small JSON
+file next to the archive, which every uvicorn worker can read.
+
+The saved archive is removed as soon as the job ends. States of finished
+jobs are pruned IMPORT_TTL_HOURS after their last update, when the same user
+starts another import.
+"""
+import json
+import re
+import shutil
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import BinaryIO
+from app.config import settings
+from app.database import async_session
+from app.services import note_import
+from app.services.export_jobs import write_state
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# 进度按批次更新（每批 IMPORT_BATCH 张图片），超过该时间没有更新视为所在 worker 已退出
+STALE_SECONDS = 600
+
+
+def job_dir(user_id: int) -> Path:
+    return settings.IMPORTS_DIR / str(user_id)
+
+
+def archive_path(user_id: int, job_id: str) -> Path:
+    return job_dir(user_id) / f"{job_id}.zip"
+
+
+def state_path(user_id: int, job_id: str) -> Path:
+    return job_dir(user_id) / f"{job_id}.json"
+
+
+def read_job(user_id: int, job_id: str) -> dict | None:
+    """Current state of a job, or None if unknown (or already pruned)"""
+    if not JOB_ID_PATTERN.match(job_id):
+        return None
+    try:
+        state = json.loads(state_path(user_id, job_id).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if state["status"] == "running" and time.time() - state["updated_at"] > STALE_SECONDS:
+        state["status"] = "failed"
+        state["error"] = "Import was interrupted"
+    return state
+
+
+def _prune(user_id: int):
+    """Remove finished (or interrupted) jobs not updated for IMPORT_TTL_HOURS"""
+    expire_before = time.time() - settings.IMPORT_TTL_HOURS * 3600
+    for path in job_dir(user_id).glob("*.json"):
+        state = read_job(user_id, path.stem)
+        if state is None or state["status"] == "running" or state["updated_at"] > expire_before:
+            continue
+        archive_path(user_id, path.stem).unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+
+
+def create_job(user_id: int, source: BinaryIO, folder_id: int | None) -> dict:
+    """
+    Save an uploaded archive and register its import job (blocking)
+    Raises ValueError if the upload is not a ZIP archive
+    """
+    job_dir(user_id).mkdir(parents=True, exist_ok=True)
+    _prune(user_id)
+
+    job_id = uuid.uuid4().hex
+    target = archive_path(user_id, job_id)
+    with open(target, "wb") as out:
+        shutil.copyfileobj(source, out)
+    if not zipfile.is_zipfile(target):
+        target.unlink()
+        raise ValueError("Not a ZIP archive")
+
+    state = {
+        "job_id": job_id,
+        "folder_id": folder_id,
+        "status": "running",
+        "done": 0,
+        "total": 0,
+        "notes": 0,
+        "folders": 0,
+        "failed": [],
+        "error": None,
+        "updated_at": time.time(),
+    }
+    write_state(state_path(user_id, job_id), state)
+    return state
+
+
+async def run_job(user_id: int, state: dict):
+    """Background task body: import the saved archive with its own session"""
+    state_file = state_path(user_id, state["job_id"])
+    source_path = archive_path(user_id, state["job_id"])
+
+    def report(**changes):
+        state.update(changes, updated_at=time.time())
+        write_state(state_file, state)
+
+    try:
+        async with async_session() as db:
+            with open(source_path, "rb") as source:
+                result = await note_import.import_archive(
+                    db, user_id, source, state["folder_id"], progress=lambda counts: report(**counts)
+                )
+        report(status="done", **result)
+    except Exception as e:
+        report(status="failed", error=str(e))
+    finally:
+        source_path.unlink(missing_ok=True)
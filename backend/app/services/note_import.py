@@ -0,0 +1,231 @@
+"""
+Note Import - Bulk import of note photos from a ZIP archive
+
+Entries are read from the archive one at a time (nothing is extracted to a
+temporary directory) and processed by ImageProcessor on a thread pool a few
+entries ahead of the reader; OpenCV releases the GIL, so the pool keeps every
+core busy. Directories inside the archive become folders (an existing folder
+with the same name and parent is reused), and notes are inserted and
+committed IMPORT_BATCH at a time.
+"""
+import asyncio
+import os
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import BinaryIO, Callable
+import cv2
+import numpy as np
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.folder import Folder
+from app.models.note import Note
+from app.services import folder_tree
+from app.services.image_processor import ImageProcessor
+from app.services.search import mark_search_changed
+from app.utils.paths import ALLOWED_EXTENSIONS
+
+# 系统生成的文件（macOS 资源分支等）不导入
+IGNORED_PARTS = {"__MACOSX"}
+
+
+@dataclass(frozen=True)
+class ImportEntry:
+    """One image in the archive"""
+    info: zipfile.ZipInfo
+    folder: tuple[str, ...]
+    title: str
+    suffix: str
+
+
+@dataclass
+class ImportedImage:
+    """Result of processing one entry (error is set if it could not be processed)"""
+    entry: ImportEntry
+    original_path: str | None = None
+    processed_path: str | None = None
+    params: dict | None = None
+    error: str | None = None
+
+
+def entry_name(info: zipfile.ZipInfo) -> str:
+    """
+    Member name as it was on the user's machine
+    Archives made on Chinese Windows store GBK names without the UTF-8 flag,
+    which zipfile decodes as cp437
+    """
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("gbk")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def plan_import(archive: zipfile.ZipFile) -> list[ImportEntry]:
+    """Image entries of an archive in path order; everything else is ignored"""
+    entries = []
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        path = PurePosixPath(entry_name(info).replace("\\", "/"))
+        parts = [part for part in path.parts if part not in ("", ".", "..", "/")]
+        if not parts or any(part.startswith(".") or part in IGNORED_PARTS for part in parts):
+            continue
+        suffix = path.suffix.lower()
+        if suffix not in ALLOWED_EXTENSIONS:
+            continue
+        title = PurePosixPath(parts[-1]).stem.strip()[:200] or "笔记"
+        folder = tuple(part.strip()[:100] or "_" for part in parts[:-1])
+        entries.append(ImportEntry(info, folder, title, suffix))
+    entries.sort(key=lambda entry: (entry.folder, entry.info.filename))
+    return entries
+
+
+def process_entry(entry: ImportEntry, data: bytes, processor: ImageProcessor) -> ImportedImage:
+    """Store the original bytes and the processed image of one entry (blocking)"""
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return ImportedImage(entry, error="Cannot read image")
+
+    unique_name = uuid.uuid4().hex
+    original_path = settings.ORIGINAL_DIR / f"{unique_name}{entry.suffix}"
+    processed_path = settings.PROCESSED_DIR / f"{unique_name}_processed{entry.suffix}"
+    try:
+        original_path.write_bytes(data)
+        if not cv2.imwrite(str(processed_path), processor.process_array(img)):
+            raise ValueError("Cannot write processed image")
+    except Exception as e:
+        original_path.unlink(missing_ok=True)
+        processed_path.unlink(missing_ok=True)
+        return ImportedImage(entry, error=str(e))
+    return ImportedImage(
+        entry,
+        original_path=str(original_path.relative_to(settings.BASE_DIR)),
+        processed_path=str(processed_path.relative_to(settings.BASE_DIR)),
+        params=processor.params.to_dict(),
+    )
+
+
+def process_batch(archive: zipfile.ZipFile, entries: list[ImportEntry], pool: ThreadPoolExecutor,
+                  window: int) -> list[ImportedImage]:
+    """
+    Process entries on the pool, reading each from the archive only when a slot frees up (blocking)
+    At most `window` entries are held in memory at a time
+    """
+    processor = ImageProcessor()
+    pending, results = [], []
+    for entry in entries:
+        try:
+            data = archive.read(entry.info)
+        except (zipfile.BadZipFile, OSError, RuntimeError) as e:
+            pending.append((entry, str(e)))
+        else:
+            pending.append((entry, pool.submit(process_entry, entry, data, processor)))
+        if len(pending) >= window:
+            results.append(_result(*pending.pop(0)))
+    results += [_result(*item) for item in pending]
+    return results
+
+
+def _result(entry: ImportEntry, outcome) -> ImportedImage:
+    if isinstance(outcome, str):
+        return ImportedImage(entry, error=outcome)
+    return outcome.result()
+
+
+async def _ensure_folders(db: AsyncSession, user_id: int, parent_id: int | None,
+                          paths: set[tuple[str, ...]]) -> tuple[dict[tuple[str, ...], int | None], int]:
+    """Folder id for every directory of the archive, creating missing folders; returns (ids, created)"""
+    rows = await db.execute(select(Folder.id, Folder.name, Folder.parent_id).where(Folder.user_id == user_id))
+    children = {(row.parent_id, row.name): row.id for row in rows}
+
+    folder_ids: dict[tuple[str, ...], int | None] = {(): parent_id}
+    created = 0
+    for path in sorted(paths, key=len):
+        for depth in range(1, len(path) + 1):
+            prefix = path[:depth]
+            if prefix in folder_ids:
+                continue
+            parent = folder_ids[prefix[:-1]]
+            folder_id = children.get((parent, prefix[-1]))
+            if folder_id is None:
+                folder = Folder(name=prefix[-1], parent_id=parent, user_id=user_id)
+                db.add(folder)
+                await db.flush()
+                await folder_tree.add_folder(db, folder.id, parent)
+                folder_id = children[(parent, prefix[-1])] = folder.id
+                created += 1
+            folder_ids[prefix] = folder_id
+    if created:
+        await folder_tree.touch_folder_tree(db, user_id)
+    return folder_ids, created
+
+
+async def import_archive(db: AsyncSession, user_id: int, source: BinaryIO, parent_id: int | None = None,
+                         progress: Callable[[dict], None] | None = None) -> dict:
+    """
+    Import every image of a ZIP archive as a note
+    Returns counts and the archive paths of entries that could not be imported
+    progress, if given, is called with the counts so far (plus done/total entries) after every batch
+    """
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        raise ValueError("Not a ZIP archive")
+
+    with archive:
+        entries = plan_import(archive)
+        folder_ids, folders_created = await _ensure_folders(
+            db, user_id, parent_id, {entry.folder for entry in entries}
+        )
+        await db.commit()
+
+        workers = settings.IMPORT_WORKERS or os.cpu_count() or 1
+        imported, failed = 0, []
+
+        def report(processed: int):
+            if progress is not None:
+                progress({"done": processed, "total": len(entries), "notes": imported,
+                          "folders": folders_created, "failed": failed})
+
+        report(0)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, len(entries), settings.IMPORT_BATCH):
+                batch = entries[start:start + settings.IMPORT_BATCH]
+                results = await asyncio.to_thread(process_batch, archive, batch, pool, workers * 2)
+                done = [result for result in results if result.error is None]
+                failed += [entry_name(result.entry.info) for result in results if result.error is not None]
+                if not done:
+                    report(start + len(batch))
+                    continue
+                try:
+                    new_ids = list(await db.scalars(
+                        insert(Note).returning(Note.id),
+                        [
+                            {
+                                "title": result.entry.title,
+                                "original_path": result.original_path,
+                                "processed_path": result.processed_path,
+                                "folder_id": folder_ids[result.entry.folder],
+                                "user_id": user_id,
+                                "processing_params": result.params,
+                            }
+                            for result in done
+                        ],
+                    ))
+                    mark_search_changed(db.sync_session, *new_ids)
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    for result in done:
+                        (settings.BASE_DIR / result.original_path).unlink(missing_ok=True)
+                        (settings.BASE_DIR / result.processed_path).unlink(missing_ok=True)
+                    raise
+                imported += len(new_ids)
+                report(start + len(batch))
+
+    return {"notes": imported, "folders": folders_created, "failed": failed}
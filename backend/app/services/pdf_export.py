@@ -0,0 +1,150 @@
+"""
+PDF Export - Stream a folder as one multi-page PDF, one note image per page
+
+The PDF is written object by object while it is sent: each page is encoded,
+emitted and forgotten, only the byte offsets for the xref table are kept.
+- Binarized (processed) pages are stored 1-bit with CCITT Group 4 fax
+  compression, typically 20-50 KB per page
+- Annotated pages keep their colors and are stored as JPEG
+Pages are encoded by a small thread pool a few pages ahead of the writer,
+so memory stays bounded by the look-ahead window, not the page count.
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+from PIL import Image
+from app.config import settings
+from app.services.export_plan import ExportEntry
+
+# 页面宽度固定为 A4 宽度，高度按图片比例
+PAGE_WIDTH = 595.0
+
+
+@dataclass
+class PdfImage:
+    """An encoded page image ready to become an image XObject"""
+    width: int
+    height: int
+    dictionary: str
+    data: bytes
+
+
+def encode_g4(img: Image.Image) -> PdfImage:
+    """1-bit CCITT G4 image, via libtiff (the whole page as a single strip)"""
+    # 二值化后的图片直接按 128 阈值转 1-bit，不做抖动
+    bilevel = img.convert("L").convert("1", dither=Image.Dither.NONE)
+    width, height = bilevel.size
+    buffer = io.BytesIO()
+    bilevel.save(buffer, "TIFF", compression="group4", tiffinfo={278: height})
+    with Image.open(buffer) as tiff:
+        offset = tiff.tag_v2[273][0]
+        length = tiff.tag_v2[279][0]
+    data = buffer.getbuffer()[offset:offset + length].tobytes()
+    # Pillow 写出的是 BlackIsZero，编码数据中 1 表示白色
+    dictionary = (
+        f"/Width {width} /Height {height} /ColorSpace /DeviceGray /BitsPerComponent 1 "
+        f"/Filter /CCITTFaxDecode /DecodeParms << /K -1 /Columns {width} /Rows {height} /BlackIs1 true >>"
+    )
+    return PdfImage(width, height, dictionary, data)
+
+
+def encode_jpeg(img: Image.Image) -> PdfImage:
+    rgb = img.convert("RGB")
+    buffer = io.BytesIO()
+    rgb.save(buffer, "JPEG", quality=settings.PDF_JPEG_QUALITY, optimize=True)
+    width, height = rgb.size
+    dictionary = (
+        f"/Width {width} /Height {height} /ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode"
+    )
+    return PdfImage(width, height, dictionary, buffer.getvalue())
+
+
+def encode_page(entry: ExportEntry) -> PdfImage:
+    """Encode one note image for the PDF (blocking)"""
+    with Image.open(entry.path) as img:
+        if entry.image_type == "processed":
+            # JPEG 可以直接解码为灰度，省去色彩转换
+            img.draft("L", img.size)
+            return encode_g4(img)
+        return encode_jpeg(img)
+
+
+def _pdf_text(value: str) -> str:
+    """PDF text string as UTF-16BE hex (works for Chinese titles)"""
+    return "<FEFF" + value.encode("utf-16-be").hex().upper() + ">"
+
+
+class _PdfWriter:
+    """Tracks object offsets while PDF bytes are produced"""
+
+    def __init__(self):
+        self.position = 0
+        self.offsets: dict[int, int] = {}
+
+    def emit(self, data: bytes) -> bytes:
+        self.position += len(data)
+        return data
+
+    def obj(self, number: int, body: bytes) -> bytes:
+        self.offsets[number] = self.position
+        return self.emit(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def stream_obj(self, number: int, dictionary: str, data: bytes) -> bytes:
+        body = f"<< {dictionary} /Length {len(data)} >>\nstream\n".encode() + data + b"\nendstream"
+        return self.obj(number, body)
+
+
+def _encoded_pages(entries: Iterable[ExportEntry], workers: int) -> Iterator[PdfImage]:
+    """Encode pages in parallel, in order, at most 2 * workers pages ahead"""
+    window = workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for entry in entries:
+            pending.append(pool.submit(encode_page, entry))
+            if len(pending) >= window:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def stream_pdf(entries: Iterable[ExportEntry], title: str = "") -> Iterable[bytes]:
+    """
+    Yield a PDF with one page per entry (blocking)
+    Object 1 is the catalog and 2 the page tree; both are written last,
+    once all page object numbers are known
+    """
+    writer = _PdfWriter()
+    yield writer.emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    workers = settings.PDF_WORKERS or min(4, os.cpu_count() or 1)
+    page_numbers = []
+    next_number = 4
+    for image in _encoded_pages(entries, workers):
+        image_number, content_number, page_number = next_number, next_number + 1, next_number + 2
+        next_number += 3
+        page_height = PAGE_WIDTH * image.height / image.width
+
+        yield writer.stream_obj(image_number, f"/Type /XObject /Subtype /Image {image.dictionary}", image.data)
+        content = f"q {PAGE_WIDTH:.2f} 0 0 {page_height:.2f} 0 0 cm /Im0 Do Q".encode()
+        yield writer.stream_obj(content_number, "", content)
+        yield writer.obj(page_number, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH:.2f} {page_height:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_number} 0 R >> >> /Contents {content_number} 0 R >>"
+        ).encode())
+        page_numbers.append(page_number)
+
+    kids = " ".join(f"{number} 0 R" for number in page_numbers)
+    yield writer.obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>".encode())
+    yield writer.obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    yield writer.obj(3, f"<< /Title {_pdf_text(title)} /Producer (Processing My Note) >>".encode())
+
+    xref_offset = writer.position
+    lines = [f"xref\n0 {next_number}\n", "0000000000 65535 f \n"]
+    for number in range(1, next_number):
+        lines.append(f"{writer.offsets[number]:010d} 00000 n \n")
+    yield writer.emit("".join(lines).encode())
+    yield writer.emit((
+        f"trailer\n<< /Size {next_number} /Root 1 0 R /Info 3 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n"
+    ).encode())
@@ -0,0 +1,84 @@
+"""
+Live Preview Service - Latest-wins rendering for slider adjustments
+Only the newest parameter set submitted by the client is rendered;
+anything that arrives while a render is running replaces the pending one
+"""
+import asyncio
+import cv2
+import numpy as np
+from app.config import settings
+from app.services.image_processor import ImageProcessor, ProcessingParams
+
+
+def load_preview_source(image_path: str, max_side: int = None) -> tuple[np.ndarray, float]:
+    """
+    Decode the original image once and downscale it for previewing
+    Returns the image and its scale relative to the original
+    """
+    img = cv2.imread(image_path)
+    if img is None:
+        raise ValueError(f"Cannot read image: {image_path}")
+
+    max_side = settings.PREVIEW_MAX_SIDE if max_side is None else max_side
+    height, width = img.shape[:2]
+    scale = 1.0
+    if max_side and max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        img = cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return img, scale
+
+
+class PreviewSession:
+    """
+    Preview state for one WebSocket connection
+
+    submit() only stores the newest params and wakes the render loop,
+    so a burst of slider events collapses into a single render.
+    Params are given for the original image; window sizes are scaled
+    to the downscaled source so the preview matches the saved result
+    """
+
+    def __init__(self, source: np.ndarray, scale: float = 1.0):
+        self._source = source
+        self._scale = scale
+        self._pending: tuple[int, dict] | None = None
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+
+    def submit(self, params: dict) -> int:
+        """Queue a parameter set, replacing any not yet rendered one"""
+        self._seq += 1
+        self._pending = (self._seq, params)
+        self._wakeup.set()
+        return self._seq
+
+    def is_stale(self, seq: int) -> bool:
+        """A frame is stale once a newer parameter set has been submitted"""
+        return seq < self._seq
+
+    def _render(self, seq: int, params: dict) -> bytes | None:
+        """Render and encode one frame (runs in a worker thread)"""
+        processor = ImageProcessor(ProcessingParams.from_dict(params), scale=self._scale)
+        frame = processor.process_array(self._source)
+        # 渲染期间已有更新的参数，跳过编码和推送
+        if self.is_stale(seq):
+            return None
+        ok, encoded = cv2.imencode(
+            ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, settings.PREVIEW_JPEG_QUALITY]
+        )
+        return encoded.tobytes() if ok else None
+
+    async def frames(self):
+        """Yield (seq, params, jpeg_bytes) for every non-stale render"""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._pending is None:
+                continue
+            seq, params = self._pending
+            self._pending = None
+
+            frame = await asyncio.to_thread(self._render, seq, params)
+            if frame is None or self.is_stale(seq):
+                continue
+            yield seq, params, frame
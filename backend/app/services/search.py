@@ -0,0 +1,201 @@
+"""
+Note Search Service - SQLite FTS5 index over note titles and text annotations
+
+note_search(title, body) is keyed by rowid = notes.id, body holds the content of
+the note's text annotations. unicode61 only splits on spaces and punctuation,
+so a Chinese title would become one giant token; CJK characters are therefore
+wrapped in zero-width spaces (declared as separators) before indexing, and a
+CJK query becomes a phrase of single characters - matching any substring.
+
+The index follows the ORM automatically: notes and annotations flushed in a
+session are re-indexed right before it commits. Bulk SQL statements must call
+mark_search_changed().
+"""
+import html
+import re
+from sqlalchemy import event, func, inspect, literal_column, table, column, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.orm import Session
+from app.models.note import Note
+from app.models.annotation import Annotation
+from app.utils.annotations import parse_annotation_content
+
+# 零宽空格：作为分词器的额外分隔符，写入时插在每个中日韩字符两侧
+CJK_SEPARATOR = "\u200b"
+CJK_PATTERN = re.compile(r"([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff])")
+
+# snippet()/highlight() 先用控制字符标记命中位置，转义 HTML 之后再换成 <mark>
+HIT_OPEN, HIT_CLOSE = "\x02", "\x03"
+SNIPPET_TOKENS = 24
+# bm25 列权重：标题命中比标注命中更重要
+TITLE_WEIGHT, BODY_WEIGHT = 10.0, 1.0
+
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS note_search USING fts5("
+    "title, body, "
+    f"tokenize=\"unicode61 remove_diacritics 2 separators '{CJK_SEPARATOR}'\", "
+    "prefix='2 3')"
+)
+
+note_search = table("note_search", column("rowid"), column("title"), column("body"))
+# FTS5 的 MATCH / bm25 / snippet 都以表名作为第一个参数
+NOTE_SEARCH = literal_column("note_search")
+
+
+def index_text(value: str | None) -> str:
+    """Prepare text for indexing: every CJK character becomes its own token"""
+    if not value:
+        return ""
+    return CJK_PATTERN.sub(f"{CJK_SEPARATOR}\\1{CJK_SEPARATOR}", value)
+
+
+def build_match_query(keyword: str) -> str | None:
+    """
+    Turn user input into an FTS5 query
+    Each whitespace-separated term must match (AND); a term is a quoted phrase,
+    so FTS5 syntax characters in user input are never interpreted; a term
+    ending in a word is a prefix query ("no" finds "note"), CJK characters
+    are whole tokens already
+    Returns None when the input contains nothing searchable
+    """
+    terms = []
+    for term in keyword.split():
+        if not any(ch.isalnum() for ch in term):
+            continue
+        phrase = index_text(term).replace('"', '""')
+        prefix = "" if CJK_PATTERN.match(term[-1]) else "*"
+        terms.append(f'"{phrase}"{prefix}')
+    return " ".join(terms) if terms else None
+
+
+def match_clause(match_query: str):
+    return NOTE_SEARCH.op("MATCH")(match_query)
+
+
+def rank_expression():
+    """bm25 score of the current row, lower is better"""
+    return func.bm25(NOTE_SEARCH, TITLE_WEIGHT, BODY_WEIGHT)
+
+
+def highlight_expression(column_index: int, snippet: bool):
+    """Title highlight (column 0) or body snippet (column 1) with hit markers"""
+    if snippet:
+        return func.snippet(NOTE_SEARCH, column_index, HIT_OPEN, HIT_CLOSE, "…", SNIPPET_TOKENS)
+    return func.highlight(NOTE_SEARCH, column_index, HIT_OPEN, HIT_CLOSE)
+
+
+def render_highlight(value: str | None) -> str | None:
+    """Strip the CJK separators, escape HTML and turn hit markers into <mark>"""
+    if not value:
+        return None
+    value = html.escape(value.replace(CJK_SEPARATOR, ""))
+    return value.replace(HIT_OPEN, "<mark>").replace(HIT_CLOSE, "</mark>")
+
+
+def _text_annotation_body(contents: list[str]) -> str:
+    texts = []
+    for content in contents:
+        parsed = parse_annotation_content(content)
+        if parsed["type"] == "text":
+            texts.append(str(parsed["data"]))
+    return "\n".join(texts)
+
+
+def reindex_notes(connection, note_ids):
+    """
+    Rebuild the index rows of the given notes (blocking, on a sync connection)
+    Notes that no longer exist simply lose their row
+    """
+    note_ids = list(note_ids)
+    for start in range(0, len(note_ids), 500):
+        chunk = note_ids[start:start + 500]
+        placeholders = ", ".join(str(int(note_id)) for note_id in chunk)
+        titles = connection.execute(
+            text(f"SELECT id, title FROM notes WHERE id IN ({placeholders})")
+        ).all()
+        contents: dict[int, list[str]] = {}
+        for note_id, content in connection.execute(
+            text(f"SELECT note_id, content FROM annotations WHERE note_id IN ({placeholders}) ORDER BY id")
+        ):
+            contents.setdefault(note_id, []).append(content)
+
+        connection.execute(text(f"DELETE FROM note_search WHERE rowid IN ({placeholders})"))
+        rows = [
+            {
+                "id": note_id,
+                "title": index_text(title),
+                "body": index_text(_text_annotation_body(contents.get(note_id, []))),
+            }
+            for note_id, title in titles
+        ]
+        if rows:
+            connection.execute(
+                text("INSERT INTO note_search (rowid, title, body) VALUES (:id, :title, :body)"),
+                rows,
+            )
+
+
+def rebuild_index(connection):
+    """Re-index every note (blocking)"""
+    connection.execute(text("DELETE FROM note_search"))
+    note_ids = connection.execute(text("SELECT id FROM notes")).scalars().all()
+    reindex_notes(connection, note_ids)
+
+
+async def init_search_index(conn: AsyncConnection):
+    """Create the FTS table on startup, filling it when it is new (existing databases)"""
+    exists = (await conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'note_search'")
+    )).first()
+    await conn.execute(text(CREATE_SQL))
+    if not exists:
+        await conn.run_sync(rebuild_index)
+
+
+PENDING_KEY = "search_pending"
+
+
+def mark_search_changed(session: Session, *note_ids: int):
+    """Re-index notes when the session commits (for bulk INSERT/UPDATE/DELETE statements)"""
+    session.info.setdefault(PENDING_KEY, set()).update(note_ids)
+
+
+def _changed(obj, attribute: str) -> bool:
+    return inspect(obj).attrs[attribute].history.has_changes()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_notes(session, flush_context):
+    changed = set()
+    for obj in session.new:
+        if isinstance(obj, Note):
+            changed.add(obj.id)
+        elif isinstance(obj, Annotation):
+            changed.add(obj.note_id)
+    for obj in session.dirty:
+        if isinstance(obj, Note) and _changed(obj, "title"):
+            changed.add(obj.id)
+        elif isinstance(obj, Annotation) and _changed(obj, "content"):
+            changed.add(obj.note_id)
+    for obj in session.deleted:
+        if isinstance(obj, Note):
+            changed.add(obj.id)
+        elif isinstance(obj, Annotation):
+            changed.add(obj.note_id)
+    changed.discard(None)
+    if changed:
+        mark_search_changed(session, *changed)
+
+
+@event.listens_for(Session, "before_commit")
+def _reindex_before_commit(session):
+    # 先把剩余改动 flush 出来，使索引与即将提交的数据一致
+    session.flush()
+    note_ids = session.info.pop(PENDING_KEY, None)
+    if note_ids:
+        reindex_notes(session.connection(), note_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,117 @@
+"""
+Deep Zoom Tile Service - DZI-style tile pyramids for the full-screen viewer
+Level 0 is a single pixel, the last level is the full-resolution image;
+each level halves the one above it and is cut into TILE_SIZE tiles
+"""
+import asyncio
+import math
+import shutil
+import uuid
+from pathlib import Path
+from PIL import Image
+from app.config import settings
+
+
+def pyramid_dir(note_id: int, image_type: str, version: str) -> Path:
+    """Directory holding one version of a note's tile pyramid"""
+    return settings.TILES_DIR / str(note_id) / f"{image_type}_{version}"
+
+
+def tile_path(pyramid: Path, level: int, col: int, row: int) -> Path:
+    return pyramid / str(level) / f"{col}_{row}.jpg"
+
+
+def max_level(width: int, height: int) -> int:
+    return math.ceil(math.log2(max(width, height, 1)))
+
+
+def level_size(width: int, height: int, level: int) -> tuple[int, int]:
+    """Image size at a pyramid level"""
+    scale = 2 ** (max_level(width, height) - level)
+    return max(1, math.ceil(width / scale)), max(1, math.ceil(height / scale))
+
+
+def describe(width: int, height: int) -> dict:
+    """DZI descriptor fields for a pyramid of the given full size"""
+    return {
+        "width": width,
+        "height": height,
+        "tile_size": settings.TILE_SIZE,
+        "overlap": settings.TILE_OVERLAP,
+        "format": "jpg",
+        "max_level": max_level(width, height),
+    }
+
+
+def _write_level(img: Image.Image, level_dir: Path):
+    """Cut one pyramid level into overlapping tiles"""
+    tile_size = settings.TILE_SIZE
+    overlap = settings.TILE_OVERLAP
+    width, height = img.size
+    level_dir.mkdir(parents=True)
+    for col in range(math.ceil(width / tile_size)):
+        for row in range(math.ceil(height / tile_size)):
+            left = max(0, col * tile_size - overlap)
+            top = max(0, row * tile_size - overlap)
+            right = min(width, (col + 1) * tile_size + overlap)
+            bottom = min(height, (row + 1) * tile_size + overlap)
+            img.crop((left, top, right, bottom)).save(
+                level_dir / f"{col}_{row}.jpg", quality=settings.TILE_JPEG_QUALITY
+            )
+
+
+def build_pyramid(source_path: Path, target: Path):
+    """
+    Generate the full tile pyramid for an image into target
+    Writes into a temporary sibling first so readers never see a partial pyramid
+    """
+    building = target.parent / f".{target.name}.{uuid.uuid4().hex}"
+    with Image.open(source_path) as src:
+        img = src.convert("RGB")
+    width, height = img.size
+
+    try:
+        for level in range(max_level(width, height), -1, -1):
+            size = level_size(width, height, level)
+            if img.size != size:
+                img = img.resize(size, Image.LANCZOS)
+            _write_level(img, building / str(level))
+
+        try:
+            building.rename(target)
+        except OSError:
+            # 另一个 worker 已生成同一版本
+            pass
+    finally:
+        if building.exists():
+            shutil.rmtree(building, ignore_errors=True)
+
+    # 清理同一图片类型的旧版本
+    prefix = target.name.rsplit("_", 1)[0] + "_"
+    for sibling in target.parent.iterdir():
+        if sibling != target and sibling.name.startswith(prefix) and not sibling.name.startswith("."):
+            shutil.rmtree(sibling, ignore_errors=True)
+
+
+_build_locks: dict[Path, asyncio.Lock] = {}
+
+
+async def get_pyramid(note_id: int, image_type: str, version: str, source_path: Path) -> Path:
+    """
+    Return the pyramid directory for one variant revision
+    The pyramid is built on first use; concurrent requests share one build
+    """
+    target = pyramid_dir(note_id, image_type, version)
+    if not target.exists():
+        lock = _build_locks.setdefault(target, asyncio.Lock())
+        async with lock:
+            if not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                await asyncio.to_thread(build_pyramid, source_path, target)
+        _build_locks.pop(target, None)
+    return target
+
+
+def remove_pyramids(note_id: int):
+    """Drop every tile pyramid of a note"""
+    shutil.rmtree(settings.TILES_DIR / str(note_id), ignore_errors=True)
@@ -0,0 +1,68 @@
+"""
+Streaming ZIP Writer - Build a ZIP archive while it is being sent
+Source files are read in chunks straight into the archive; every chunk of
+archive output is yielded as soon as it is produced, so memory use does not
+depend on the number or size of the files and the first byte goes out at once.
+"""
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator
+
+CHUNK_SIZE = 64 * 1024
+
+# 已压缩格式再 deflate 只会浪费 CPU
+COMPRESSED_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".zip", ".pdf"}
+
+
+class _ChunkSink:
+    """Write-only, unseekable file object collecting archive output between yields"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compress_type_for(path: Path) -> int:
+    return zipfile.ZIP_STORED if path.suffix.lower() in COMPRESSED_SUFFIXES else zipfile.ZIP_DEFLATED
+
+
+def stream_zip(files: Iterable[tuple[str, Path | bytes]]) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of (arcname, path) pairs chunk by chunk (blocking reads)
+    A small generated member (e.g. a manifest) can be given as bytes instead of a path
+    The output is not seekable, so zipfile writes sizes and CRCs in data descriptors
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w") as archive:
+        for arcname, path in files:
+            if isinstance(path, bytes):
+                info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+                archive.writestr(info, path, compress_type=zipfile.ZIP_DEFLATED)
+                if data := sink.drain():
+                    yield data
+                continue
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = compress_type_for(path)
+            with open(path, "rb") as src, archive.open(info, "w") as dest:
+                while chunk := src.read(CHUNK_SIZE):
+                    dest.write(chunk)
+                    if data := sink.drain():
+                        yield data
+            # 条目结束时写出的数据描述符
+            if data := sink.drain():
+                yield data
+    # 中央目录在 close 时写出
+    if data := sink.drain():
+        yield data
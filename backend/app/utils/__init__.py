@@ -1,3 +1,16 @@
 """
 Utility Functions
 """
+from app.utils.paths import (
+    ALLOWED_EXTENSIONS, IMAGE_TYPES, get_annotated_path, variant_version,
+    annotated_is_stale, stored_version, resolve_note_image,
+)
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.annotations import parse_annotation_content
+
+__all__ = [
+    "ALLOWED_EXTENSIONS", "IMAGE_TYPES", "get_annotated_path", "variant_version",
+    "annotated_is_stale", "stored_version", "resolve_note_image",
+    "encode_cursor", "decode_cursor",
+    "parse_annotation_content",
+]
@@ -0,0 +1,17 @@
+"""
+Annotation content helpers
+"""
+import json
+
+
+def parse_annotation_content(content: str):
+    """Parse annotation content to determine type"""
+    try:
+        parsed = json.loads(content)
+        if isinstance(parsed, list):
+            return {'type': 'draw', 'data': parsed}
+        elif 'x2' in parsed and 'y2' in parsed:
+            return {'type': parsed.get('type', 'line'), 'data': parsed}
+    except (json.JSONDecodeError, TypeError):
+        return {'type': 'text', 'data': content}
+    return {'type': 'text', 'data': content}
@@ -0,0 +1,35 @@
+"""
+Keyset pagination cursors
+A cursor is the (sort value, id) of the last row of a page, tagged with the
+sort key it belongs to, encoded as URL-safe base64 JSON
+"""
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, row_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, value_type: type) -> tuple:
+    """
+    Decode a cursor into (value, id)
+    Raises ValueError if it is malformed or was issued for another sort key
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_sort != sort or not isinstance(row_id, int) or isinstance(row_id, bool):
+            raise ValueError("Cursor does not match the requested sort")
+        if value_type is datetime:
+            # fromisoformat() raises TypeError for anything but a string
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, value_type):
+            raise ValueError("Malformed cursor")
+    except (ValueError, TypeError) as e:
+        raise ValueError("Malformed cursor") from e
+    return value, row_id
@@ -0,0 +1,60 @@
+"""
+Note image path helpers
+"""
+from pathlib import Path
+from app.config import settings
+
+IMAGE_TYPES = ("original", "processed", "annotated")
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"}
+
+
+def get_annotated_path(processed_path: str) -> Path:
+    """Absolute path of the annotated render stored next to a processed image"""
+    processed = Path(processed_path)
+    return settings.BASE_DIR / processed.parent / f"{processed.stem}_annotated{processed.suffix}"
+
+
+def variant_version(note, image_type: str) -> str:
+    """
+    Revision of an image variant, used in image URLs, ETags and derived file names
+    - original/processed change with image_version (reprocess, rotate, crop)
+    - annotated additionally changes with annotation_version
+    """
+    if image_type == "annotated":
+        return f"{note.image_version}.{note.annotation_version}"
+    return str(note.image_version)
+
+
+def annotated_is_stale(note) -> bool:
+    """Whether the stored annotated render lags behind the note (it needs a render)"""
+    return note.annotation_version > 0 and note.annotated_version != variant_version(note, "annotated")
+
+
+def stored_version(note, image_type: str) -> str:
+    """
+    Revision of the file currently stored for a variant, used for derived files
+    (tile pyramids, encoded variants) and export fingerprints
+    Same as variant_version() except while the annotated render is stale
+    """
+    if image_type == "annotated" and note.annotated_version:
+        return note.annotated_version
+    return variant_version(note, image_type)
+
+
+def resolve_note_image(note, image_type: str) -> tuple[str, Path] | None:
+    """
+    Resolve a note image variant to (effective_type, absolute_path)
+    - 'annotated' falls back to the processed image when no render exists,
+      in which case the effective type is 'processed'
+    - Returns None for an unknown image type
+    """
+    if image_type == "original":
+        return "original", settings.BASE_DIR / note.original_path
+    if image_type == "processed":
+        return "processed", settings.BASE_DIR / note.processed_path
+    if image_type == "annotated":
+        annotated_path = get_annotated_path(note.processed_path)
+        if annotated_path.exists():
+            return "annotated", annotated_path
+        return "processed", settings.BASE_DIR / note.processed_path
+    return None
@@ -0,0 +1,6 @@
+-- Migration: Track which version the stored annotated render was made from
+-- Version: v2.2
+
+ALTER TABLE notes ADD COLUMN annotated_version VARCHAR(32);
+-- 现有的带标记图片是同步渲染的，视为最新
+UPDATE notes SET annotated_version = image_version || '.' || annotation_version WHERE annotation_version > 0;
@@ -0,0 +1,4 @@
+-- Migration: Folder tree revision counter for the cached folder tree
+-- Version: v2.1
+
+ALTER TABLE users ADD COLUMN folder_tree_version INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,5 @@
+-- Migration: Add image revision counters for versioned image URLs / ETags
+-- Version: v2.0
+
+ALTER TABLE notes ADD COLUMN image_version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE notes ADD COLUMN annotation_version INTEGER NOT NULL DEFAULT 0;
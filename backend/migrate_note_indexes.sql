@@ -0,0 +1,6 @@
+-- Migration: Composite indexes for keyset-paginated note listing
+-- Version: v2.0
+
+CREATE INDEX IF NOT EXISTS ix_notes_user_updated ON notes (user_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS ix_notes_user_created ON notes (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_notes_user_title ON notes (user_id, title, id);
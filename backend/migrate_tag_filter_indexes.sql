@@ -0,0 +1,5 @@
+-- Migration: Covering indexes for tag and folder filters of the note list
+-- Version: v2.1
+
+CREATE INDEX IF NOT EXISTS ix_note_tags_tag_note ON note_tags (tag_id, note_id);
+CREATE INDEX IF NOT EXISTS ix_notes_user_folder_updated ON notes (user_id, folder_id, updated_at);
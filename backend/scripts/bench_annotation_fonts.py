@@ -0,0 +1,123 @@
+"""
+Benchmark - Annotation rendering with and without the font cache
+
+Times a full render (cold render-state cache) of a synthetic 3000x4000
+processed page:
+- uncached: every text annotation loads its font with ImageFont.truetype(),
+  as before app/services/fonts.py
+- cached: fonts.get_font(), one FreeTypeFont per (path, size) per worker
+Runs alternate between the two so machine noise affects both alike. Also
+reports the one-off font discovery time and a single font load, and checks
+that both renders are pixel-identical.
+
+Usage (from backend/):
+    python scripts/bench_annotation_fonts.py [--font PATH] [--runs 9]
+Without --font the font is discovered as in production (ANNOTATION_FONT_PATH,
+then the system CJK fonts).
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageFont  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.services import annotation_render, fonts  # noqa: E402
+
+SHAPES = ("line", "arrow", "wave", "draw", "text")
+
+
+def make_page(path: Path, width: int = 3000, height: int = 4000):
+    rng = np.random.default_rng(1)
+    page = np.where(rng.random((height, width)) > 0.97, 0, 255).astype(np.uint8)
+    Image.fromarray(page).convert("RGB").save(path, quality=90)
+
+
+def annotation(index: int, kind: str, rng: random.Random) -> SimpleNamespace:
+    x, y = rng.uniform(5, 90), rng.uniform(5, 90)
+    if kind == "text":
+        content = f"批注 {index} note"
+    elif kind == "draw":
+        content = json.dumps([{"x": x + step * 0.3, "y": y + rng.uniform(-1, 1)} for step in range(30)])
+    else:
+        content = json.dumps({"type": kind, "x2": min(99, x + rng.uniform(1, 8)), "y2": min(99, y + rng.uniform(-3, 3))})
+    return SimpleNamespace(
+        id=index + 1, content=content, x=x, y=y,
+        font_size=rng.choice([0.5, 1.0, 2.0]), color=rng.choice(["#ff0000", "#1890ff", "#00aa00"]),
+    )
+
+
+def workloads() -> dict[str, list]:
+    rng = random.Random(3)
+    mixed = [annotation(i, SHAPES[i % len(SHAPES)], rng) for i in range(150)]
+    texts = [annotation(i, "text", rng) for i in range(100)]
+    return {"150 mixed (30 text)": mixed, "100 text": texts}
+
+
+def uncached_font(size: int) -> ImageFont.FreeTypeFont:
+    path = fonts.font_path()
+    return ImageFont.load_default(size) if path is None else ImageFont.truetype(path, size)
+
+
+def render_once(page: Path, annotations: list) -> tuple[float, Image.Image]:
+    annotation_render.render_states.pop(1)
+    start = time.perf_counter()
+    image = annotation_render.render_annotations(1, 1, page, annotations)
+    return time.perf_counter() - start, image
+
+
+def compare(page: Path, annotations: list, runs: int) -> tuple[float, float, bool]:
+    """Median (uncached, cached) render times; runs alternate so machine noise hits both alike"""
+    cached_get_font = fonts.get_font
+    render_once(page, annotations)  # 预热字体缓存
+    before, after = [], []
+    for _ in range(runs):
+        fonts.get_font = uncached_font
+        elapsed, expected = render_once(page, annotations)
+        before.append(elapsed)
+        fonts.get_font = cached_get_font
+        elapsed, image = render_once(page, annotations)
+        after.append(elapsed)
+    identical = np.array_equal(np.asarray(expected), np.asarray(image))
+    return statistics.median(before), statistics.median(after), identical
+
+
+def font_load_ms(loader, runs: int = 50) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        loader(60)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--font", help="font file (default: discover like the application)")
+    parser.add_argument("--runs", type=int, default=9)
+    args = parser.parse_args()
+
+    if args.font:
+        settings.ANNOTATION_FONT_PATH = args.font
+    start = time.perf_counter()
+    path = fonts.font_path()
+    print(f"font: {path or 'Pillow default'} (discovery {(time.perf_counter() - start) * 1000:.1f} ms, once per worker)")
+    print(f"font load: truetype() {font_load_ms(uncached_font):.2f} ms, cached {font_load_ms(fonts.get_font):.4f} ms")
+
+    with tempfile.TemporaryDirectory(prefix="bench_fonts_") as tmp:
+        page = Path(tmp) / "page.jpg"
+        make_page(page)
+        for label, annotations in workloads().items():
+            before, after, identical = compare(page, annotations, args.runs)
+            print(f"{label:>20}: uncached {before:.3f} s, cached {after:.3f} s, "
+                  f"saved {(before - after) * 1000:.0f} ms, identical: {identical}")
+
+
+if __name__ == "__main__":
+    main()
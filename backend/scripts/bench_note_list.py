@@ -0,0 +1,125 @@
+"""
+Benchmark - Note list query: ORM entities vs column projection
+
+Compares the note list query before and after the column-projected rewrite
+(query + NoteListResponse serialization, the part of GET /notes/ that grows
+with the number of notes):
+- orm: select(Note) with selectinload(Note.tags), every entity validated
+  into NoteListResponse
+- projected: NOTE_LIST_COLUMNS with the tags aggregated as JSON in the same
+  statement, rows mapped by note_list_items()
+
+A temporary SQLite database is seeded with --notes notes of one user, each
+with --tags-per-note tags; the median of --runs runs is printed.
+
+Usage (from backend/):
+    python scripts/bench_note_list.py [--notes 10000] [--tags-per-note 3] [--runs 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 使用临时数据库，必须在导入 app 之前设置
+_tmp = tempfile.TemporaryDirectory(prefix="bench_note_list_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp.name}/bench.db"
+os.environ["DEBUG"] = "false"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import select, insert  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+from app.database import async_session, engine, init_db  # noqa: E402
+from app.models import user, folder, annotation  # noqa: E402,F401  (register tables)
+from app.models.note import Note, NoteTag  # noqa: E402
+from app.models.tag import Tag  # noqa: E402
+from app.routers.notes import NOTE_LIST_COLUMNS, note_list_items  # noqa: E402
+from app.schemas.note import NoteListResponse  # noqa: E402
+
+USER_ID = 1
+TAG_COUNT = 20
+
+
+async def seed(notes: int, tags_per_note: int):
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    async with async_session() as db:
+        await db.execute(insert(Tag), [
+            {"name": f"tag-{k}", "color": "#1890ff", "user_id": USER_ID} for k in range(TAG_COUNT)
+        ])
+        rows = []
+        for k in range(notes):
+            created = start + timedelta(minutes=rng.randint(0, 500_000))
+            rows.append({
+                "title": f"笔记 {k}",
+                "original_path": f"uploads/original/{k}.jpg",
+                "processed_path": f"uploads/processed/{k}_processed.jpg",
+                "user_id": USER_ID,
+                "processing_params": {"block_size": 11, "c": 2},
+                "created_at": created,
+                "updated_at": created + timedelta(minutes=rng.randint(0, 1000)),
+            })
+        note_ids = list(await db.scalars(insert(Note).returning(Note.id), rows))
+        await db.execute(insert(NoteTag), [
+            {"note_id": note_id, "tag_id": tag_id}
+            for note_id in note_ids
+            for tag_id in rng.sample(range(1, TAG_COUNT + 1), tags_per_note)
+        ])
+        await db.commit()
+
+
+async def orm_list() -> list[dict]:
+    async with async_session() as db:
+        result = await db.execute(
+            select(Note).where(Note.user_id == USER_ID)
+            .options(selectinload(Note.tags))
+            .order_by(Note.updated_at.desc())
+        )
+        return [NoteListResponse.model_validate(note).model_dump() for note in result.scalars().unique()]
+
+
+async def projected_list() -> list[dict]:
+    async with async_session() as db:
+        result = await db.execute(
+            select(*NOTE_LIST_COLUMNS).where(Note.user_id == USER_ID).order_by(Note.updated_at.desc())
+        )
+        return [NoteListResponse.model_validate(item).model_dump() for item in note_list_items(result)]
+
+
+async def measure(fn, runs: int) -> float:
+    await fn()  # 预热
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--tags-per-note", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    await init_db()
+    await seed(args.notes, args.tags_per_note)
+
+    orm, projected = await orm_list(), await projected_list()
+    assert [item["id"] for item in orm] == [item["id"] for item in projected]
+
+    print(f"{args.notes} notes, {args.tags_per_note} tags each, median of {args.runs} runs")
+    for label, fn in (("orm", orm_list), ("projected", projected_list)):
+        seconds = await measure(fn, args.runs)
+        print(f"{label:>10}: {seconds * 1000:7.0f} ms  {seconds / args.notes * 1e6:5.1f} us/row")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
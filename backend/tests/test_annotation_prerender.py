@@ -0,0 +1,94 @@
+"""
+Annotated image pre-render: debounced after committed writes, through ensure_rendered()
+"""
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.config import settings
+from app.database import Base
+from app.models import user, tag, folder, annotation  # noqa: F401  (register tables)
+from app.models.note import Note
+from app.services import annotation_render
+from app.services.search import init_search_index
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    calls = []
+
+    async def fake_ensure_rendered(note_id):
+        calls.append(note_id)
+
+    monkeypatch.setattr(annotation_render, "ensure_rendered", fake_ensure_rendered)
+    monkeypatch.setattr(settings, "ANNOTATION_PRERENDER_DEBOUNCE_MS", 50)
+    monkeypatch.setattr(settings, "ANNOTATION_PRERENDER_MAX_DELAY_MS", 200)
+    return calls
+
+
+def test_burst_of_requests_renders_once(rendered):
+    async def run():
+        scheduler = annotation_render.PrerenderScheduler()
+        for _ in range(5):
+            scheduler.request(1)
+            await asyncio.sleep(0.01)
+        scheduler.request(2)
+        assert rendered == []
+        await asyncio.sleep(0.1)
+        await scheduler.shutdown()
+
+    asyncio.run(run())
+    assert sorted(rendered) == [1, 2]
+
+
+def test_continuous_edits_render_within_max_delay(rendered):
+    async def run():
+        scheduler = annotation_render.PrerenderScheduler()
+        for _ in range(15):
+            scheduler.request(1)
+            await asyncio.sleep(0.03)
+        await scheduler.shutdown()
+
+    asyncio.run(run())
+    # 持续修改 450 ms，最迟 200 ms 渲染一次
+    assert rendered.count(1) >= 2
+
+
+def test_shutdown_drops_debounced_renders(rendered):
+    async def run():
+        scheduler = annotation_render.PrerenderScheduler()
+        scheduler.request(1)
+        await scheduler.shutdown()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert rendered == []
+
+
+def test_only_committed_annotation_writes_are_scheduled(tmp_path, monkeypatch, rendered):
+    requested = []
+    monkeypatch.setattr(annotation_render.prerender_scheduler, "request", requested.append)
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await init_search_index(conn)
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            kept, dropped, untouched = (Note(title=t, original_path=f"{t}.jpg", user_id=1) for t in "abc")
+            db.add_all([kept, dropped, untouched])
+            await db.commit()
+            assert requested == []  # 新建笔记没有标记
+
+            dropped.bump_annotation_version()
+            await db.flush()
+            await db.rollback()
+
+            kept.bump_annotation_version()
+            untouched.title = "renamed"
+            await db.commit()
+            ids = kept.id
+        await engine.dispose()
+        return ids
+
+    kept_id = asyncio.run(run())
+    assert requested == [kept_id]
@@ -0,0 +1,156 @@
+"""
+Incremental annotation rendering: dirty rectangles and re-compositing only what changed
+"""
+import json
+import random
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from PIL import Image
+from app.config import settings
+from app.services import annotation_render
+from app.services.annotation_render import _merge_rects, render_annotations
+
+# 增量渲染与整张重绘允许的差异：宽线条穿过重绘矩形边缘时，个别边缘像素可能不同
+MAX_DIFFERING_PIXELS = 0.001
+
+
+def annotation(id, content, x, y, font_size=1.5, color="#ff0000"):
+    return SimpleNamespace(id=id, content=content, x=x, y=y, font_size=font_size, color=color)
+
+
+def line(kind, x2, y2):
+    return json.dumps({"type": kind, "x2": x2, "y2": y2})
+
+
+BEFORE = [
+    annotation(1, line("arrow", 40, 30), 10, 10),
+    annotation(2, "note", 60, 60),
+    annotation(3, line("wave", 90, 80), 50, 80, 3),
+    annotation(4, json.dumps([{"x": 20 + k, "y": 70 + k % 3} for k in range(10)]), 20, 70, 2, "#00aa00"),
+    # 不变的宽线条，穿过移动的标记
+    annotation(6, line("line", 90, 90), 0, 0, 6, "#0000ff"),
+]
+AFTER = [
+    annotation(1, line("arrow", 55, 45), 25, 25),           # 移动
+    annotation(2, "edited", 60, 60, 1.5, "#1890ff"),        # 修改
+    BEFORE[3],                                              # 3 删除
+    annotation(5, line("line", 95, 5), 70, 20, 4),          # 新增
+    BEFORE[4],
+]
+
+
+@pytest.fixture
+def page(tmp_path):
+    rng = np.random.default_rng(0)
+    path = tmp_path / "page.png"
+    Image.fromarray(np.where(rng.random((300, 400)) > 0.9, 0, 255).astype(np.uint8)).save(path)
+    return path
+
+
+@pytest.fixture
+def composited(monkeypatch):
+    """Rectangles re-composited by each render"""
+    rects = []
+    composite = annotation_render._composite
+
+    def recording(state, rect, layouts):
+        rects.append(rect)
+        composite(state, rect, layouts)
+
+    monkeypatch.setattr(annotation_render, "_composite", recording)
+    return rects
+
+
+def full_render(note_id, page, annotations) -> np.ndarray:
+    annotation_render.render_states.pop(note_id)
+    return np.asarray(render_annotations(note_id, 1, page, annotations))
+
+
+def differing_pixels(a: np.ndarray, b: np.ndarray) -> float:
+    return np.any(a != b, axis=2).mean()
+
+
+def test_incremental_render_matches_full_redraw(page, composited, monkeypatch):
+    monkeypatch.setattr(settings, "ANNOTATION_FULL_REDRAW_RATIO", 1.0)
+    full_render(101, page, BEFORE)
+    composited.clear()
+
+    incremental = np.asarray(render_annotations(101, 1, page, AFTER))
+
+    assert composited and (0, 0, 400, 300) not in composited
+    assert differing_pixels(incremental, full_render(101, page, AFTER)) <= MAX_DIFFERING_PIXELS
+
+
+def test_removing_every_change_restores_the_first_render(page, monkeypatch):
+    monkeypatch.setattr(settings, "ANNOTATION_FULL_REDRAW_RATIO", 1.0)
+    first = full_render(102, page, BEFORE)
+    render_annotations(102, 1, page, AFTER)
+
+    back = np.asarray(render_annotations(102, 1, page, BEFORE))
+
+    assert differing_pixels(back, first) <= MAX_DIFFERING_PIXELS
+
+
+def test_unchanged_annotations_composite_nothing(page, composited):
+    full_render(103, page, BEFORE)
+    composited.clear()
+    render_annotations(103, 1, page, list(reversed(BEFORE)))
+    assert composited == []
+
+
+def test_new_image_version_or_large_change_redraws_everything(page, composited, monkeypatch):
+    full_render(104, page, BEFORE)
+    composited.clear()
+    render_annotations(104, 2, page, BEFORE)
+    assert composited == [(0, 0, 400, 300)]
+
+    monkeypatch.setattr(settings, "ANNOTATION_FULL_REDRAW_RATIO", 0.0)
+    composited.clear()
+    render_annotations(104, 2, page, AFTER)
+    assert composited == [(0, 0, 400, 300)]
+
+
+# ---------- _merge_rects ----------
+
+def test_rects_are_clipped_and_empty_ones_dropped():
+    assert _merge_rects([(-5, -5, 10, 10), (390, 290, 410, 310), (500, 0, 600, 10), (5, 5, 5, 20)], 400, 300) == [
+        (0, 0, 10, 10),
+        (390, 290, 400, 300),
+    ]
+
+
+def test_disjoint_and_touching_rects_stay_separate():
+    rects = [(0, 0, 10, 10), (10, 0, 20, 10), (50, 50, 60, 60)]
+    assert _merge_rects(rects, 100, 100) == rects
+
+
+def test_overlapping_rects_merge_into_their_bounding_box():
+    assert _merge_rects([(0, 0, 10, 10), (5, 5, 20, 15)], 100, 100) == [(0, 0, 20, 15)]
+
+
+def test_merged_rect_absorbs_rects_it_grows_into():
+    # 第三个矩形连接前两个；合并后的矩形又覆盖了第四个
+    rects = [(0, 0, 10, 10), (30, 0, 40, 10), (5, 5, 35, 8), (15, 2, 25, 4)]
+    assert _merge_rects(rects, 100, 100) == [(0, 0, 40, 10)]
+
+
+def test_merged_rects_are_disjoint_and_cover_the_input():
+    rng = random.Random(0)
+    for _ in range(200):
+        rects = []
+        for _ in range(rng.randint(1, 12)):
+            x, y = rng.randint(-20, 110), rng.randint(-20, 110)
+            rects.append((x, y, x + rng.randint(0, 30), y + rng.randint(0, 30)))
+        merged = _merge_rects(rects, 100, 100)
+
+        for i, a in enumerate(merged):
+            assert 0 <= a[0] < a[2] <= 100 and 0 <= a[1] < a[3] <= 100
+            assert not any(annotation_render._intersects(a, b) for b in merged[i + 1:])
+        for rect in rects:
+            clipped = (max(0, rect[0]), max(0, rect[1]), min(100, rect[2]), min(100, rect[3]))
+            if clipped[0] < clipped[2] and clipped[1] < clipped[3]:
+                assert any(
+                    m[0] <= clipped[0] and m[1] <= clipped[1] and clipped[2] <= m[2] and clipped[3] <= m[3]
+                    for m in merged
+                )
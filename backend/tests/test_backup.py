@@ -0,0 +1,231 @@
+"""
+Library backup: full and incremental backups, restore
+"""
+import asyncio
+import io
+import json
+import zipfile
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.config import settings
+from app.database import Base
+from app.models import user  # noqa: F401  (register tables)
+from app.models.annotation import Annotation
+from app.models.folder import Folder
+from app.models.note import Note
+from app.models.tag import Tag
+from app.services import backup, folder_tree
+from app.services.search import init_search_index
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    for name, path in (
+        ("BASE_DIR", tmp_path),
+        ("UPLOAD_DIR", tmp_path / "uploads"),
+        ("ORIGINAL_DIR", tmp_path / "uploads" / "original"),
+        ("PROCESSED_DIR", tmp_path / "uploads" / "processed"),
+        ("IMPORTS_DIR", tmp_path / "imports"),
+    ):
+        path.mkdir(parents=True, exist_ok=True)
+        monkeypatch.setattr(settings, name, path)
+    return tmp_path
+
+
+def run(test, tmp_path):
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await init_search_index(conn)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                return await test(db)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+def write_image(directory, name: str, data: bytes) -> str:
+    path = directory / name
+    path.write_bytes(data)
+    return str(path.relative_to(settings.BASE_DIR))
+
+
+async def add_folder(db, name: str, user_id: int, parent_id: int | None = None) -> Folder:
+    folder = Folder(name=name, parent_id=parent_id, user_id=user_id)
+    db.add(folder)
+    await db.flush()
+    await folder_tree.add_folder(db, folder.id, parent_id)
+    return folder
+
+
+async def seed(db):
+    """User 1: 数学/第一章, tag 重要, two notes (one tagged and annotated)"""
+    math = await add_folder(db, "数学", 1)
+    chapter = await add_folder(db, "第一章", 1, math.id)
+    important = Tag(name="重要", color="#ff0000", user_id=1)
+    tagged = Note(
+        title="页", user_id=1, folder_id=chapter.id, processing_params={"block_size": 11},
+        original_path=write_image(settings.ORIGINAL_DIR, "a.jpg", b"original a"),
+        processed_path=write_image(settings.PROCESSED_DIR, "a_processed.jpg", b"processed a"),
+        tags=[important],
+    )
+    plain = Note(
+        title="二", user_id=1, folder_id=math.id,
+        original_path=write_image(settings.ORIGINAL_DIR, "b.png", b"original b"),
+    )
+    db.add_all([important, tagged, plain])
+    await db.flush()
+    db.add(Annotation(note_id=tagged.id, content="批注", x=10, y=20, font_size=1.5, color="#1890ff"))
+    await db.commit()
+
+
+async def make_backup(db, user_id: int, base_archive: bytes | None = None) -> bytes:
+    base = backup.read_base_manifest(io.BytesIO(base_archive)) if base_archive else None
+    manifest = await backup.load_library(db, user_id, base)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in backup.collect_blobs(manifest, base):
+            if isinstance(content, bytes):
+                archive.writestr(name, content)
+            else:
+                archive.write(content, name)
+    return buffer.getvalue()
+
+
+def blob_names(archive: bytes) -> list[str]:
+    return [name for name in zipfile.ZipFile(io.BytesIO(archive)).namelist() if name != backup.MANIFEST_NAME]
+
+
+def rewrite(archive: bytes, change) -> bytes:
+    """Copy of an archive with change(name, data) applied to every member"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(archive)) as source, zipfile.ZipFile(buffer, "w") as target:
+        for name in source.namelist():
+            target.writestr(name, change(name, source.read(name)))
+    return buffer.getvalue()
+
+
+def staging_dirs() -> list:
+    return list(settings.IMPORTS_DIR.glob(".restore-*"))
+
+
+def test_full_incremental_restore_round_trip(tmp_path):
+    async def test(db):
+        await seed(db)
+        full = await make_backup(db, 1)
+        unchanged = await make_backup(db, 1, full)
+        db.add(Note(
+            title="三", user_id=1,
+            original_path=write_image(settings.ORIGINAL_DIR, "c.jpg", b"original c"),
+        ))
+        await db.commit()
+        incremental = await make_backup(db, 1, full)
+
+        # 只恢复增量备份：缺少完整备份中的图片
+        with pytest.raises(ValueError, match="missing"):
+            await backup.restore_library(db, 2, [io.BytesIO(incremental)])
+        counts = await backup.restore_library(db, 2, [io.BytesIO(incremental), io.BytesIO(full)])
+
+        folders = {f.id: f for f in await db.scalars(select(Folder).where(Folder.user_id == 2))}
+        notes = (await db.scalars(select(Note).where(Note.user_id == 2).order_by(Note.title))).all()
+        for note in notes:
+            await db.refresh(note, ["tags", "annotations"])
+        return full, unchanged, incremental, counts, folders, notes
+
+    full, unchanged, incremental, counts, folders, notes = run(test, tmp_path)
+
+    assert len(blob_names(full)) == 3
+    assert blob_names(unchanged) == []
+    assert len(blob_names(incremental)) == 1
+    assert counts == {"folders": 2, "tags": 1, "notes": 3, "annotations": 1, "files": 4}
+
+    paths = {
+        f.name: (folders[f.parent_id].name if f.parent_id else None) for f in folders.values()
+    }
+    assert paths == {"数学": None, "第一章": "数学"}
+    by_title = {note.title: note for note in notes}
+    assert set(by_title) == {"页", "二", "三"}
+    tagged = by_title["页"]
+    assert folders[tagged.folder_id].name == "第一章"
+    assert tagged.processing_params == {"block_size": 11}
+    assert [tag.name for tag in tagged.tags] == ["重要"]
+    assert [(a.content, a.x, a.y) for a in tagged.annotations] == [("批注", 10, 20)]
+    assert (settings.BASE_DIR / tagged.original_path).read_bytes() == b"original a"
+    assert (settings.BASE_DIR / tagged.processed_path).read_bytes() == b"processed a"
+    assert (settings.BASE_DIR / by_title["三"].original_path).read_bytes() == b"original c"
+    assert by_title["三"].folder_id is None
+    assert staging_dirs() == []
+
+
+def test_tags_are_matched_by_name_and_folders_created_anew(tmp_path):
+    async def test(db):
+        await seed(db)
+        archive = await make_backup(db, 1)
+        existing_tag = Tag(name="重要", color="#00ff00", user_id=2)
+        other_users_tag = Tag(name="重要", color="#0000ff", user_id=3)
+        existing_folder = await add_folder(db, "数学", 2)
+        db.add_all([existing_tag, other_users_tag])
+        await db.commit()
+
+        counts = await backup.restore_library(db, 2, [io.BytesIO(archive)])
+
+        tags = (await db.scalars(select(Tag).where(Tag.user_id == 2))).all()
+        folders = (await db.scalars(select(Folder).where(Folder.user_id == 2))).all()
+        tagged = await db.scalar(select(Note).where(Note.user_id == 2, Note.title == "页"))
+        await db.refresh(tagged, ["tags"])
+        return counts, existing_tag.id, existing_folder.id, tags, folders, tagged
+
+    counts, existing_tag_id, existing_folder_id, tags, folders, tagged = run(test, tmp_path)
+
+    assert counts["tags"] == 0
+    assert [(tag.id, tag.color) for tag in tags] == [(existing_tag_id, "#00ff00")]
+    assert [tag.id for tag in tagged.tags] == [existing_tag_id]
+    assert counts["folders"] == 2
+    assert sorted(folder.name for folder in folders) == ["数学", "数学", "第一章"]
+    assert tagged.folder_id not in (None, existing_folder_id)
+
+
+def test_blob_hash_mismatch_is_rejected(tmp_path):
+    async def test(db):
+        await seed(db)
+        archive = rewrite(
+            await make_backup(db, 1),
+            lambda name, data: data if name == backup.MANIFEST_NAME else data + b"!",
+        )
+        with pytest.raises(ValueError, match="Corrupted"):
+            await backup.restore_library(db, 2, [io.BytesIO(archive)])
+        return (await db.scalars(select(Note.id).where(Note.user_id == 2))).all()
+
+    assert run(test, tmp_path) == []
+    assert staging_dirs() == []
+
+
+@pytest.mark.parametrize("change", [
+    lambda manifest: manifest["notes"][0].pop("files"),
+    lambda manifest: manifest["notes"][0]["files"]["original"].update(sha256="../../etc"),
+    lambda manifest: manifest["notes"][0]["files"]["original"].update(suffix="/x"),
+    lambda manifest: manifest["notes"][0]["annotations"].append({"x": 1}),
+    lambda manifest: manifest["folders"].append({"id": "a", "name": "x"}),
+    lambda manifest: manifest.update(created_at="yesterday"),
+    lambda manifest: manifest.update(tags=None),
+])
+def test_malformed_manifest_is_rejected_before_restoring(tmp_path, change):
+    def edit(name, data):
+        if name != backup.MANIFEST_NAME:
+            return data
+        manifest = json.loads(data)
+        change(manifest)
+        return json.dumps(manifest).encode()
+
+    async def test(db):
+        await seed(db)
+        archive = rewrite(await make_backup(db, 1), edit)
+        with pytest.raises(ValueError, match="Invalid backup manifest"):
+            await backup.restore_library(db, 2, [io.BytesIO(archive)])
+        return (await db.scalars(select(Folder.id).where(Folder.user_id == 2))).all()
+
+    assert run(test, tmp_path) == []
@@ -0,0 +1,144 @@
+"""
+Bulk note actions: per-id results, idempotent tagging, delete clean-up
+"""
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.database import Base
+from app.models import user  # noqa: F401  (register tables)
+from app.models.annotation import Annotation
+from app.models.folder import Folder
+from app.models.note import Note, NoteTag
+from app.models.tag import Tag
+from app.routers.notes import bulk_update_notes
+from app.schemas.note import NoteBulkRequest
+from app.services import file_sweeper
+from app.services.search import init_search_index
+
+ALICE = SimpleNamespace(id=1)
+
+
+@pytest.fixture(autouse=True)
+def empty_deletion_queue():
+    file_sweeper._queue.clear()
+    yield
+    file_sweeper._queue.clear()
+
+
+def run(test, tmp_path):
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await init_search_index(conn)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                return await test(db, await seed(db))
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def seed(db) -> SimpleNamespace:
+    """Two notes of user 1 (the first tagged and annotated), one of user 2"""
+    folder = Folder(name="数学", user_id=1)
+    important = Tag(name="重要", user_id=1)
+    review = Tag(name="复习", user_id=1)
+    others_tag = Tag(name="别人的", user_id=2)
+    first = Note(title="第一页", original_path="uploads/original/1.jpg",
+                 processed_path="uploads/processed/1_processed.jpg", user_id=1, tags=[important])
+    second = Note(title="第二页", original_path="uploads/original/2.jpg", user_id=1)
+    others = Note(title="别人的笔记", original_path="uploads/original/3.jpg", user_id=2)
+    db.add_all([folder, important, review, others_tag, first, second, others])
+    await db.flush()
+    db.add(Annotation(note_id=first.id, content="批注", x=1, y=1))
+    await db.commit()
+    return SimpleNamespace(
+        folder=folder.id, important=important.id, review=review.id, others_tag=others_tag.id,
+        first=first.id, second=second.id, others=others.id,
+    )
+
+
+async def bulk(db, **request):
+    return await bulk_update_notes(NoteBulkRequest(**request), db=db, current_user=ALICE)
+
+
+async def note_tags(db) -> list[tuple[int, int]]:
+    result = await db.execute(select(NoteTag.c.note_id, NoteTag.c.tag_id).order_by(NoteTag.c.note_id, NoteTag.c.tag_id))
+    return [tuple(row) for row in result]
+
+
+def test_other_users_and_missing_notes_fail_per_id(tmp_path):
+    async def test(db, ids):
+        response = await bulk(
+            db, action="move", folder_id=ids.folder, note_ids=[ids.first, ids.others, 999, ids.first, ids.second],
+        )
+        folders = dict((await db.execute(select(Note.id, Note.folder_id))).all())
+        return ids, response, folders
+
+    ids, response, folders = run(test, tmp_path)
+
+    assert response.succeeded == 2
+    assert [(r.id, r.ok, r.detail) for r in response.results] == [
+        (ids.first, True, None),
+        (ids.others, False, "Note not found"),
+        (999, False, "Note not found"),
+        (ids.second, True, None),
+    ]
+    assert folders == {ids.first: ids.folder, ids.second: ids.folder, ids.others: None}
+
+
+def test_tag_skips_existing_links(tmp_path):
+    async def test(db, ids):
+        request = dict(action="tag", tag_ids=[ids.important, ids.review], note_ids=[ids.first, ids.second, ids.others])
+        first = await bulk(db, **request)
+        again = await bulk(db, **request)
+        return ids, first, again, await note_tags(db)
+
+    ids, first, again, links = run(test, tmp_path)
+
+    assert first.succeeded == again.succeeded == 2
+    assert links == sorted([
+        (ids.first, ids.important), (ids.first, ids.review),
+        (ids.second, ids.important), (ids.second, ids.review),
+    ])
+
+
+def test_untag_and_tags_of_other_users(tmp_path):
+    async def test(db, ids):
+        with pytest.raises(HTTPException) as error:
+            await bulk(db, action="tag", tag_ids=[ids.others_tag], note_ids=[ids.first])
+        await db.rollback()
+        await bulk(db, action="untag", tag_ids=[ids.important], note_ids=[ids.first, ids.second])
+        return error.value.status_code, await note_tags(db)
+
+    status, links = run(test, tmp_path)
+
+    assert status == 404
+    assert links == []
+
+
+def test_delete_queues_files_and_removes_search_rows(tmp_path):
+    async def test(db, ids):
+        indexed_before = (await db.scalars(text("SELECT rowid FROM note_search ORDER BY rowid"))).all()
+        response = await bulk(db, action="delete", note_ids=[ids.first, ids.second, ids.others])
+        notes = (await db.scalars(select(Note.id))).all()
+        annotations = (await db.scalars(select(Annotation.id))).all()
+        indexed = (await db.scalars(text("SELECT rowid FROM note_search"))).all()
+        return ids, indexed_before, response, notes, annotations, await note_tags(db), indexed
+
+    ids, indexed_before, response, notes, annotations, links, indexed = run(test, tmp_path)
+
+    assert response.succeeded == 2
+    assert indexed_before == sorted([ids.first, ids.second, ids.others])
+    assert notes == [ids.others]
+    assert annotations == [] and links == []
+    assert indexed == [ids.others]
+    assert sorted(file_sweeper._queue, key=lambda item: item.note_id) == [
+        file_sweeper.NoteFiles(ids.first, "uploads/original/1.jpg", "uploads/processed/1_processed.jpg"),
+        file_sweeper.NoteFiles(ids.second, "uploads/original/2.jpg", None),
+    ]
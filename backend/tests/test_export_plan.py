@@ -0,0 +1,68 @@
+"""
+Export planning: archive paths of a folder subtree from the closure table
+"""
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.database import Base
+from app.models import user, tag, annotation, note  # noqa: F401  (register tables)
+from app.models.folder import Folder
+from app.services import folder_tree
+from app.services.export_plan import get_subtree_paths, safe_name
+
+
+async def build_and_query(db_path, queries):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSession(engine) as db:
+        ids = {}
+
+        async def add(key, name, parent=None, user_id=1):
+            folder = Folder(name=name, parent_id=ids.get(parent), user_id=user_id)
+            db.add(folder)
+            await db.flush()
+            await folder_tree.add_folder(db, folder.id, ids.get(parent))
+            ids[key] = folder.id
+
+        await add("course", "课程")
+        await add("math", "数学", "course")
+        await add("ch1", "第一章", "math")
+        await add("slash", "a/b\\c", "math")
+        await add("dots", "..", "math")
+        await add("deep", "习题", "ch1")
+        await add("physics", "物理", "course")
+        await add("other", "别人的", user_id=2)
+        await db.commit()
+
+        results = [await get_subtree_paths(db, ids.get(key, 999), user_id) for key, user_id in queries]
+    await engine.dispose()
+    return ids, results
+
+
+def test_subtree_paths_start_at_the_root(tmp_path):
+    ids, (math, course, other, missing) = asyncio.run(build_and_query(
+        tmp_path / "test.db", [("math", 1), ("course", 1), ("other", 1), ("missing", 1)]
+    ))
+
+    assert math == {
+        ids["math"]: "课程/数学",
+        ids["ch1"]: "课程/数学/第一章",
+        ids["slash"]: "课程/数学/a_b_c",
+        ids["dots"]: "课程/数学/_",
+        ids["deep"]: "课程/数学/第一章/习题",
+    }
+    assert course[ids["course"]] == "课程"
+    assert course[ids["physics"]] == "课程/物理"
+    assert len(course) == 7
+    # 其他用户的文件夹、不存在的文件夹
+    assert other == {}
+    assert missing == {}
+
+
+def test_safe_name_is_one_path_component():
+    assert safe_name("a/b\\c") == "a_b_c"
+    assert safe_name("  第一章 ") == "第一章"
+    assert safe_name("v1.2") == "v1.2"
+    assert safe_name(".hidden") == ".hidden"
+    for name in ("", "  ", ".", "..", " .. ", "..."):
+        assert safe_name(name) == "_"
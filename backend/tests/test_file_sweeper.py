@@ -0,0 +1,173 @@
+"""
+File reclamation: deletion queue of deleted notes, orphan sweep of uploads/
+"""
+import asyncio
+import os
+import time
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from app.config import settings
+from app.database import Base
+from app.models import user, tag, folder, annotation  # noqa: F401  (register tables)
+from app.models.note import Note
+from app.services import file_sweeper
+from app.services.search import init_search_index
+
+NOW = time.time()
+OLD = NOW - settings.FILE_SWEEP_GRACE_MINUTES * 60 - 60
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    for name, path in (
+        ("BASE_DIR", tmp_path),
+        ("UPLOAD_DIR", tmp_path / "uploads"),
+        ("ORIGINAL_DIR", tmp_path / "uploads" / "original"),
+        ("PROCESSED_DIR", tmp_path / "uploads" / "processed"),
+        ("TILES_DIR", tmp_path / "uploads" / "tiles"),
+        ("VARIANTS_DIR", tmp_path / "uploads" / "variants"),
+    ):
+        path.mkdir(parents=True, exist_ok=True)
+        monkeypatch.setattr(settings, name, path)
+    file_sweeper._queue.clear()
+    yield tmp_path
+    file_sweeper._queue.clear()
+
+
+def run(test, tmp_path, monkeypatch):
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await init_search_index(conn)
+        monkeypatch.setattr(file_sweeper, "async_session", async_sessionmaker(engine, expire_on_commit=False))
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                return await test(db)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+def make_file(path, mtime=OLD):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"data")
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def make_note_dir(directory, note_id, mtime=OLD):
+    """A tile or variant directory with one file, both older than the grace period by default"""
+    make_file(directory / str(note_id) / "processed_1" / "0_0_0.jpg", mtime)
+    os.utime(directory / str(note_id), (mtime, mtime))
+    return directory / str(note_id)
+
+
+async def add_note(db, stem: str) -> tuple[Note, list]:
+    """A note with every kind of file it can own"""
+    note = Note(
+        title=stem, user_id=1,
+        original_path=f"uploads/original/{stem}.jpg",
+        processed_path=f"uploads/processed/{stem}_processed.jpg",
+    )
+    db.add(note)
+    await db.commit()
+    files = [
+        make_file(settings.BASE_DIR / note.original_path),
+        make_file(settings.BASE_DIR / note.processed_path),
+        make_file(settings.PROCESSED_DIR / f"{stem}_processed_annotated.jpg"),
+        make_note_dir(settings.TILES_DIR, note.id),
+        make_note_dir(settings.VARIANTS_DIR, note.id),
+    ]
+    return note, files
+
+
+def test_sweep_keeps_referenced_files_and_removes_orphans(tmp_path, monkeypatch):
+    async def test(db):
+        _, kept = await add_note(db, "kept")
+        orphans = [
+            make_file(settings.ORIGINAL_DIR / "orphan.jpg"),
+            make_file(settings.PROCESSED_DIR / "orphan_processed.jpg"),
+            make_file(settings.PROCESSED_DIR / "orphan_processed_annotated.jpg"),
+            make_note_dir(settings.TILES_DIR, 999),
+            make_note_dir(settings.VARIANTS_DIR, 999),
+        ]
+        # 以 . 开头的临时文件（渲染、上传中）不清理
+        temporary = make_file(settings.PROCESSED_DIR / ".render.jpg")
+        return kept, orphans, temporary, await file_sweeper.sweep_uploads(NOW)
+
+    kept, orphans, temporary, (removed, reclaimed) = run(test, tmp_path, monkeypatch)
+
+    assert all(path.exists() for path in kept)
+    assert not any(path.exists() for path in orphans)
+    assert temporary.exists()
+    assert (removed, reclaimed) == (5, 5 * len(b"data"))
+
+
+def test_files_within_the_grace_period_survive(tmp_path, monkeypatch):
+    young = NOW - settings.FILE_SWEEP_GRACE_MINUTES * 60 + 60
+
+    async def test(db):
+        recent = [
+            make_file(settings.ORIGINAL_DIR / "uploading.jpg", young),
+            make_file(settings.PROCESSED_DIR / "uploading_processed.jpg", young),
+            make_note_dir(settings.TILES_DIR, 998, young),
+        ]
+        old = make_file(settings.ORIGINAL_DIR / "abandoned.jpg")
+        return recent, old, await file_sweeper.sweep_uploads(NOW)
+
+    recent, old, (removed, _) = run(test, tmp_path, monkeypatch)
+
+    assert all(path.exists() for path in recent)
+    assert not old.exists()
+    assert removed == 1
+
+
+def test_deleted_note_files_are_queued_only_after_commit(tmp_path, monkeypatch):
+    async def test(db):
+        note, files = await add_note(db, "deleted")
+
+        await db.delete(note)
+        await db.flush()
+        await db.rollback()
+        after_rollback = list(file_sweeper._queue)
+
+        await db.delete(note)
+        await db.flush()
+        before_commit = list(file_sweeper._queue)
+        await db.commit()
+        after_commit = list(file_sweeper._queue)
+        return note.id, files, after_rollback, before_commit, after_commit
+
+    note_id, files, after_rollback, before_commit, after_commit = run(test, tmp_path, monkeypatch)
+
+    assert after_rollback == [] and before_commit == []
+    assert after_commit == [file_sweeper.NoteFiles(
+        note_id, "uploads/original/deleted.jpg", "uploads/processed/deleted_processed.jpg",
+    )]
+    assert all(path.exists() for path in files)
+
+    assert file_sweeper.drain_queue() == (3, 3 * len(b"data"))
+    assert not any(path.exists() for path in files)
+    assert list(file_sweeper._queue) == []
+
+
+def test_bulk_deletes_queue_explicitly_and_rollback_discards(tmp_path, monkeypatch):
+    item = file_sweeper.NoteFiles(1, "uploads/original/a.jpg", None)
+
+    async def test(db):
+        await db.execute(delete(Note).where(Note.id == item.note_id))
+        file_sweeper.queue_note_files(db.sync_session, item)
+        await db.rollback()
+        after_rollback = list(file_sweeper._queue)
+        await db.execute(delete(Note).where(Note.id == item.note_id))
+        file_sweeper.queue_note_files(db.sync_session, item)
+        await db.commit()
+        return after_rollback, list(file_sweeper._queue)
+
+    after_rollback, after_commit = run(test, tmp_path, monkeypatch)
+
+    assert after_rollback == []
+    assert after_commit == [item]
@@ -0,0 +1,65 @@
+"""
+Background ZIP import job state
+"""
+import io
+import time
+import zipfile
+import pytest
+from app.config import settings
+from app.services import import_jobs
+from app.services.export_jobs import write_state
+
+
+@pytest.fixture(autouse=True)
+def imports_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORTS_DIR", tmp_path)
+    return tmp_path
+
+
+def zip_bytes() -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("a.jpg", b"data")
+    buffer.seek(0)
+    return buffer
+
+
+def test_create_job_saves_archive():
+    state = import_jobs.create_job(1, zip_bytes(), 5)
+    assert state["status"] == "running"
+    assert state["folder_id"] == 5
+    assert import_jobs.archive_path(1, state["job_id"]).exists()
+    assert import_jobs.read_job(1, state["job_id"]) == state
+
+
+def test_create_job_rejects_non_zip(imports_dir):
+    with pytest.raises(ValueError):
+        import_jobs.create_job(1, io.BytesIO(b"junk"), None)
+    assert list(imports_dir.rglob("*.zip")) == []
+
+
+def test_read_job_is_per_user_and_validates_id():
+    state = import_jobs.create_job(1, zip_bytes(), None)
+    assert import_jobs.read_job(2, state["job_id"]) is None
+    assert import_jobs.read_job(1, "../1/" + state["job_id"]) is None
+
+
+def test_running_job_without_progress_is_failed():
+    state = import_jobs.create_job(1, zip_bytes(), None)
+    state["updated_at"] = time.time() - import_jobs.STALE_SECONDS - 1
+    write_state(import_jobs.state_path(1, state["job_id"]), state)
+    assert import_jobs.read_job(1, state["job_id"])["status"] == "failed"
+
+
+def test_old_finished_jobs_are_pruned_on_next_import():
+    old = import_jobs.create_job(1, zip_bytes(), None)
+    recent = import_jobs.create_job(1, zip_bytes(), None)
+    for state, age in ((old, settings.IMPORT_TTL_HOURS * 3600 + 1), (recent, 0)):
+        state.update(status="done", updated_at=time.time() - age)
+        write_state(import_jobs.state_path(1, state["job_id"]), state)
+
+    import_jobs.create_job(1, zip_bytes(), None)
+
+    assert import_jobs.read_job(1, old["job_id"]) is None
+    assert not import_jobs.archive_path(1, old["job_id"]).exists()
+    assert import_jobs.read_job(1, recent["job_id"])["status"] == "done"
@@ -0,0 +1,64 @@
+"""
+Query plans of the note list tag/folder filters with migrate_tag_filter_indexes.sql applied
+"""
+from pathlib import Path
+import pytest
+from sqlalchemy import create_engine, select
+from app.database import Base
+from app.models import user, folder, tag, annotation  # noqa: F401  (register tables)
+from app.models.note import Note
+from app.routers.notes import apply_note_filters
+
+MIGRATION = Path(__file__).resolve().parents[1] / "migrate_tag_filter_indexes.sql"
+TAG_INDEX = "ix_note_tags_tag_note"
+FOLDER_INDEX = "ix_notes_user_folder_updated"
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    # 模拟升级前的数据库：去掉模型自带的两个索引，由迁移脚本重新创建
+    raw = engine.raw_connection()
+    try:
+        raw.executescript(f"DROP INDEX {TAG_INDEX}; DROP INDEX {FOLDER_INDEX};")
+        raw.executescript(MIGRATION.read_text(encoding="utf-8"))
+    finally:
+        raw.close()
+    yield engine
+    engine.dispose()
+
+
+def query_plan(engine, **filters) -> list[str]:
+    query = apply_note_filters(select(Note), 1, **filters).order_by(Note.updated_at.desc(), Note.id.desc())
+    sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    raw = engine.raw_connection()
+    try:
+        return [row[3] for row in raw.execute("EXPLAIN QUERY PLAN " + sql)]
+    finally:
+        raw.close()
+
+
+def assert_no_notes_scan(plan: list[str]):
+    assert not any(step.startswith("SCAN notes") for step in plan), plan
+
+
+@pytest.mark.parametrize("tag_mode", ["and", "or", "not"])
+def test_tag_filter_uses_tag_note_index(engine, tag_mode):
+    plan = query_plan(engine, tag_ids="1,2", tag_mode=tag_mode)
+    assert any(TAG_INDEX in step for step in plan), plan
+    assert_no_notes_scan(plan)
+
+
+@pytest.mark.parametrize("folder_id", [3, 0])
+def test_folder_filter_uses_user_folder_index(engine, folder_id):
+    plan = query_plan(engine, folder_id=folder_id)
+    assert any(step.startswith("SEARCH notes") and FOLDER_INDEX in step for step in plan), plan
+    assert_no_notes_scan(plan)
+
+
+def test_tag_and_folder_filters_combined(engine):
+    plan = query_plan(engine, folder_id=3, tag_ids="1")
+    assert any(TAG_INDEX in step for step in plan), plan
+    assert any(FOLDER_INDEX in step for step in plan), plan
+    assert_no_notes_scan(plan)
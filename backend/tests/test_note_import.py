@@ -0,0 +1,82 @@
+"""
+ZIP import planning
+"""
+import io
+import zipfile
+from app.services.note_import import entry_name, plan_import
+
+
+def make_archive(names) -> zipfile.ZipFile:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name in names:
+            archive.writestr(name, b"data")
+    buffer.seek(0)
+    return zipfile.ZipFile(buffer)
+
+
+def make_gbk_archive(name: str) -> zipfile.ZipFile:
+    """
+    Archive as made by Chinese Windows tools: GBK file name, no UTF-8 flag
+    zipfile always writes non-ASCII names as UTF-8, so an ASCII placeholder
+    of the same length is replaced by the GBK bytes afterwards
+    """
+    encoded = name.encode("gbk")
+    placeholder = b"x" * len(encoded)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr(placeholder.decode(), b"data")
+    return zipfile.ZipFile(io.BytesIO(buffer.getvalue().replace(placeholder, encoded)))
+
+
+def planned(archive) -> list[tuple[tuple[str, ...], str, str]]:
+    return [(entry.folder, entry.title, entry.suffix) for entry in plan_import(archive)]
+
+
+def test_images_only_in_path_order():
+    archive = make_archive([
+        "b/2.png",
+        "a.jpg",
+        "b/1.JPEG",
+        "readme.txt",
+        "b/c/",
+        "b/c/3.webp",
+    ])
+    assert planned(archive) == [
+        ((), "a", ".jpg"),
+        (("b",), "1", ".jpeg"),
+        (("b",), "2", ".png"),
+        (("b", "c"), "3", ".webp"),
+    ]
+
+
+def test_system_and_hidden_entries_are_skipped():
+    archive = make_archive([
+        "__MACOSX/._a.jpg",
+        "notes/.DS_Store",
+        ".hidden/a.jpg",
+        "notes/._b.jpg",
+        "notes/b.jpg",
+    ])
+    assert planned(archive) == [(("notes",), "b", ".jpg")]
+
+
+def test_unsafe_path_parts_are_dropped():
+    archive = make_archive(["../../etc/a.png", "/abs/b.png", "x\\y\\c.png"])
+    assert sorted(planned(archive)) == [
+        (("abs",), "b", ".png"),
+        (("etc",), "a", ".png"),
+        (("x", "y"), "c", ".png"),
+    ]
+
+
+def test_gbk_names_are_decoded():
+    archive = make_gbk_archive("高数/第一章.jpg")
+    (entry,) = plan_import(archive)
+    assert entry_name(entry.info) == "高数/第一章.jpg"
+    assert (entry.folder, entry.title) == (("高数",), "第一章")
+
+
+def test_blank_names_get_defaults():
+    archive = make_archive([" /.png", " / .png"])
+    assert planned(archive) == [(("_",), "笔记", ".png")]
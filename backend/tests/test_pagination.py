@@ -0,0 +1,51 @@
+"""
+Keyset pagination cursor codec
+"""
+import base64
+import json
+from datetime import datetime
+import pytest
+from app.utils.pagination import encode_cursor, decode_cursor
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_round_trip_datetime():
+    value = datetime(2024, 3, 1, 12, 30, 15, 123456)
+    cursor = encode_cursor("updated_at:desc", value, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "updated_at:desc", datetime) == (value, 42)
+
+
+def test_round_trip_title():
+    cursor = encode_cursor("title:asc", "第一章 笔记", 7)
+    assert decode_cursor(cursor, "title:asc", str) == ("第一章 笔记", 7)
+
+
+def test_other_sort_key_is_rejected():
+    cursor = encode_cursor("title:asc", "a", 1)
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "title:desc", str)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 !!",
+    raw_cursor({"v": 1, "id": 2}),
+    raw_cursor(["updated_at:desc", 1, 2]),
+    raw_cursor(["updated_at:desc", None, 2]),
+    raw_cursor(["updated_at:desc", "not a date", 2]),
+    raw_cursor(["updated_at:desc", "2024-03-01T12:00:00", "2"]),
+    raw_cursor(["updated_at:desc", "2024-03-01T12:00:00", True]),
+    raw_cursor(["updated_at:desc", "2024-03-01T12:00:00"]),
+    raw_cursor("updated_at:desc"),
+])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "updated_at:desc", datetime)
+
+
+def test_value_type_is_checked():
+    with pytest.raises(ValueError):
+        decode_cursor(raw_cursor(["title:asc", 5, 1]), "title:asc", str)
@@ -0,0 +1,73 @@
+"""
+Streamed multi-page PDF export
+"""
+import re
+from PIL import Image
+from app.services.export_plan import ExportEntry
+from app.services.pdf_export import stream_pdf
+
+
+def make_entry(tmp_path, note_id: int, image_type: str, size=(200, 300)) -> ExportEntry:
+    path = tmp_path / f"{note_id}.jpg"
+    color = "white" if image_type == "processed" else (200, 40, 40)
+    img = Image.new("RGB", size, color)
+    img.paste((0, 0, 0), (20, 20, 120, 40))
+    img.save(path, "JPEG")
+    return ExportEntry(note_id, f"{note_id}.jpg", path, image_type, "1")
+
+
+def objects(pdf: bytes) -> dict[int, bytes]:
+    """Object number -> body, located through the xref table"""
+    startxref = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", pdf).group(1))
+    assert pdf[startxref:].startswith(b"xref\n")
+    header = re.match(rb"xref\n0 (\d+)\n", pdf[startxref:])
+    count = int(header.group(1))
+    table = pdf[startxref + header.end():].split(b"\n")[:count]
+    assert table[0] == b"0000000000 65535 f "
+    result = {}
+    for number, line in enumerate(table[1:], start=1):
+        offset = int(line[:10])
+        assert line.endswith(b" 00000 n ")
+        assert pdf[offset:].startswith(f"{number} 0 obj\n".encode())
+        end = pdf.index(b"\nendobj\n", offset)
+        result[number] = pdf[offset:end]
+    return result
+
+
+def test_pdf_structure(tmp_path):
+    entries = [
+        make_entry(tmp_path, 1, "processed"),
+        make_entry(tmp_path, 2, "annotated", (300, 150)),
+        make_entry(tmp_path, 3, "processed"),
+    ]
+    pdf = b"".join(stream_pdf(entries, "课程笔记"))
+
+    assert pdf.startswith(b"%PDF-1.4\n")
+    objs = objects(pdf)
+    assert b"/Type /Catalog /Pages 2 0 R" in objs[1]
+    assert b"/Count 3" in objs[2]
+    assert "课程笔记".encode("utf-16-be").hex().upper().encode() in objs[3]
+
+    kids = [int(number) for number in re.findall(rb"(\d+) 0 R", objs[2])]
+    assert len(kids) == 3
+    filters = []
+    for kid in kids:
+        assert b"/Type /Page /Parent 2 0 R" in objs[kid]
+        image_number = int(re.search(rb"/Im0 (\d+) 0 R", objs[kid]).group(1))
+        image = objs[image_number]
+        length = int(re.search(rb"/Length (\d+)", image).group(1))
+        data_start = image.index(b"stream\n") + len(b"stream\n")
+        assert image[data_start + length:] == b"\nendstream"
+        filters.append(re.search(rb"/Filter /(\w+)", image).group(1))
+    # 二值化页面用 G4，带批注的彩色页面用 JPEG
+    assert filters == [b"CCITTFaxDecode", b"DCTDecode", b"CCITTFaxDecode"]
+
+
+def test_page_height_follows_image_ratio(tmp_path):
+    pdf = b"".join(stream_pdf([make_entry(tmp_path, 1, "annotated", (400, 200))]))
+    assert b"/MediaBox [0 0 595.00 297.50]" in pdf
+
+
+def test_empty_pdf(tmp_path):
+    objs = objects(b"".join(stream_pdf([])))
+    assert b"/Kids [] /Count 0" in objs[2]
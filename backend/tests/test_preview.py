@@ -0,0 +1,40 @@
+"""
+Live preview source and window scaling
+"""
+import cv2
+import numpy as np
+import pytest
+from app.services.image_processor import ImageProcessor, ProcessingParams
+from app.services.preview import load_preview_source
+
+
+@pytest.mark.parametrize("scale, size, expected", [
+    (1.0, 11, 11),
+    (1.0, 12, 13),
+    (0.5, 21, 11),
+    (0.5, 7, 5),
+    (0.25, 11, 3),
+    (0.1, 7, 3),
+])
+def test_window_is_scaled_odd_and_at_least_3(scale, size, expected):
+    assert ImageProcessor(scale=scale)._window(size) == expected
+
+
+def test_preview_source_reports_scale(tmp_path):
+    path = tmp_path / "a.png"
+    cv2.imwrite(str(path), np.full((400, 1000, 3), 255, np.uint8))
+
+    img, scale = load_preview_source(str(path), max_side=250)
+    assert img.shape[:2] == (100, 250)
+    assert scale == 0.25
+
+    img, scale = load_preview_source(str(path), max_side=0)
+    assert img.shape[:2] == (400, 1000)
+    assert scale == 1.0
+
+
+def test_scaled_pipeline_runs_on_small_images():
+    img = np.full((60, 80, 3), 200, np.uint8)
+    params = ProcessingParams(block_size=99, denoise_strength=10)
+    result = ImageProcessor(params, scale=0.1).process_array(img)
+    assert result.shape == img.shape
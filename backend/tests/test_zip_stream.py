@@ -0,0 +1,70 @@
+"""
+Streaming ZIP writer
+"""
+import io
+import os
+import zipfile
+from app.services import zip_stream
+from app.services.zip_stream import stream_zip
+
+
+def build(files) -> tuple[list[bytes], zipfile.ZipFile]:
+    chunks = list(stream_zip(files))
+    return chunks, zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
+def test_archive_round_trip(tmp_path):
+    text = tmp_path / "notes.txt"
+    text.write_bytes(b"line\n" * 1000)
+    photo = tmp_path / "photo.JPG"
+    photo.write_bytes(os.urandom(5000))
+
+    _, archive = build([
+        ("课程/notes.txt", text),
+        ("课程/photo.jpg", photo),
+        ("manifest.json", b'{"version": 1}'),
+    ])
+
+    assert archive.testzip() is None
+    assert archive.namelist() == ["课程/notes.txt", "课程/photo.jpg", "manifest.json"]
+    assert archive.read("课程/notes.txt") == text.read_bytes()
+    assert archive.read("课程/photo.jpg") == photo.read_bytes()
+    assert archive.read("manifest.json") == b'{"version": 1}'
+
+
+def test_compressed_formats_are_stored(tmp_path):
+    text = tmp_path / "a.txt"
+    text.write_bytes(b"a" * 100)
+    photo = tmp_path / "b.jpeg"
+    photo.write_bytes(b"b" * 100)
+
+    _, archive = build([("a.txt", text), ("b.jpeg", photo)])
+
+    assert archive.getinfo("a.txt").compress_type == zipfile.ZIP_DEFLATED
+    assert archive.getinfo("b.jpeg").compress_type == zipfile.ZIP_STORED
+
+
+def test_sizes_are_written_in_data_descriptors(tmp_path):
+    source = tmp_path / "a.png"
+    source.write_bytes(b"x" * 10)
+
+    _, archive = build([("a.png", source)])
+
+    # 输出不可 seek：本地文件头之后不能回填大小和 CRC
+    assert archive.getinfo("a.png").flag_bits & 0x08
+
+
+def test_large_file_is_streamed_in_chunks(tmp_path):
+    source = tmp_path / "big.png"
+    source.write_bytes(os.urandom(zip_stream.CHUNK_SIZE * 8))
+
+    chunks, archive = build([("big.png", source)])
+
+    assert len(chunks) >= 8
+    assert max(len(chunk) for chunk in chunks) <= zip_stream.CHUNK_SIZE * 2
+    assert archive.read("big.png") == source.read_bytes()
+
+
+def test_empty_archive():
+    _, archive = build([])
+    assert archive.namelist() == []
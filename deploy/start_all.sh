@@ -14,6 +14,8 @@ else
     echo "📦 启动后端服务..."
     cd "$PROJECT_DIR/backend"
     source venv/bin/activate
+    # 图片文件交给 nginx 发送（需要 deploy/nginx.conf 中的 /_protected_uploads/ 配置）
+    export IMAGE_ACCEL_REDIRECT=true
     nohup uvicorn app.main:app --host 127.0.0.1 --port 8000 --workers 2 > "$PROJECT_DIR/deploy/backend.log" 2>&1 &
     echo "✅ 后端服务已启动 (PID: $!)"
 fi
@@ -6,5 +6,8 @@ cd "$(dirname "$0")/../backend"
 # 激活虚拟环境
 source venv/bin/activate
 
+# 图片文件交给 nginx 发送（需要 deploy/nginx.conf 中的 /_protected_uploads/ 配置）
+export IMAGE_ACCEL_REDIRECT=true
+
 # 启动后端服务（生产模式，使用多个worker）
 exec uvicorn app.main:app --host 127.0.0.1 --port 8000 --workers 2
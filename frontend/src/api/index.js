@@ -58,13 +58,24 @@ export const tagsAPI = {
   delete: (id) => api.delete(`/tags/${id}/`),
 };
 
+// Image variant version, mirrors variant_version() in the backend
+const imageVersion = (note, type) =>
+  type === 'annotated'
+    ? `${note.image_version}.${note.annotation_version}`
+    : `${note.image_version}`;
+
 // Notes API
 export const notesAPI = {
   getAll: (params) => api.get('/notes/', { params }),
+  // Keyset pages: { items, next_cursor, total }; pass next_cursor back as params.cursor
+  getPage: (params) => api.get('/notes/page/', { params }),
+  search: (params) => api.get('/notes/search/', { params }),
   getOne: (id) => api.get(`/notes/${id}/`),
   upload: (formData) => api.post('/notes/upload/', formData),
   update: (id, data) => api.put(`/notes/${id}/`, data),
   delete: (id) => api.delete(`/notes/${id}/`),
+  // { note_ids, action: 'move' | 'tag' | 'untag' | 'delete', folder_id?, tag_ids? } -> per-id results
+  bulk: (data) => api.post('/notes/bulk/', data),
   reprocess: (id, params) => api.post(`/notes/${id}/reprocess/`, params),
   rotate: (id, angle) => {
     const formData = new FormData();
@@ -79,7 +90,21 @@ export const notesAPI = {
     formData.append('height', height);
     return api.post(`/notes/${id}/crop/`, formData);
   },
-  getImageUrl: (id, type) => `/api/notes/${id}/image/${type}`,
+  // Pass the note to get a versioned (immutable, long-cached) URL
+  getImageUrl: (id, type, note) =>
+    note ? `/api/notes/${id}/image/${type}?v=${imageVersion(note, type)}` : `/api/notes/${id}/image/${type}`,
+  // Deep zoom descriptor: size, tile_size, overlap, max_level and a versioned tile_url template
+  getTiles: (id, type) => api.get(`/notes/${id}/tiles/`, { params: { image_type: type } }),
+  // Live preview channel: send params as JSON, receive a frame message + JPEG bytes
+  openPreview: (id) => {
+    const token = localStorage.getItem('token');
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const socket = new WebSocket(
+      `${protocol}://${window.location.host}/api/notes/${id}/preview/?token=${encodeURIComponent(token)}`
+    );
+    socket.binaryType = 'blob';
+    return socket;
+  },
 };
 
 // Annotations API
@@ -160,9 +185,48 @@ export const exportAPI = {
     window.URL.revokeObjectURL(url);
     document.body.removeChild(a);
   },
-  exportFolder: async (folderId) => {
+  // Folder archives are built by a background job; onProgress receives the job state while polling
+  exportFolder: async (folderId, onProgress) => {
+    let { data: job } = await api.post(`/export/folder/${folderId}/jobs`);
+    while (job.status === 'running') {
+      onProgress?.(job);
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      ({ data: job } = await api.get(`/export/jobs/${job.job_id}`));
+    }
+    if (job.status !== 'done') {
+      throw new Error(job.error || '导出失败');
+    }
+    onProgress?.(job);
+    
+    const token = localStorage.getItem('token');
+    const response = await fetch(job.download_url, {
+      method: 'GET',
+      headers: {
+        'Authorization': `Bearer ${token}`,
+      },
+    });
+    
+    if (!response.ok) {
+      throw new Error('导出失败');
+    }
+    
+    const blob = await response.blob();
+    const contentDisposition = response.headers.get('content-disposition');
+    const filename = parseFilename(contentDisposition, job.filename || 'folder.zip');
+    
+    const url = window.URL.createObjectURL(blob);
+    const a = document.createElement('a');
+    a.href = url;
+    a.download = filename;
+    document.body.appendChild(a);
+    a.click();
+    window.URL.revokeObjectURL(url);
+    document.body.removeChild(a);
+  },
+  // One PDF for the whole folder, streamed by the server while pages are encoded
+  exportFolderPdf: async (folderId) => {
     const token = localStorage.getItem('token');
-    const response = await fetch(`/api/export/folder/${folderId}`, {
+    const response = await fetch(`/api/export/folder/${folderId}/pdf`, {
       method: 'GET',
       headers: {
         'Authorization': `Bearer ${token}`,
@@ -175,7 +239,7 @@ export const exportAPI = {
     
     const blob = await response.blob();
     const contentDisposition = response.headers.get('content-disposition');
-    const filename = parseFilename(contentDisposition, 'folder.zip');
+    const filename = parseFilename(contentDisposition, 'folder.pdf');
     
     const url = window.URL.createObjectURL(blob);
     const a = document.createElement('a');
@@ -1,7 +1,7 @@
 /**
  * AIAssistant - Natural language image adjustment
  */
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { Input, Button, Card, Typography, Space, Alert, Slider, Collapse, message } from 'antd'
 import { SendOutlined, RobotOutlined, SettingOutlined, RotateLeftOutlined, RotateRightOutlined, UndoOutlined, RedoOutlined, ReloadOutlined } from '@ant-design/icons'
 import { aiAPI, notesAPI } from '../../api'
@@ -27,7 +27,7 @@ const DEFAULT_PARAMS = {
   denoise_strength: 10,
 }
 
-export default function AIAssistant({ noteId, onAdjustSuccess, onRotate, initialParams }) {
+export default function AIAssistant({ noteId, onAdjustSuccess, onRotate, onPreview, initialParams }) {
   const [instruction, setInstruction] = useState('')
   const [loading, setLoading] = useState(false)
   const [result, setResult] = useState(null)
@@ -37,6 +37,60 @@ export default function AIAssistant({ noteId, onAdjustSuccess, onRotate, initial
   const [blockSize, setBlockSize] = useState(initialParams?.block_size ?? DEFAULT_PARAMS.block_size)
   const [denoiseStrength, setDenoiseStrength] = useState(initialParams?.denoise_strength ?? DEFAULT_PARAMS.denoise_strength)
   
+  // 实时预览：拖动滑块时通过 WebSocket 发送参数，服务器只渲染最新的一组；松开后再调用 reprocess 保存
+  const previewSocketRef = useRef(null)
+  const previewUrlRef = useRef(null)
+  const sentSeqRef = useRef(0)       // 已发送的参数组数，与服务器的 seq 对应
+  const frameSeqRef = useRef(0)      // 最近一条 frame 消息的 seq，之后紧跟 JPEG 数据
+  const appliedSeqRef = useRef(0)    // 该 seq 及之前的预览已被保存的结果取代
+
+  const clearPreview = () => {
+    if (previewUrlRef.current) {
+      URL.revokeObjectURL(previewUrlRef.current)
+      previewUrlRef.current = null
+    }
+    onPreview?.(null)
+  }
+
+  useEffect(() => {
+    const socket = notesAPI.openPreview(noteId)
+    previewSocketRef.current = socket
+    sentSeqRef.current = 0
+    frameSeqRef.current = 0
+    appliedSeqRef.current = 0
+    socket.onmessage = (event) => {
+      if (typeof event.data === 'string') {
+        const data = JSON.parse(event.data)
+        if (data.type === 'frame') {
+          frameSeqRef.current = data.seq
+        } else if (data.type === 'error') {
+          console.error('Preview error:', data.detail)
+        }
+        return
+      }
+      if (frameSeqRef.current <= appliedSeqRef.current) return
+      const url = URL.createObjectURL(event.data)
+      if (previewUrlRef.current) {
+        URL.revokeObjectURL(previewUrlRef.current)
+      }
+      previewUrlRef.current = url
+      onPreview?.(url)
+    }
+    return () => {
+      socket.close()
+      previewSocketRef.current = null
+      clearPreview()
+    }
+  }, [noteId])
+
+  const sendPreview = (params) => {
+    const socket = previewSocketRef.current
+    if (socket?.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify(params))
+      sentSeqRef.current += 1
+    }
+  }
+
   // 撤销/重做历史记录
   const [history, setHistory] = useState([])
   const [historyIndex, setHistoryIndex] = useState(-1)
@@ -143,6 +197,8 @@ export default function AIAssistant({ noteId, onAdjustSuccess, onRotate, initial
   // 应用参数 - 直接调用API
   const applyParams = async (params, saveHistory = true) => {
     setLoading(true)
+    // 之后到达的旧预览帧不再显示
+    appliedSeqRef.current = sentSeqRef.current
     try {
       console.log('Calling reprocess API with params:', params)
       const response = await notesAPI.reprocess(noteId, params)
@@ -152,32 +208,46 @@ export default function AIAssistant({ noteId, onAdjustSuccess, onRotate, initial
       if (saveHistory) {
         saveToHistory(params)
       }
-      // 调用回调刷新图片
-      onAdjustSuccess?.()
+      // 调用回调刷新图片，图片 URL 更新后再移除预览
+      await onAdjustSuccess?.()
     } catch (error) {
       console.error('Reprocess API error:', error)
       message.error('调整失败: ' + (error.response?.data?.detail || error.message))
     } finally {
+      clearPreview()
       setLoading(false)
     }
   }
 
+  // 当前参数，key 对应的参数取正在拖动的滑块的值
+  const paramsWith = (key, value) => ({
+    contrast,
+    brightness,
+    c,
+    block_size: blockSize,
+    denoise_strength: denoiseStrength,
+    [key]: value,
+  })
+
+  const setters = {
+    contrast: setContrast,
+    brightness: setBrightness,
+    c: setC,
+    block_size: setBlockSize,
+    denoise_strength: setDenoiseStrength,
+  }
+
+  // 拖动滑块时只更新预览
+  const handleSliderChange = (key, value) => {
+    setters[key](value)
+    sendPreview(paramsWith(key, value))
+  }
+
   // 参数变化后应用
   const handleSliderComplete = (key, value) => {
     // 更新本地状态
-    if (key === 'contrast') setContrast(value)
-    if (key === 'brightness') setBrightness(value)
-    if (key === 'c') setC(value)
-    if (key === 'block_size') setBlockSize(value)
-    if (key === 'denoise_strength') setDenoiseStrength(value)
-    
-    const params = {
-      contrast: key === 'contrast' ? value : contrast,
-      brightness: key === 'brightness' ? value : brightness,
-      c: key === 'c' ? value : c,
-      block_size: key === 'block_size' ? value : blockSize,
-      denoise_strength: key === 'denoise_strength' ? value : denoiseStrength,
-    }
+    setters[key](value)
+    const params = paramsWith(key, value)
     
     console.log('Slider complete, applying params:', params)
     applyParams(params, true)
@@ -348,7 +418,7 @@ export default function AIAssistant({ noteId, onAdjustSuccess, onRotate, initial
                     min={0}
                     max={20}
                     value={denoiseStrength}
-                    onChange={setDenoiseStrength}
+                    onChange={(v) => handleSliderChange('denoise_strength', v)}
                     onChangeComplete={(v) => handleSliderComplete('denoise_strength', v)}
                     disabled={loading}
                   />
@@ -360,7 +430,7 @@ export default function AIAssistant({ noteId, onAdjustSuccess, onRotate, initial
                     max={31}
                     step={2}
                     value={blockSize}
-                    onChange={setBlockSize}
+                    onChange={(v) => handleSliderChange('block_size', v)}
                     onChangeComplete={(v) => handleSliderComplete('block_size', v)}
                     disabled={loading}
                   />
@@ -371,7 +441,7 @@ export default function AIAssistant({ noteId, onAdjustSuccess, onRotate, initial
                     min={-20}
                     max={20}
                     value={c}
-                    onChange={setC}
+                    onChange={(v) => handleSliderChange('c', v)}
                     onChangeComplete={(v) => handleSliderComplete('c', v)}
                     disabled={loading}
                   />
@@ -382,7 +452,7 @@ export default function AIAssistant({ noteId, onAdjustSuccess, onRotate, initial
                     min={-50}
                     max={50}
                     value={brightness}
-                    onChange={setBrightness}
+                    onChange={(v) => handleSliderChange('brightness', v)}
                     onChangeComplete={(v) => handleSliderComplete('brightness', v)}
                     disabled={loading}
                   />
@@ -394,7 +464,7 @@ export default function AIAssistant({ noteId, onAdjustSuccess, onRotate, initial
                     max={2.0}
                     step={0.1}
                     value={contrast}
-                    onChange={setContrast}
+                    onChange={(v) => handleSliderChange('contrast', v)}
                     onChangeComplete={(v) => handleSliderComplete('contrast', v)}
                     disabled={loading}
                   />
@@ -11,6 +11,7 @@ import {
   DeleteOutlined,
   MoreOutlined,
   DownloadOutlined,
+  FilePdfOutlined,
 } from '@ant-design/icons'
 import { useFoldersStore, useNotesStore } from '../../stores'
 import { exportAPI } from '../../api'
@@ -132,6 +133,9 @@ export default function FolderTree({ collapsed }) {
           <div className="folder-left">
             <FolderOutlined className="folder-inline-icon" />
             <span className="folder-name">{folder.name}</span>
+            {folder.total_note_count > 0 && (
+              <span className="folder-count">{folder.total_note_count}</span>
+            )}
           </div>
           {!collapsed && (
             <Dropdown
@@ -161,11 +165,30 @@ export default function FolderTree({ collapsed }) {
                     label: '导出',
                     onClick: async (e) => {
                       e.domEvent.stopPropagation()
+                      const key = `export-${folder.id}`
                       try {
-                        await exportAPI.exportFolder(folder.id)
-                        message.success('导出成功')
+                        await exportAPI.exportFolder(folder.id, (job) => {
+                          message.loading({ content: `正在打包 ${job.done}/${job.total}`, key, duration: 0 })
+                        })
+                        message.success({ content: '导出成功', key })
                       } catch (error) {
-                        message.error('导出失败')
+                        message.error({ content: '导出失败', key })
+                      }
+                    },
+                  },
+                  {
+                    key: 'export-pdf',
+                    icon: <FilePdfOutlined />,
+                    label: '导出为 PDF',
+                    onClick: async (e) => {
+                      e.domEvent.stopPropagation()
+                      const key = `export-pdf-${folder.id}`
+                      message.loading({ content: '正在生成 PDF', key, duration: 0 })
+                      try {
+                        await exportAPI.exportFolderPdf(folder.id)
+                        message.success({ content: '导出成功', key })
+                      } catch (error) {
+                        message.error({ content: '导出失败', key })
                       }
                     },
                   },
@@ -0,0 +1,174 @@
+/**
+ * TileViewer - Deep zoom viewer over a note's tile pyramid
+ * Wheel to zoom, drag to pan, double-click to fit; only the tiles of the
+ * visible part at the current zoom level are loaded
+ */
+import { useEffect, useRef, useState } from 'react'
+import { Spin } from 'antd'
+import { notesAPI } from '../../api'
+import './index.css'
+
+// 最多放大到原图像素的 4 倍
+const MAX_ZOOM = 4
+const ZOOM_STEP = 1.2
+// 适应窗口时图片最多占窗口宽高的比例
+const FIT_RATIO = 0.9
+
+// Pyramid level whose resolution covers the given zoom (screen px per image px)
+const levelFor = (info, scale) => {
+  const level = Math.ceil(info.max_level + Math.log2(scale * window.devicePixelRatio))
+  return Math.min(info.max_level, Math.max(0, level))
+}
+
+// Tiles of one level that intersect the viewport, positioned in screen px
+const visibleTiles = (info, level, view, viewport) => {
+  const levelScale = 2 ** (info.max_level - level)
+  const levelWidth = Math.max(1, Math.ceil(info.width / levelScale))
+  const levelHeight = Math.max(1, Math.ceil(info.height / levelScale))
+  const size = info.tile_size
+  const ratio = view.scale * levelScale
+  const left = Math.max(0, -view.x / ratio)
+  const top = Math.max(0, -view.y / ratio)
+  const right = Math.min(levelWidth, (viewport.width - view.x) / ratio)
+  const bottom = Math.min(levelHeight, (viewport.height - view.y) / ratio)
+
+  const tiles = []
+  for (let col = Math.floor(left / size); col * size < right; col++) {
+    for (let row = Math.floor(top / size); row * size < bottom; row++) {
+      // 与后端切片一致：相邻切片重叠 overlap 像素
+      const x0 = Math.max(0, col * size - info.overlap)
+      const y0 = Math.max(0, row * size - info.overlap)
+      const x1 = Math.min(levelWidth, (col + 1) * size + info.overlap)
+      const y1 = Math.min(levelHeight, (row + 1) * size + info.overlap)
+      tiles.push({
+        key: `${level}/${col}_${row}`,
+        src: info.tile_url.replace('{level}', level).replace('{x}', col).replace('{y}', row),
+        style: {
+          left: view.x + x0 * ratio,
+          top: view.y + y0 * ratio,
+          width: (x1 - x0) * ratio,
+          height: (y1 - y0) * ratio,
+        },
+      })
+    }
+  }
+  return tiles
+}
+
+export default function TileViewer({ noteId, imageType, fallbackSrc, alt }) {
+  const containerRef = useRef(null)
+  const dragRef = useRef(null)
+  const [info, setInfo] = useState(null)
+  const [failed, setFailed] = useState(false)
+  const [viewport, setViewport] = useState({ width: 0, height: 0 })
+  const [view, setView] = useState(null)
+
+  useEffect(() => {
+    let cancelled = false
+    setInfo(null)
+    setFailed(false)
+    setView(null)
+    notesAPI.getTiles(noteId, imageType)
+      .then((res) => { if (!cancelled) setInfo(res.data) })
+      .catch(() => { if (!cancelled) setFailed(true) })
+    return () => { cancelled = true }
+  }, [noteId, imageType])
+
+  useEffect(() => {
+    const container = containerRef.current
+    if (!container) return
+    const updateSize = () => {
+      const rect = container.getBoundingClientRect()
+      setViewport({ width: rect.width, height: rect.height })
+    }
+    updateSize()
+    window.addEventListener('resize', updateSize)
+    return () => window.removeEventListener('resize', updateSize)
+  }, [failed])
+
+  const fitView = () => {
+    const scale = Math.min(viewport.width / info.width, viewport.height / info.height) * FIT_RATIO
+    return {
+      scale,
+      x: (viewport.width - info.width * scale) / 2,
+      y: (viewport.height - info.height * scale) / 2,
+    }
+  }
+
+  // 加载完成或窗口大小变化后适应窗口
+  useEffect(() => {
+    if (info && viewport.width && viewport.height) {
+      setView(fitView())
+    }
+  }, [info, viewport])
+
+  // 以 (cx, cy) 为中心缩放；wheel 需要非 passive 监听才能阻止页面滚动
+  useEffect(() => {
+    const container = containerRef.current
+    if (!container || !info || !viewport.width) return
+    const minScale = fitView().scale
+    const handleWheel = (e) => {
+      e.preventDefault()
+      const rect = container.getBoundingClientRect()
+      const cx = e.clientX - rect.left
+      const cy = e.clientY - rect.top
+      setView((current) => {
+        if (!current) return current
+        const factor = e.deltaY < 0 ? ZOOM_STEP : 1 / ZOOM_STEP
+        const scale = Math.min(Math.max(MAX_ZOOM, minScale), Math.max(minScale, current.scale * factor))
+        const change = scale / current.scale
+        return { scale, x: cx - (cx - current.x) * change, y: cy - (cy - current.y) * change }
+      })
+    }
+    container.addEventListener('wheel', handleWheel, { passive: false })
+    return () => container.removeEventListener('wheel', handleWheel)
+  }, [info, viewport])
+
+  const handlePointerDown = (e) => {
+    if (!view) return
+    e.currentTarget.setPointerCapture(e.pointerId)
+    dragRef.current = { x: e.clientX - view.x, y: e.clientY - view.y }
+  }
+
+  const handlePointerMove = (e) => {
+    const drag = dragRef.current
+    if (!drag) return
+    setView((current) => ({ ...current, x: e.clientX - drag.x, y: e.clientY - drag.y }))
+  }
+
+  const handlePointerUp = () => {
+    dragRef.current = null
+  }
+
+  if (failed) {
+    return <img src={fallbackSrc} alt={alt} className="tile-viewer-fallback" />
+  }
+
+  // 适应窗口的层级作为底图，放大后在其上叠加当前层级的切片
+  const tiles = []
+  if (info && view) {
+    const baseLevel = levelFor(info, fitView().scale)
+    const level = levelFor(info, view.scale)
+    tiles.push(...visibleTiles(info, baseLevel, view, viewport))
+    if (level > baseLevel) {
+      tiles.push(...visibleTiles(info, level, view, viewport))
+    }
+  }
+
+  return (
+    <div
+      ref={containerRef}
+      className="tile-viewer"
+      onPointerDown={handlePointerDown}
+      onPointerMove={handlePointerMove}
+      onPointerUp={handlePointerUp}
+      onPointerCancel={handlePointerUp}
+      onDoubleClick={() => info && setView(fitView())}
+    >
+      {!view && <Spin size="large" className="tile-viewer-loading" />}
+      {tiles.map((tile) => (
+        <img key={tile.key} src={tile.src} alt={alt} className="tile-viewer-tile" style={tile.style} draggable={false} />
+      ))}
+    </div>
+  )
+}
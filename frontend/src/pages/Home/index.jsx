@@ -61,20 +61,6 @@ export default function Home() {
     return path
   }
 
-  // Get all subfolder IDs recursively
-  const getAllSubfolderIds = (folderId) => {
-    const subfolderIds = [folderId]
-    const getChildren = (parentId) => {
-      const children = folders.filter(f => f.parent_id === parentId)
-      children.forEach(child => {
-        subfolderIds.push(child.id)
-        getChildren(child.id)
-      })
-    }
-    getChildren(folderId)
-    return subfolderIds
-  }
-
   const userMenuItems = [
     {
       key: 'logout',
@@ -98,12 +84,8 @@ export default function Home() {
       if (selectedFolderId === 0) {
         params.folder_id = 0
       } else if (selectedFolderId > 0) {
-        if (includeSubfolders) {
-          const folderIds = getAllSubfolderIds(selectedFolderId)
-          params.folder_ids = folderIds.join(',')
-        } else {
-          params.folder_id = selectedFolderId
-        }
+        params.folder_id = selectedFolderId
+        if (includeSubfolders) params.include_subfolders = true
       }
     }
     if (selectedTagIds.length) params.tag_ids = selectedTagIds.join(',')
@@ -119,12 +101,8 @@ export default function Home() {
       if (selectedFolderId === 0) {
         params.folder_id = 0
       } else if (selectedFolderId > 0) {
-        if (includeSubfolders) {
-          const folderIds = getAllSubfolderIds(selectedFolderId)
-          params.folder_ids = folderIds.join(',')
-        } else {
-          params.folder_id = selectedFolderId
-        }
+        params.folder_id = selectedFolderId
+        if (includeSubfolders) params.include_subfolders = true
       }
     }
     if (selectedTagIds.length) params.tag_ids = selectedTagIds.join(',')
@@ -319,7 +297,7 @@ export default function Home() {
               </div>
             )}
             <img
-              src={notesAPI.getImageUrl(note.id, 'processed')}
+              src={notesAPI.getImageUrl(note.id, 'processed', note)}
               alt={note.title}
               onError={(e) => {
                 e.target.src = 'data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100"><rect fill="%23f0f0f0" width="100" height="100"/><text x="50%" y="50%" dominant-baseline="middle" text-anchor="middle" fill="%23999">No Image</text></svg>'
@@ -369,7 +347,7 @@ export default function Home() {
     >
       <div className="note-list-thumb">
         <img
-          src={notesAPI.getImageUrl(note.id, 'processed')}
+          src={notesAPI.getImageUrl(note.id, 'processed', note)}
           alt={note.title}
           onError={(e) => {
             e.target.style.display = 'none'
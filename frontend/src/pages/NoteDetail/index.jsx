@@ -17,6 +17,7 @@ import { useOutletContext } from 'react-router-dom'
 import { notesAPI } from '../../api'
 import AIAssistant from '../../components/AIAssistant'
 import NoteAnnotator from '../../components/NoteAnnotator'
+import TileViewer from '../../components/TileViewer'
 import './index.css'
 
 const { Title, Text, Paragraph } = Typography
@@ -36,8 +37,10 @@ export default function NoteDetail() {
   const [fullscreenIndex, setFullscreenIndex] = useState(0)
   const [annotationRefreshKey, setAnnotationRefreshKey] = useState(0)
   const [imageRefreshKey, setImageRefreshKey] = useState(0)
+  // 调整参数时的实时预览（object URL），保存后清除
+  const [previewSrc, setPreviewSrc] = useState(null)
 
-  const { currentNote, notes, loading, fetchNote, updateNote, deleteNote, clearCurrentNote } = useNotesStore()
+  const { currentNote, notes, loading, fetchNote, refreshNote, updateNote, deleteNote, clearCurrentNote } = useNotesStore()
   const { folders } = useFoldersStore()
   const { tags } = useTagsStore()
 
@@ -154,9 +157,9 @@ export default function NoteDetail() {
     try {
       await notesAPI.rotate(currentNote.id, angle)
       message.success('旋转成功')
-      // 强制刷新图片（通过改变key来绕过浏览器缓存）
+      // 重新获取笔记：新的 image_version 使图片 URL 变化
+      await refreshNote(currentNote.id)
       setImageRefreshKey(k => k + 1)
-      fetchNote(id)
     } catch (error) {
       message.error('旋转失败: ' + (error.response?.data?.detail || error.message))
     }
@@ -170,9 +173,9 @@ export default function NoteDetail() {
     )
   }
 
-  // 生成带时间戳的图片URL，用于绕过浏览器缓存
+  // 生成带版本号的图片URL，图片变化后版本号随之变化
   const getImageUrlWithCache = (noteId, type) => {
-    return `${notesAPI.getImageUrl(noteId, type)}?t=${imageRefreshKey}`
+    return notesAPI.getImageUrl(noteId, type, currentNote)
   }
 
   // Build folder path
@@ -260,7 +263,7 @@ export default function NoteDetail() {
               <NoteAnnotator
                 key={`image-annotator-${annotationRefreshKey}-${imageRefreshKey}`}
                 noteId={currentNote.id}
-                imageSrc={getImageUrlWithCache(currentNote.id, imageMode)}
+                imageSrc={previewSrc || getImageUrlWithCache(currentNote.id, imageMode)}
                 annotationMode={annotationMode}
                 setAnnotationMode={setAnnotationMode}
                 fontSize={fontSize}
@@ -346,10 +349,13 @@ export default function NoteDetail() {
                   <AIAssistant 
                     noteId={currentNote.id} 
                     initialParams={currentNote.processing_params}
-                    onAdjustSuccess={() => {
+                    onAdjustSuccess={async () => {
+                      // 重新获取笔记：新的 image_version 使图片 URL 变化（旧 URL 被浏览器长期缓存）
+                      await refreshNote(currentNote.id)
                       setImageRefreshKey(k => k + 1)
                     }}
                     onRotate={handleRotate}
+                    onPreview={setPreviewSrc}
                   />
                 ),
               },
@@ -400,29 +406,14 @@ export default function NoteDetail() {
               size="large"
             />
             
-            {/* Use NoteAnnotator in fullscreen for processed images */}
-            {imageMode === 'processed' ? (
-              <div className="fullscreen-annotator-container">
-                <NoteAnnotator
-                  noteId={notes[fullscreenIndex].id}
-                  imageSrc={notesAPI.getImageUrl(notes[fullscreenIndex].id, imageMode)}
-                  annotationMode={null}
-                  setAnnotationMode={() => {}}
-                  fontSize={fontSize}
-                  setFontSize={setFontSize}
-                  color={color}
-                  setColor={setColor}
-                  onAnnotationChange={() => {}}
-                  panelMode={false}
-                />
-              </div>
-            ) : (
-              <img
-                src={notesAPI.getImageUrl(notes[fullscreenIndex].id, imageMode)}
-                alt={notes[fullscreenIndex].title}
-                className="fullscreen-image"
-              />
-            )}
+            {/* Deep zoom over the tile pyramid; processed images are shown with their annotations rendered in */}
+            <TileViewer
+              key={notes[fullscreenIndex].id}
+              noteId={notes[fullscreenIndex].id}
+              imageType={imageMode === 'processed' ? 'annotated' : imageMode}
+              fallbackSrc={notesAPI.getImageUrl(notes[fullscreenIndex].id, imageMode, notes[fullscreenIndex])}
+              alt={notes[fullscreenIndex].title}
+            />
             
             <Button
               className="fullscreen-nav fullscreen-nav-next"
@@ -217,6 +217,20 @@ export const useNotesStore = create((set, get) => ({
     }
   },
 
+  // 图片变化后（调整参数、旋转）重新获取笔记，列表中的条目一起更新，图片 URL 的版本号随之变化
+  refreshNote: async (id) => {
+    try {
+      const res = await notesAPI.getOne(id);
+      set((state) => ({
+        notes: state.notes.map((n) => (n.id === res.data.id ? { ...n, ...res.data } : n)),
+        currentNote: state.currentNote?.id === res.data.id ? res.data : state.currentNote,
+      }));
+      return res.data;
+    } catch (error) {
+      return null;
+    }
+  },
+
   uploadNote: async (file, data = {}) => {
     const formData = new FormData();
     formData.append('file', file);